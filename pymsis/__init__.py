@@ -1,11 +1,57 @@
 """Python interface to the MSIS codes."""
 
-import importlib.metadata
+from importlib import import_module
+from typing import TYPE_CHECKING
 
-from pymsis.msis import Variable, calculate
-from pymsis.utils import use_space_weather_file
+from pymsis.msis import Variable, calculate, calculate_point, get_ufunc
+from pymsis.utils import use_space_weather_data, use_space_weather_file
 
 
-__version__ = importlib.metadata.version("pymsis")
+if TYPE_CHECKING:
+    from pymsis.aio import acalculate
+    from pymsis.batch import Batcher
+    from pymsis.dataset import calculate_dataset
+    from pymsis.pool import WorkerPool
+    from pymsis.store import calculate_to_store
 
-__all__ = ["Variable", "__version__", "calculate", "use_space_weather_file"]
+# Entry points whose modules are only imported on first use, so that scripts
+# calling calculate() don't pay for asyncio, multiprocessing and the like
+_LAZY_IMPORTS = {
+    "Batcher": "pymsis.batch",
+    "WorkerPool": "pymsis.pool",
+    "acalculate": "pymsis.aio",
+    "calculate_dataset": "pymsis.dataset",
+    "calculate_to_store": "pymsis.store",
+}
+
+__all__ = [
+    "Batcher",
+    "Variable",
+    "WorkerPool",
+    "__version__",
+    "acalculate",
+    "calculate",
+    "calculate_dataset",
+    "calculate_point",
+    "calculate_to_store",
+    "msis_ufunc",
+    "use_space_weather_data",
+    "use_space_weather_file",
+]
+
+
+def __getattr__(name: str):  # noqa: ANN202
+    # The default gufunc is only created on first use, which loads the kernel
+    if name == "msis_ufunc":
+        return get_ufunc()
+    if name == "__version__":
+        # Reading the package metadata is slower than the rest of the import
+        import importlib.metadata  # noqa: PLC0415
+
+        value = importlib.metadata.version("pymsis")
+    elif name in _LAZY_IMPORTS:
+        value = getattr(import_module(_LAZY_IMPORTS[name]), name)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value
+    return value
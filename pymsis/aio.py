@@ -0,0 +1,160 @@
+"""Asyncio interface that runs the model without blocking the event loop."""
+
+import asyncio
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import numpy as np
+import numpy.typing as npt
+
+from pymsis.msis import (
+    _get_msis_lib,
+    _get_options,
+    _point_msiscalc,
+    _run_msiscalc,
+    create_input,
+)
+
+
+# The model runs one call at a time, so a single thread serves every event
+# loop and runs the chunks of concurrent requests in the order they arrive
+_EXECUTOR: ThreadPoolExecutor | None = None
+# Number of requests of each event loop that can be queued for the executor
+# before new requests have to wait for a slot
+_MAX_PENDING: int = 64
+_SLOTS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+async def acalculate(
+    dates: npt.ArrayLike,
+    lons: npt.ArrayLike,
+    lats: npt.ArrayLike,
+    alts: npt.ArrayLike,
+    f107s: npt.ArrayLike | None = None,
+    f107as: npt.ArrayLike | None = None,
+    aps: npt.ArrayLike | None = None,
+    *,
+    options: list[float] | None = None,
+    version: float | str = 2.1,
+    interpolate_indices: bool = False,
+    time_format: str | None = None,
+    chunk_size: int = 10_000,
+    **kwargs: dict,
+) -> npt.NDArray:
+    """
+    Call MSIS from a coroutine without blocking the event loop.
+
+    This is the awaitable version of :func:`~pymsis.calculate`, with the same
+    inputs and output. The inputs are prepared and the model is evaluated in
+    a dedicated pymsis thread, ``chunk_size`` points at a time, so the event
+    loop keeps running while the model does. The chunks of concurrent
+    requests are interleaved, which keeps small requests from waiting on a
+    large one to finish.
+
+    Cancelling the awaiting task stops the calculation after the chunk that
+    is currently running. At most 64 requests per event loop are queued for
+    the pymsis thread, further requests wait for one of them to finish.
+
+    Parameters
+    ----------
+    dates : ArrayLike
+        Dates and times of interest
+    lons : ArrayLike
+        Geodetic longitudes (deg), referenced to the WGS84 ellipsoid
+    lats : ArrayLike
+        Geodetic latitudes (deg), referenced to the WGS84 ellipsoid
+    alts : ArrayLike
+        Geodetic altitudes (km), referenced to the WGS84 ellipsoid
+    f107s : ArrayLike, optional
+        Daily F10.7 of the previous day for the given date(s)
+    f107as : ArrayLike, optional
+        F10.7 running 81-day average centered on the given date(s)
+    aps : ArrayLike, optional
+        Ap for the given date(s), see :func:`~pymsis.calculate`
+    options : ArrayLike[25, float], optional
+        A list of options (switches) to the model, if options is passed
+        all keyword arguments specifying individual options will be ignored.
+    version : Number or string, default: 2.1
+        MSIS version number, one of (0, 2.0, 2.1).
+    interpolate_indices : bool, default: False
+        Linearly interpolate the F10.7 and ap indices, see
+        :func:`~pymsis.calculate`.
+    time_format : str, optional
+        How to interpret numeric dates, see :func:`~pymsis.calculate`.
+    chunk_size : int, default: 10000
+        Number of points evaluated between checks for cancellation and
+        between the chunks of other requests.
+    **kwargs : dict
+        Single options for the switches can be defined through keyword arguments.
+        See :func:`~pymsis.calculate` for the available options.
+
+    Returns
+    -------
+    ndarray (ndates, nlons, nlats, nalts, 11) or (ndates, 11)
+        The data calculated at each grid point, see :func:`~pymsis.calculate`.
+
+    Examples
+    --------
+    >>> output = await pymsis.acalculate(dates, lons, lats, alts)
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be a positive integer")
+    options = _get_options(options, **kwargs)
+    msis_lib = _get_msis_lib(version)
+    loop = asyncio.get_running_loop()
+    executor = _get_executor()
+
+    async with _get_slots(loop):
+        input_shape, input_data, *_ = await loop.run_in_executor(
+            executor,
+            partial(
+                create_input,
+                dates,
+                lons,
+                lats,
+                alts,
+                f107s,
+                f107as,
+                aps,
+                interpolate_indices=interpolate_indices,
+                time_format=time_format,
+            ),
+        )
+        if np.any(~np.isfinite(input_data)):
+            raise ValueError(
+                "Input data has non-finite values, all input data must be valid."
+            )
+
+        npoints = len(input_data)
+        output = np.empty((npoints, 11), dtype=np.float32)
+        for start in range(0, npoints, chunk_size):
+            stop = start + chunk_size
+            # Each await is a point where the task can be cancelled
+            output[start:stop] = await loop.run_in_executor(
+                executor,
+                _run_msiscalc,
+                _point_msiscalc(msis_lib),
+                msis_lib,
+                options,
+                input_data[start:stop],
+            )
+    return output.reshape(*input_shape, 11)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Return the pymsis thread, starting it on first use."""
+    global _EXECUTOR  # noqa: PLW0603
+    if _EXECUTOR is None:
+        _EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pymsis")
+    return _EXECUTOR
+
+
+def _get_slots(loop: asyncio.AbstractEventLoop) -> asyncio.Semaphore:
+    """Return the semaphore limiting the queued requests of the event loop."""
+    # asyncio primitives belong to one event loop, so each loop gets its own
+    if loop not in _SLOTS:
+        _SLOTS[loop] = asyncio.Semaphore(_MAX_PENDING)
+    return _SLOTS[loop]
@@ -0,0 +1,214 @@
+"""Coalesce many small concurrent requests into batched model calls."""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+
+import numpy as np
+import numpy.typing as npt
+
+from pymsis.msis import (
+    _get_msis_lib,
+    _get_options,
+    _point_msiscalc,
+    _run_msiscalc,
+    create_input,
+)
+
+
+@dataclass
+class _Request:
+    """One submitted request waiting for its batch."""
+
+    key: tuple
+    shape: tuple
+    input_data: npt.NDArray
+    future: Future = field(default_factory=Future)
+
+
+class Batcher:
+    """
+    Combine concurrent requests into single model calls.
+
+    Every :func:`~pymsis.calculate` call takes the pymsis lock and pays the
+    full per-call overhead, so many threads asking for a few points each are
+    limited by the number of calls. A Batcher gathers the requests submitted
+    within a short time window and evaluates all of the requests with the
+    same version and options in one model call, then hands each caller its
+    part of the output.
+
+    The inputs of each request are prepared in the submitting thread, and
+    the batches are evaluated by a background thread that is started on the
+    first request.
+
+    Parameters
+    ----------
+    window : float, default: 0.001
+        Time in seconds to wait for more requests after the first request of
+        a batch arrives.
+    max_points : int, default: 100000
+        A batch is evaluated right away once it has this many points.
+
+    Examples
+    --------
+    >>> batcher = pymsis.Batcher()
+    >>> # From any number of threads
+    >>> output = batcher.calculate(date, lon, lat, alt)
+    >>> batcher.close()
+    """
+
+    def __init__(self, window: float = 0.001, max_points: int = 100_000) -> None:
+        if window < 0 or max_points < 1:
+            raise ValueError("window must be >= 0 and max_points must be >= 1")
+        self.window = window
+        self.max_points = max_points
+        self._queue: queue.SimpleQueue[_Request | None] = queue.SimpleQueue()
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+        self._closed = False
+
+    def submit(
+        self,
+        dates: npt.ArrayLike,
+        lons: npt.ArrayLike,
+        lats: npt.ArrayLike,
+        alts: npt.ArrayLike,
+        f107s: npt.ArrayLike | None = None,
+        f107as: npt.ArrayLike | None = None,
+        aps: npt.ArrayLike | None = None,
+        *,
+        options: list[float] | None = None,
+        version: float | str = 2.1,
+        interpolate_indices: bool = False,
+        time_format: str | None = None,
+        **kwargs: dict,
+    ) -> "Future[npt.NDArray]":
+        """
+        Submit a request to the next batch.
+
+        The arguments are the same as for :func:`~pymsis.calculate`. Invalid
+        inputs raise here, in the submitting thread.
+
+        Returns
+        -------
+        concurrent.futures.Future
+            Future of the output array, with the same shape as the output
+            of :func:`~pymsis.calculate`.
+        """
+        options = _get_options(options, **kwargs)
+        msis_lib = _get_msis_lib(version)
+        shape, input_data, *_ = create_input(
+            dates,
+            lons,
+            lats,
+            alts,
+            f107s,
+            f107as,
+            aps,
+            interpolate_indices=interpolate_indices,
+            time_format=time_format,
+        )
+        if np.any(~np.isfinite(input_data)):
+            raise ValueError(
+                "Input data has non-finite values, all input data must be valid."
+            )
+
+        request = _Request((msis_lib, tuple(options)), shape, input_data)
+        with self._start_lock:
+            if self._closed:
+                raise RuntimeError("Cannot submit requests to a closed Batcher")
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="pymsis-batcher", daemon=True
+                )
+                self._thread.start()
+            self._queue.put(request)
+        return request.future
+
+    def calculate(self, *args: object, **kwargs: object) -> npt.NDArray:
+        """
+        Calculate the request as part of the next batch and wait for it.
+
+        The arguments are the same as for :func:`~pymsis.calculate`.
+
+        Returns
+        -------
+        ndarray (ndates, nlons, nlats, nalts, 11) or (ndates, 11)
+            The data calculated at each grid point.
+        """
+        return self.submit(*args, **kwargs).result()  # type: ignore[arg-type]
+
+    def close(self) -> None:
+        """Evaluate the pending requests and stop the background thread."""
+        with self._start_lock:
+            self._closed = True
+            thread = self._thread
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+
+    def __enter__(self) -> "Batcher":
+        """Use the Batcher as a context manager that closes it on exit."""
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        """Close the Batcher."""
+        self.close()
+
+    def _run(self) -> None:
+        """Gather the requests into batches until the Batcher is closed."""
+        closing = False
+        while not closing:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            npoints = len(first.input_data)
+            deadline = time.monotonic() + self.window
+            while npoints < self.max_points:
+                try:
+                    request = self._queue.get(
+                        timeout=max(deadline - time.monotonic(), 0)
+                    )
+                except queue.Empty:
+                    break
+                if request is None:
+                    closing = True
+                    break
+                batch.append(request)
+                npoints += len(request.input_data)
+            self._evaluate(batch)
+
+    @staticmethod
+    def _evaluate(batch: list[_Request]) -> None:
+        """Evaluate the requests of each version and options in one call."""
+        groups: dict[tuple, list[_Request]] = {}
+        for request in batch:
+            # Requests that were cancelled while waiting are dropped
+            if request.future.set_running_or_notify_cancel():
+                groups.setdefault(request.key, []).append(request)
+
+        for (msis_lib, options), requests in groups.items():
+            sizes = [len(request.input_data) for request in requests]
+            input_data = np.empty((sum(sizes), 14), dtype=np.float32, order="F")
+            offsets = np.cumsum([0, *sizes])
+            for request, start, stop in zip(
+                requests, offsets[:-1], offsets[1:], strict=True
+            ):
+                input_data[start:stop] = request.input_data
+            try:
+                output = _run_msiscalc(
+                    _point_msiscalc(msis_lib), msis_lib, list(options), input_data
+                )
+            except Exception as e:
+                for request in requests:
+                    request.future.set_exception(e)
+                continue
+            for request, start, stop in zip(
+                requests, offsets[:-1], offsets[1:], strict=True
+            ):
+                request.future.set_result(
+                    output[start:stop].reshape(*request.shape, 11)
+                )
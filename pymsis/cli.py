@@ -0,0 +1,512 @@
+"""Command line interface for running MSIS over trajectory files."""
+
+import argparse
+import csv
+import itertools
+import os
+import shutil
+import sys
+from collections import deque
+from collections.abc import Callable, Collection, Iterator, Sequence
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Protocol
+
+import numpy as np
+import numpy.typing as npt
+
+from pymsis import msis, utils
+
+
+# Required input columns, the indices are looked up from the dates unless all
+# of the optional index columns are present too, with either the daily ap or
+# the 7 ap values of the storm-time ap history
+_INPUT_COLUMNS = ("time", "lon", "lat", "alt")
+_INDEX_COLUMNS = ("f107", "f107a", "ap")
+_AP_COLUMNS = tuple(f"ap{i}" for i in range(1, 8))
+_OUTPUT_COLUMNS = tuple(variable.name.lower() for variable in msis.Variable)
+_FORMATS = {".csv": "csv", ".npy": "npy", ".parquet": "parquet"}
+
+
+class _Writer(Protocol):
+    """Writes the output columns of a file one chunk at a time."""
+
+    def write(self, columns: dict[str, npt.NDArray]) -> None: ...
+
+    def close(self) -> None: ...
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    """
+    Run the ``pymsis`` command line interface.
+
+    ``pymsis run INPUT OUTPUT`` evaluates MSIS at every row of a trajectory
+    file. The input is a CSV, NPY (structured array) or Parquet file with the
+    ``time`` (UTC), ``lon``, ``lat`` and ``alt`` columns. The F10.7 and ap
+    indices are looked up from the times unless the input also has the
+    ``f107`` and ``f107a`` columns and either the ``ap`` (daily Ap) column or
+    the ``ap1`` to ``ap7`` columns of the ap history, which are required for
+    storm-time mode (``--option geomagnetic_activity=-1``). The output has the
+    four input columns followed by one column per :class:`~pymsis.Variable`,
+    in the format given by the output suffix. The output can't be the input.
+
+    If INPUT is a directory, every supported file in it is processed into the
+    OUTPUT directory. The files are read and written in chunks, and the model
+    and the space weather data are loaded once and reused for all the files.
+
+    Parameters
+    ----------
+    argv : Sequence[str], optional
+        The command line arguments, defaults to ``sys.argv[1:]``.
+
+    Returns
+    -------
+    int
+        The exit status.
+    """
+    parser = _make_parser()
+    args = parser.parse_args(argv)
+    try:
+        options = msis._get_options(**dict(args.option))
+        jobs = _find_jobs(args.input, args.output, args.format)
+        _run(jobs, args.version, options, args.workers, args.chunk_size)
+    except (ValueError, ImportError, OSError) as e:
+        parser.exit(1, f"pymsis: error: {e}\n")
+    return 0
+
+
+def _make_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="pymsis", description="Run the NRLMSIS model over trajectory files."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    run = subparsers.add_parser(
+        "run",
+        help="calculate the atmosphere along the rows of CSV, NPY or Parquet files",
+        description=(
+            "Calculate the atmosphere at every row of the input file, or of every "
+            "file in the input directory. The inputs need the time, lon, lat and "
+            "alt columns, and optionally f107, f107a and either ap or ap1 to ap7."
+        ),
+    )
+    run.add_argument("input", type=Path, help="input file or directory")
+    run.add_argument("output", type=Path, help="output file or directory")
+    run.add_argument(
+        "--version", default="2.1", help="MSIS version, one of 0, 2.0, 2.1"
+    )
+    run.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="number of worker processes (default: %(default)s)",
+    )
+    run.add_argument(
+        "--chunk-size",
+        type=int,
+        default=100_000,
+        help="number of rows read and calculated at a time (default: %(default)s)",
+    )
+    run.add_argument(
+        "--format",
+        choices=sorted(set(_FORMATS.values())),
+        help="output format of a directory, defaults to the format of each input",
+    )
+    run.add_argument(
+        "--option",
+        type=_parse_option,
+        action="append",
+        default=[],
+        metavar="NAME=VALUE",
+        help="model switch, for example geomagnetic_activity=-1 (repeatable)",
+    )
+    return parser
+
+
+def _parse_option(text: str) -> tuple[str, float]:
+    name, sep, value = text.partition("=")
+    try:
+        return name, float(value if sep else "")
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"{text!r} is not of the form NAME=VALUE"
+        ) from None
+
+
+def _format(path: Path) -> str:
+    """Return the file format given by the suffix of the path."""
+    try:
+        return _FORMATS[path.suffix.lower()]
+    except KeyError:
+        raise ValueError(
+            f"Unknown file format {path.suffix!r} of {path}, "
+            f"use one of {tuple(_FORMATS)}"
+        ) from None
+
+
+def _find_jobs(
+    input_path: Path, output_path: Path, output_format: str | None
+) -> list[tuple[Path, Path]]:
+    """Pair every input file with its output file."""
+    if not input_path.is_dir():
+        _format(input_path)
+        _format(output_path)
+        return _check_overwrite([(input_path, output_path)])
+
+    inputs = sorted(
+        path
+        for path in input_path.iterdir()
+        if path.is_file() and path.suffix.lower() in _FORMATS
+    )
+    if not inputs:
+        raise ValueError(f"No CSV, NPY or Parquet files found in {input_path}")
+    output_path.mkdir(parents=True, exist_ok=True)
+    suffixes = {name: suffix for suffix, name in _FORMATS.items()}
+    return _check_overwrite(
+        [
+            (
+                path,
+                output_path / path.name
+                if output_format is None
+                else (output_path / path.name).with_suffix(suffixes[output_format]),
+            )
+            for path in inputs
+        ]
+    )
+
+
+def _check_overwrite(jobs: list[tuple[Path, Path]]) -> list[tuple[Path, Path]]:
+    """Refuse jobs whose output would replace the input before it is read."""
+    for input_path, output_path in jobs:
+        if output_path.resolve() == input_path.resolve() or (
+            output_path.exists() and output_path.samefile(input_path)
+        ):
+            raise ValueError(f"The output {output_path} would overwrite the input")
+    return jobs
+
+
+def _run(
+    jobs: list[tuple[Path, Path]],
+    version: str,
+    options: list[float],
+    workers: int,
+    chunk_size: int,
+) -> None:
+    """Calculate every job, in worker processes if more than one is requested."""
+    if workers < 1 or chunk_size < 1:
+        raise ValueError("--workers and --chunk-size must be positive")
+    # Validate the version and the columns before reading any of the files
+    msis._get_msis_lib(version)
+    ap_columns = {path: _ap_columns(_COLUMNS[_format(path)](path)) for path, _ in jobs}
+    daily = [str(path) for path, names in ap_columns.items() if names == ("ap",)]
+    if options[8] == -1 and daily:
+        raise ValueError(
+            "geomagnetic_activity=-1 (storm-time mode) needs the ap1 to ap7 "
+            f"columns of the ap history, {daily} only have the daily ap"
+        )
+    needs_indices = any(names is None for names in ap_columns.values())
+
+    if workers == 1:
+        for input_path, output_path in jobs:
+            _run_file(input_path, output_path, chunk_size, version, options)
+        return
+
+    # Load the space weather data once and share it with all the workers
+    shared = utils.share_space_weather_data() if needs_indices else None
+    try:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(shared,),
+        ) as executor:
+            for input_path, output_path in jobs:
+                _run_file(
+                    input_path,
+                    output_path,
+                    chunk_size,
+                    version,
+                    options,
+                    executor=executor,
+                    max_pending=2 * workers,
+                )
+    finally:
+        if shared is not None:
+            shared.unlink()
+
+
+def _init_worker(shared: utils.SharedSpaceWeatherData | None) -> None:
+    if shared is not None:
+        utils.attach_space_weather_data(shared)
+
+
+def _run_file(
+    input_path: Path,
+    output_path: Path,
+    chunk_size: int,
+    version: str,
+    options: list[float],
+    *,
+    executor: ProcessPoolExecutor | None = None,
+    max_pending: int = 1,
+) -> None:
+    """Calculate one file, writing the chunks in order as they finish."""
+    chunks = _READERS[_format(input_path)](input_path, chunk_size)
+    # The chunks are written next to the output and only moved into place once
+    # they are all in, so a failed run doesn't leave a truncated output behind
+    temp_path = output_path.with_name(f".{output_path.name}.{os.getpid()}.tmp")
+    writer = _WRITERS[_format(output_path)](temp_path)
+    try:
+        if executor is None:
+            for columns in chunks:
+                writer.write(_calculate_chunk(columns, version, options))
+        else:
+            # Keep every worker busy without reading the whole file at once
+            pending: deque[Future] = deque()
+            for columns in chunks:
+                pending.append(
+                    executor.submit(_calculate_chunk, columns, version, options)
+                )
+                if len(pending) >= max_pending:
+                    writer.write(pending.popleft().result())
+            while pending:
+                writer.write(pending.popleft().result())
+    except BaseException:
+        try:
+            writer.close()
+        finally:
+            temp_path.unlink(missing_ok=True)
+        raise
+    writer.close()
+    temp_path.replace(output_path)
+
+
+def _ap_columns(names: Collection[str]) -> tuple[str, ...] | None:
+    """Find the ap columns of the indices, None if they are looked up."""
+    if "f107" not in names or "f107a" not in names:
+        return None
+    if all(name in names for name in _AP_COLUMNS):
+        return _AP_COLUMNS
+    if "ap" in names:
+        return ("ap",)
+    return None
+
+
+def _indices(
+    columns: dict[str, npt.NDArray], options: list[float]
+) -> tuple[npt.NDArray | None, npt.NDArray | None, npt.NDArray | None]:
+    """Get the f107s, f107as and aps of the columns, None if they are looked up."""
+    ap_columns = _ap_columns(columns)
+    if ap_columns is None:
+        return None, None, None
+    if ap_columns == ("ap",):
+        aps = msis._daily_ap_history(columns["ap"], options)
+    else:
+        aps = np.column_stack([columns[name] for name in ap_columns])
+    return columns["f107"], columns["f107a"], aps
+
+
+def _calculate_chunk(
+    columns: dict[str, npt.NDArray], version: str, options: list[float]
+) -> dict[str, npt.NDArray]:
+    """Calculate the output columns of one chunk of rows."""
+    f107s, f107as, aps = _indices(columns, options)
+    output = np.asarray(
+        msis.calculate(
+            columns["time"],
+            columns["lon"],
+            columns["lat"],
+            columns["alt"],
+            f107s,
+            f107as,
+            aps,
+            options=options,
+            version=version,
+        )
+    ).reshape(-1, len(_OUTPUT_COLUMNS))
+    result = {name: columns[name] for name in _INPUT_COLUMNS}
+    result.update(zip(_OUTPUT_COLUMNS, output.T, strict=True))
+    return result
+
+
+def _check_columns(source: str | Path, columns: Sequence[str]) -> set[str]:
+    missing = [name for name in _INPUT_COLUMNS if name not in columns]
+    if missing:
+        raise ValueError(f"{source} is missing the columns {missing}")
+    return set(columns)
+
+
+def _convert(columns: dict[str, npt.NDArray]) -> dict[str, npt.NDArray]:
+    """Convert the input columns to datetime64 times and float64 values."""
+    result = {"time": np.asarray(columns["time"]).astype("datetime64[ns]")}
+    for name in (*_INPUT_COLUMNS[1:], *_INDEX_COLUMNS, *_AP_COLUMNS):
+        if name in columns:
+            result[name] = np.asarray(columns[name], dtype=np.float64)
+    return result
+
+
+# CSV files, with ISO 8601 times
+
+
+def _csv_columns(path: Path) -> set[str]:
+    with path.open(newline="") as f:
+        return _check_columns(path, next(csv.reader(f), []))
+
+
+def _read_csv(path: Path, chunk_size: int) -> Iterator[dict[str, npt.NDArray]]:
+    with path.open(newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        _check_columns(path, header)
+        while rows := list(itertools.islice(reader, chunk_size)):
+            values = {
+                name: np.asarray(column)
+                for name, column in zip(header, zip(*rows, strict=True), strict=True)
+            }
+            # NumPy parses ISO 8601 strings but not timezone designators
+            values["time"] = np.char.rstrip(values["time"], "Z")
+            yield _convert(values)
+
+
+class _CsvWriter:
+    def __init__(self, path: Path) -> None:
+        self._file = path.open("w", newline="")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow((*_INPUT_COLUMNS, *_OUTPUT_COLUMNS))
+
+    def write(self, columns: dict[str, npt.NDArray]) -> None:
+        times = columns["time"]
+        # Write whole seconds unless the times need the full resolution
+        whole_seconds = not (times.view(np.int64) % 1_000_000_000).any()
+        text = [np.datetime_as_string(times, unit="s" if whole_seconds else "ns")]
+        text += [columns[name].astype(str) for name in _INPUT_COLUMNS[1:]]
+        text += [np.char.mod("%.7g", columns[name]) for name in _OUTPUT_COLUMNS]
+        self._writer.writerows(zip(*text, strict=True))
+
+    def close(self) -> None:
+        self._file.close()
+
+
+# NPY files, with a structured array of the columns
+
+
+def _npy_columns(path: Path) -> set[str]:
+    names = np.load(path, mmap_mode="r").dtype.names
+    return _check_columns(path, names or ())
+
+
+def _read_npy(path: Path, chunk_size: int) -> Iterator[dict[str, npt.NDArray]]:
+    data = np.load(path, mmap_mode="r").reshape(-1)
+    _check_columns(path, data.dtype.names or ())
+    for start in range(0, len(data), chunk_size):
+        chunk = data[start : start + chunk_size]
+        yield _convert({name: chunk[name] for name in chunk.dtype.names})
+
+
+_NPY_DTYPE = np.dtype(
+    [
+        ("time", "M8[ns]"),
+        *((name, "f8") for name in _INPUT_COLUMNS[1:]),
+        *((name, "f4") for name in _OUTPUT_COLUMNS),
+    ]
+)
+
+
+class _NpyWriter:
+    # The number of rows is only known at the end, so the rows are written to
+    # a temporary file that is copied after the header once they are all in
+    def __init__(self, path: Path) -> None:
+        self._path = path
+        self._rows_path = path.with_name(path.name + ".rows")
+        self._rows = self._rows_path.open("wb")
+        self._count = 0
+
+    def write(self, columns: dict[str, npt.NDArray]) -> None:
+        rows = np.empty(len(columns["time"]), dtype=_NPY_DTYPE)
+        for name in rows.dtype.names or ():
+            rows[name] = columns[name]
+        self._rows.write(rows.tobytes())
+        self._count += len(rows)
+
+    def close(self) -> None:
+        self._rows.close()
+        header = {
+            "descr": np.lib.format.dtype_to_descr(_NPY_DTYPE),
+            "fortran_order": False,
+            "shape": (self._count,),
+        }
+        with self._path.open("wb") as f, self._rows_path.open("rb") as rows:
+            np.lib.format.write_array_header_2_0(f, header)
+            shutil.copyfileobj(rows, f)
+        self._rows_path.unlink()
+
+
+# Parquet files, requires pyarrow
+
+
+def _import_parquet():  # noqa: ANN202
+    try:
+        import pyarrow as pa  # type: ignore # noqa: PLC0415
+        import pyarrow.parquet as pq  # type: ignore # noqa: PLC0415
+    except ImportError:
+        raise ImportError(
+            "Reading and writing Parquet files requires pyarrow"
+        ) from None
+    return pa, pq
+
+
+def _parquet_columns(path: Path) -> set[str]:
+    _, pq = _import_parquet()
+    return _check_columns(path, pq.ParquetFile(path).schema_arrow.names)
+
+
+def _read_parquet(path: Path, chunk_size: int) -> Iterator[dict[str, npt.NDArray]]:
+    _, pq = _import_parquet()
+    with pq.ParquetFile(path) as f:
+        names = f.schema_arrow.names
+        _check_columns(path, names)
+        columns = [
+            name
+            for name in (*_INPUT_COLUMNS, *_INDEX_COLUMNS, *_AP_COLUMNS)
+            if name in names
+        ]
+        for batch in f.iter_batches(batch_size=chunk_size, columns=columns):
+            yield _convert(
+                {
+                    name: batch.column(name).to_numpy(zero_copy_only=False)
+                    for name in columns
+                }
+            )
+
+
+class _ParquetWriter:
+    def __init__(self, path: Path) -> None:
+        pa, pq = _import_parquet()
+        self._pa = pa
+        self._schema = pa.schema(
+            [
+                (name, pa.from_numpy_dtype(_NPY_DTYPE[name]))
+                for name in _NPY_DTYPE.names or ()
+            ]
+        )
+        self._writer = pq.ParquetWriter(path, self._schema)
+
+    def write(self, columns: dict[str, npt.NDArray]) -> None:
+        table = self._pa.table(
+            {name: columns[name] for name in self._schema.names}, schema=self._schema
+        )
+        self._writer.write_table(table)
+
+    def close(self) -> None:
+        self._writer.close()
+
+
+_COLUMNS = {"csv": _csv_columns, "npy": _npy_columns, "parquet": _parquet_columns}
+_READERS = {"csv": _read_csv, "npy": _read_npy, "parquet": _read_parquet}
+_WRITERS: dict[str, Callable[[Path], _Writer]] = {
+    "csv": _CsvWriter,
+    "npy": _NpyWriter,
+    "parquet": _ParquetWriter,
+}
+
+
+if __name__ == "__main__":
+    sys.exit(main())
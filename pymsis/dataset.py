@@ -0,0 +1,164 @@
+"""Lazily evaluated MSIS grids as xarray Datasets backed by Dask arrays."""
+
+from typing import TYPE_CHECKING
+
+import numpy as np
+import numpy.typing as npt
+
+from pymsis.msis import Variable, _get_options, get_ufunc
+from pymsis.store import _chunk_shape, _grid_inputs
+
+
+if TYPE_CHECKING:
+    import xarray as xr
+
+
+# Units of the Variable outputs, everything else is a number density
+_UNITS = {Variable.MASS_DENSITY: "kg/m3", Variable.TEMPERATURE: "K"}
+
+
+def calculate_dataset(
+    dates: npt.ArrayLike,
+    lons: npt.ArrayLike,
+    lats: npt.ArrayLike,
+    alts: npt.ArrayLike,
+    f107s: npt.ArrayLike | None = None,
+    f107as: npt.ArrayLike | None = None,
+    aps: npt.ArrayLike | None = None,
+    *,
+    chunks: tuple[int, int, int, int] | None = None,
+    options: list[float] | None = None,
+    version: float | str = 2.1,
+    **kwargs: dict,
+) -> "xr.Dataset":
+    """
+    Calculate MSIS on a grid lazily as an xarray Dataset.
+
+    The grid is the same as the grid mode of :func:`~pymsis.calculate`, but
+    nothing is evaluated up front. Each output variable is a Dask array and
+    only the chunks that are sliced, reduced or plotted get computed, on the
+    current Dask scheduler. The Fortran model can only run one call at a
+    time within a process, so use the ``"processes"`` scheduler or a
+    distributed cluster to evaluate several chunks at once.
+
+    Requires ``xarray`` and ``dask``.
+
+    Parameters
+    ----------
+    dates : ArrayLike
+        Dates and times of interest
+    lons : ArrayLike
+        Geodetic longitudes (deg), referenced to the WGS84 ellipsoid
+    lats : ArrayLike
+        Geodetic latitudes (deg), referenced to the WGS84 ellipsoid
+    alts : ArrayLike
+        Geodetic altitudes (km), referenced to the WGS84 ellipsoid
+    f107s : ArrayLike, optional
+        Daily F10.7 of the previous day for the given date(s)
+    f107as : ArrayLike, optional
+        F10.7 running 81-day average centered on the given date(s)
+    aps : ArrayLike, optional
+        Ap for the given date(s), see :func:`~pymsis.calculate`
+    chunks : tuple of 4 ints, optional
+        The number of (dates, lons, lats, alts) in each Dask chunk. Defaults
+        to all of the lons, lats and alts of one date.
+    options : ArrayLike[25, float], optional
+        A list of options (switches) to the model, if options is passed
+        all keyword arguments specifying individual options will be ignored.
+    version : Number or string, default: 2.1
+        MSIS version number, one of (0, 2.0, 2.1).
+    **kwargs : dict
+        Single options for the switches can be defined through keyword arguments.
+        See :func:`~pymsis.calculate` for the available options.
+
+    Returns
+    -------
+    xarray.Dataset
+        Dataset with the ``time``, ``lon``, ``lat`` and ``alt`` coordinates and
+        one float32 data variable per :class:`~pymsis.Variable`, named by the
+        lower case variable name (``mass_density``, ``n2``, ..., ``temperature``).
+    """
+    try:
+        import dask.array as da  # noqa: PLC0415
+        import xarray as xr  # noqa: PLC0415
+    except ImportError:
+        raise ImportError("calculate_dataset requires xarray and dask") from None
+
+    options = _get_options(options, **kwargs)
+    # Fail early on an unknown version instead of inside the first compute
+    get_ufunc(version, options)
+    dates_arr, lons, lats, alts, f107s, f107as, aps = _grid_inputs(
+        dates, lons, lats, alts, f107s, f107as, aps
+    )
+    shape = (len(dates_arr), len(lons), len(lats), len(alts))
+    nd, ni, nj, nk = _chunk_shape(chunks, shape)
+
+    output = da.blockwise(
+        _calculate_chunk,
+        "tijkv",
+        da.from_array(dates_arr, chunks=nd),
+        "t",
+        da.from_array(lons, chunks=ni),
+        "i",
+        da.from_array(lats, chunks=nj),
+        "j",
+        da.from_array(alts, chunks=nk),
+        "k",
+        da.from_array(f107s, chunks=nd),
+        "t",
+        da.from_array(f107as, chunks=nd),
+        "t",
+        da.from_array(aps, chunks=(nd, -1)),
+        "ta",
+        new_axes={"v": len(Variable)},
+        concatenate=True,
+        dtype=np.float32,
+        meta=np.empty((0, 0, 0, 0, 0), dtype=np.float32),
+        version=version,
+        options=tuple(options),
+    )
+
+    dims = ("time", "lon", "lat", "alt")
+    data_vars = {
+        variable.name.lower(): (
+            dims,
+            output[..., int(variable)],
+            {"units": _UNITS.get(variable, "m-3")},
+        )
+        for variable in Variable
+    }
+    coords = {
+        "time": dates_arr,
+        "lon": ("lon", lons, {"units": "degrees_east"}),
+        "lat": ("lat", lats, {"units": "degrees_north"}),
+        "alt": ("alt", alts, {"units": "km"}),
+    }
+    attrs = {"msis_version": str(version), "msis_options": list(options)}
+    return xr.Dataset(data_vars, coords=coords, attrs=attrs)
+
+
+def _calculate_chunk(
+    dates: npt.NDArray,
+    lons: npt.NDArray,
+    lats: npt.NDArray,
+    alts: npt.NDArray,
+    f107s: npt.NDArray,
+    f107as: npt.NDArray,
+    aps: npt.NDArray,
+    *,
+    version: float | str,
+    options: tuple[float, ...],
+) -> npt.NDArray:
+    """Evaluate one (dates, lons, lats, alts, 11) chunk of the grid."""
+    # The gufunc is looked up by the options rather than passed in so the
+    # task can be sent to the workers of a process or distributed scheduler
+    ufunc = get_ufunc(version, list(options))
+    return ufunc(
+        dates[:, None, None, None],
+        lons[:, None, None],
+        lats[:, None],
+        alts,
+        f107s[:, None, None, None],
+        f107as[:, None, None, None],
+        aps[:, None, None, None, :],
+    )
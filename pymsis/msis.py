@@ -1,25 +1,145 @@
 """Interface for running and creating input for the MSIS models."""
 
+import ctypes
+import importlib
+import math
+import os
 import threading
+import warnings
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass
+from datetime import datetime, timezone
 from enum import IntEnum
+from functools import partial
 from pathlib import Path
+from types import ModuleType
+from typing import TYPE_CHECKING
 
 import numpy as np
 import numpy.typing as npt
 
-from pymsis import msis00f, msis20f, msis21f  # type: ignore
 from pymsis.utils import get_f107_ap
 
 
+if TYPE_CHECKING:
+    # concurrent.futures imports logging, which is only needed with an executor
+    from concurrent.futures import Executor
+
+# The CPU features, as named by NumPy, of the kernel variants that are built
+# for newer x86-64 levels in addition to the baseline modules. Best first.
+_VARIANT_FEATURES = {
+    "x86_64_v4": ("AVX512F", "AVX512CD", "AVX512_SKX"),
+    "x86_64_v3": ("AVX", "AVX2", "FMA3", "F16C"),
+}
+
+
+def _cpu_features() -> dict[str, bool]:
+    """Get the CPU features detected by NumPy."""
+    try:
+        from numpy._core._multiarray_umath import (  # type: ignore # noqa: PLC0415
+            __cpu_features__,
+        )
+    except ImportError:
+        try:
+            # NumPy < 2
+            from numpy.core._multiarray_umath import (  # type: ignore # noqa: PLC0415
+                __cpu_features__,
+            )
+        except ImportError:
+            return {}
+    return __cpu_features__
+
+
+def _variant_built(variant: str) -> bool:
+    """Whether the kernel variant was built for this platform."""
+    return (Path(__file__).parent / f"_{variant}").is_dir()
+
+
+def _usable_variants() -> list[str]:
+    """List the kernel variants this machine can run, fastest first."""
+    features = _cpu_features()
+    return [
+        variant
+        for variant, needed in _VARIANT_FEATURES.items()
+        if _variant_built(variant) and all(features.get(name) for name in needed)
+    ] + ["baseline"]
+
+
+def _select_variant() -> str:
+    """Choose the kernel variant, PYMSIS_KERNEL_VARIANT overrides the choice."""
+    usable = _usable_variants()
+    requested = os.environ.get("PYMSIS_KERNEL_VARIANT", "auto")
+    if requested == "auto":
+        return usable[0]
+    if requested not in usable:
+        # An environment variable shouldn't make the import of pymsis fail
+        warnings.warn(
+            f"The kernel variant {requested!r} from PYMSIS_KERNEL_VARIANT can't be "
+            f"used on this machine, the usable variants are {usable}, "
+            "using the baseline kernels instead",
+            stacklevel=2,
+        )
+        return "baseline"
+    return requested
+
+
+def _import_kernel(name: str, variant: str):  # noqa: ANN202
+    """Import one of the MSIS extension modules of the kernel variant."""
+    package = "pymsis" if variant == "baseline" else f"pymsis._{variant}"
+    msis_lib = importlib.import_module(f"{package}.{name}")
+    if not hasattr(msis_lib, "_last_used_options"):
+        # Store the previous options to avoid reinitializing the model
+        # each iteration unless necessary
+        msis_lib._last_used_options = None  # type: ignore[attr-defined]
+    return msis_lib
+
+
+def _load_kernel(name: str):  # noqa: ANN202
+    """Get the extension module of a version, importing it on first use."""
+    msis_lib = _KERNELS.get(name)
+    if msis_lib is None:
+        msis_lib = _KERNELS[name] = _import_kernel(name, KERNEL_VARIANT)
+    return msis_lib
+
+
+def __getattr__(name: str):  # noqa: ANN202
+    # msis00f, msis20f and msis21f are only imported when they are used, and
+    # are the modules of KERNEL_VARIANT rather than the baseline submodules
+    if name in {"msis00f", "msis20f", "msis21f"}:
+        return _load_kernel(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# The kernel variant in use, "baseline" for the modules built for any CPU of
+# the platform, or the x86-64 level that the kernels were compiled for
+KERNEL_VARIANT = _select_variant()
+# The extension module of each version that has been used, by module name
+_KERNELS: dict[str, ModuleType] = {}
 # We need to point to the MSIS parameter file that was installed with the Python package
 _MSIS_PARAMETER_PATH = str(Path(__file__).resolve().parent) + "/"
+# The Fortran routine of the default point layout. pymsiscalc_points writes
+# it directly, but pymsiscalc stays the default until that routine has been
+# built and checked against the regression data of every version.
+_POINT_ROUTINE = "pymsiscalc"
 # A single global lock guarding all calls into the Fortran code.
 # per-library isn't sufficient because the Fortran code uses global state
+# that is shared by the whole process. Subinterpreters can't give each
+# interpreter its own copy either, the extension modules (and NumPy) can only
+# be loaded by one interpreter per process, so parallel runs use processes.
 _lock = threading.Lock()
-for lib in [msis00f, msis20f, msis21f]:
-    # Store the previous options to avoid reinitializing the model
-    # each iteration unless necessary
-    lib._last_used_options = None
+# Preallocated input table for calculate_point(), only used with the lock held.
+# The f2py wrappers accept these column views without any copies.
+_POINT_INPUT = np.empty((1, 14), dtype=np.float32, order="F")
+_POINT_COLUMNS = (*(_POINT_INPUT[:, i] for i in range(7)), _POINT_INPUT[:, 7:])
+# The record of the log10_int16 encoding from calculate(), 24 bytes per point
+COMPACT_DTYPE = np.dtype([("log10_density", "=i2", (10,)), ("temperature", "=f4")])
+# The encoded values of missing and zero densities
+_COMPACT_MISSING = -32768
+_COMPACT_ZERO = -32767
+# The gufuncs from get_ufunc() for each library and set of options
+_UFUNCS: dict[tuple, np.ufunc] = {}
+# The default number of points in each shard of calculate(executor=...)
+_SHARD_POINTS = 100_000
 
 
 class Variable(IntEnum):
@@ -72,9 +192,9 @@ class Variable(IntEnum):
 
 def calculate(
     dates: npt.ArrayLike,
-    lons: npt.ArrayLike,
-    lats: npt.ArrayLike,
-    alts: npt.ArrayLike,
+    lons: npt.ArrayLike | None = None,
+    lats: npt.ArrayLike | None = None,
+    alts: npt.ArrayLike | None = None,
     f107s: npt.ArrayLike | None = None,
     f107as: npt.ArrayLike | None = None,
     aps: npt.ArrayLike | None = None,
@@ -82,8 +202,14 @@ def calculate(
     options: list[float] | None = None,
     version: float | str = 2.1,
     interpolate_indices: bool = False,
+    return_quality: bool = False,
+    time_format: str | None = None,
+    layout: str = "point",
+    encoding: str | None = None,
+    executor: "Executor | None" = None,
+    parallel: str | None = None,
     **kwargs: dict,
-) -> npt.NDArray:
+) -> npt.NDArray | tuple[npt.NDArray, npt.NDArray]:
     r"""
     Call MSIS to calculate the atmosphere at the provided input points.
 
@@ -105,6 +231,17 @@ def calculate(
     for easier access. ``output_array[..., Variable.MASS_DENSITY]``
     returns the total mass density.
 
+    **Arrow Tables:**
+    If ``dates`` is a ``pyarrow.Table`` or ``pyarrow.RecordBatch``, the
+    points are the rows of its ``time``, ``lon``, ``lat`` and ``alt``
+    columns, and its ``f107``, ``f107a`` and ``ap`` columns if all three are
+    present. The ``ap`` column is either the daily Ap or a list column of the
+    7 ap values of each point, which are required for storm-time mode
+    (``geomagnetic_activity=-1``). The columns are read without a copy where
+    their types allow it and the output is an Arrow table with one float32
+    column per :class:`~.Variable`, named by the lower case variable name.
+    The other inputs are taken from the table and can't be passed as well.
+
     If F10.7, F10.7a, or Ap values are not provided, the historical data
     for the given date(s) will be used. If the local file is not available,
     the data will be downloaded and cached for future use. See
@@ -113,8 +250,8 @@ def calculate(
 
     Parameters
     ----------
-    dates : ArrayLike
-        Dates and times of interest
+    dates : ArrayLike or pyarrow.Table
+        Dates and times of interest, or an Arrow table of the input points
     lons : ArrayLike
        Geodetic longitudes (deg), referenced to the WGS84 ellipsoid
     lats : ArrayLike
@@ -148,6 +285,47 @@ def calculate(
         discretely at boundaries. Linear interpolation can provide smoother
         density variations for high-cadence simulations. Daily values ramp
         forward across the day, reaching that day's value at the next midnight.
+    return_quality : bool, default: False
+        If True, also return a boolean array of the input shape that is True
+        where the F10.7 used was interpolated or predicted (not observed)
+        rather than emitting a warning. This is cheaper than handling the
+        warnings in loops that call this function many times.
+    time_format : str, optional
+        How to interpret numeric dates. By default the dates are datetime-like
+        values, such as datetime64 arrays, pandas ``DatetimeIndex`` or Arrow
+        timestamp arrays, which are used without a copy. Otherwise one of
+        ``"unix"`` (float seconds since 1970-01-01), ``"unix_ns"`` (integer
+        nanoseconds since 1970-01-01) or ``"mjd"`` (float Modified Julian Date).
+        All times are UTC.
+    layout : {"point", "variable"}, default: "point"
+        The memory layout of the output. ``"point"`` returns the shapes below
+        with the 11 variables of each point next to each other in memory.
+        ``"variable"`` moves the variables to the first axis, for example
+        (11, ndates, nlons, nlats, nalts), with each variable contiguous in
+        memory. The model writes the ``"variable"`` layout directly, without
+        a copy.
+    encoding : {"log10_int16"}, optional
+        Return the output in a compact encoding written directly by the
+        model, for storing large grids. The result is a structured array of
+        the input shape with :data:`COMPACT_DTYPE`, where the 10 densities
+        are ``round(1000 * log10(density))`` int16 values (-32768 where
+        missing and -32767 where zero) and the temperature is float32. This
+        takes 24 bytes per point instead of 44. Use :func:`decode_output` to
+        convert it back.
+    executor : concurrent.futures.Executor, optional
+        Evaluate the points in shards submitted to this executor, such as a
+        ``ProcessPoolExecutor`` or a cluster executor with the same
+        ``submit()`` method. A grid is split along its dates and longitudes,
+        each shard is sent as slices of the input axes rather than expanded
+        points, and the results are put back together in the output. The
+        space weather indices are found before sharding, so the workers don't
+        need the space weather data. The model runs under a process-wide
+        lock, so thread executors evaluate one shard at a time.
+    parallel : {"auto"}, optional
+        Let pymsis choose between running in this process and running in
+        shards on a pool of worker processes, from the number of points,
+        the version and the calibration profile of this machine. See
+        :func:`pymsis.planner.plan` for the choice that will be made.
     **kwargs : dict
         Single options for the switches can be defined through keyword arguments.
         For example, ``calculate(..., geomagnetic_activity=-1)`` will set the
@@ -168,6 +346,14 @@ def calculate(
         | Anomalous oxygen # density (m\ :sup:`-3`),
         | NO # density (m\ :sup:`-3`),
         | Temperature (K)]
+        | With ``layout="variable"`` the variables are on the first axis.
+        | With ``encoding``, a structured array of shape (ndates, nlons, nlats,
+        | nalts) or (ndates,) instead.
+        | A ``pyarrow.Table`` if the input is an Arrow table.
+    ndarray (ndates, nlons, nlats, nalts) or (ndates,)
+        Only returned if ``return_quality`` is True. Whether the F10.7 used
+        at each point was interpolated or predicted. This is always False
+        where the F10.7 values were provided by the user.
 
     Other Parameters
     ----------------
@@ -243,13 +429,50 @@ def calculate(
     2. aps[1:] are only used when ``geomagnetic_activity=-1``.
 
     """
-    num_options = 25
-    if options is None:
-        options = create_options(**kwargs)  # type: ignore
-    elif len(options) != num_options:
-        raise ValueError(f"options needs to be a list of length {num_options}")
+    options = _get_options(options, **kwargs)
+    msis_lib = _get_msis_lib(version)
+    if _is_arrow_table(dates):
+        if layout != "point" or encoding is not None:
+            raise ValueError("layout and encoding can't be used with Arrow tables")
+        if executor is not None or parallel is not None:
+            raise ValueError("executor and parallel can't be used with Arrow tables")
+        return _calculate_arrow(
+            dates,
+            (lons, lats, alts, f107s, f107as, aps),
+            options=options,
+            version=version,
+            interpolate_indices=interpolate_indices,
+            return_quality=return_quality,
+            time_format=time_format,
+        )
+    if lons is None or lats is None or alts is None:
+        raise ValueError("lons, lats and alts are required unless dates is a table")
+    msiscalc = _get_msiscalc(msis_lib, layout, encoding)
+    shard_points = _SHARD_POINTS
+    if parallel is not None:
+        if executor is not None:
+            raise ValueError("parallel and executor can't be used together")
+        # The planner imports this module, so it is imported on first use
+        from pymsis import planner  # noqa: PLC0415
+
+        executor, shard_points = planner._choose_executor(
+            parallel, (dates, lons, lats, alts), version
+        )
+    if executor is not None:
+        return _calculate_sharded(
+            executor,
+            (dates, lons, lats, alts, f107s, f107as, aps),
+            shard_points=shard_points,
+            version=str(version),
+            options=options,
+            layout=layout,
+            encoding=encoding,
+            interpolate_indices=interpolate_indices,
+            return_quality=return_quality,
+            time_format=time_format,
+        )
 
-    input_shape, input_data = create_input(
+    input_shape, input_data, *quality = create_input(
         dates,
         lons,
         lats,
@@ -258,6 +481,8 @@ def calculate(
         f107as,
         aps,
         interpolate_indices=interpolate_indices,
+        return_quality=return_quality,
+        time_format=time_format,
     )
 
     if np.any(~np.isfinite(input_data)):
@@ -265,30 +490,29 @@ def calculate(
             "Input data has non-finite values, all input data must be valid."
         )
 
-    # convert to string version
-    version = str(version)
-    # Select the underlying MSIS library based on the version
-    match version:
-        case "0" | "00":
-            msis_lib = msis00f
-        case "2.0":
-            msis_lib = msis20f
-        case "2.1" | "2":
-            # generic 2 defaults to most recent available
-            msis_lib = msis21f
-        case _:
-            raise ValueError(
-                f"The MSIS version selected: {version} is not "
-                "one of the valid version numbers: (0, 2.0, 2.1)"
-            )
+    output = _run_msiscalc(msiscalc, msis_lib, options, input_data)
+    if encoding is not None:
+        # Each row of 12 int16 values is one compact record
+        output = output.view(COMPACT_DTYPE)[..., 0].reshape(input_shape)
+    elif layout == "point":
+        output = output.reshape(*input_shape, 11)
+    else:
+        output = output.reshape(11, *input_shape)
+    if return_quality:
+        return output, quality[0]
+    return output
 
-    with _lock:
-        # Only reinitialize the model if the options have changed
-        if msis_lib._last_used_options != options:
-            msis_lib.pyinitswitch(options, parmpath=_MSIS_PARAMETER_PATH)
-            msis_lib._last_used_options = options
 
-        output = msis_lib.pymsiscalc(
+def _run_msiscalc(
+    msiscalc,  # noqa: ANN001
+    msis_lib,  # noqa: ANN001
+    options: list[float],
+    input_data: npt.NDArray,
+) -> npt.NDArray:
+    """Run the Fortran routine on the rows of the create_input() array."""
+    with _lock:
+        _initialize(msis_lib, options)
+        return msiscalc(
             input_data[:, 0],
             input_data[:, 1],
             input_data[:, 2],
@@ -297,15 +521,609 @@ def calculate(
             input_data[:, 5],
             input_data[:, 6],
             input_data[:, 7:],
+        ).T
+
+
+@dataclass(frozen=True)
+class _Shard:
+    """Slices of the input axes that are evaluated together by an executor."""
+
+    date_columns: tuple[npt.NDArray, ...]
+    lons: npt.NDArray
+    lats: npt.NDArray
+    alts: npt.NDArray
+    grid: bool
+    version: str
+    options: list[float]
+    layout: str
+    encoding: str | None
+
+
+def _calculate_sharded(
+    executor: "Executor",
+    inputs: tuple,
+    *,
+    shard_points: int,
+    version: str,
+    options: list[float],
+    layout: str,
+    encoding: str | None,
+    interpolate_indices: bool,
+    return_quality: bool,
+    time_format: str | None,
+) -> npt.NDArray | tuple[npt.NDArray, npt.NDArray]:
+    """Evaluate the shards of the input on the executor and combine them."""
+    dates, lons, lats, alts, f107s, f107as, aps = inputs
+    date_columns, estimated = _date_columns(
+        dates,
+        f107s,
+        f107as,
+        aps,
+        interpolate_indices=interpolate_indices,
+        return_quality=return_quality,
+        time_format=time_format,
+    )
+    lons = np.atleast_1d(lons)
+    lats = np.atleast_1d(lats)
+    alts = np.atleast_1d(alts)
+    for column in (*date_columns, lons, lats, alts):
+        if np.any(~np.isfinite(np.asarray(column, dtype=np.float32))):
+            raise ValueError(
+                "Input data has non-finite values, all input data must be valid."
+            )
+
+    ndates = len(estimated)
+    grid = not (ndates == len(lons) == len(lats) == len(alts))
+    shape = (ndates, len(lons), len(lats), len(alts)) if grid else (ndates,)
+    output = _empty_output(shape, layout, encoding)
+
+    futures = []
+    try:
+        for index in _shard_indices(shape, shard_points):
+            # Grids are split along the dates and longitudes, points together
+            shard = _Shard(
+                tuple(column[index[0]] for column in date_columns),
+                lons[index[-1]],
+                lats if grid else lats[index[0]],
+                alts if grid else alts[index[0]],
+                grid,
+                version,
+                options,
+                layout,
+                encoding,
+            )
+            futures.append((index, executor.submit(_calculate_shard, shard)))
+        for index, future in futures:
+            if layout == "variable":
+                output[(slice(None), *index)] = future.result()
+            else:
+                output[index] = future.result()
+    except BaseException:
+        for _, future in futures:
+            future.cancel()
+        raise
+
+    if return_quality:
+        if grid:
+            estimated = np.broadcast_to(estimated[:, None, None, None], shape)
+        return output, estimated
+    return output
+
+
+def _empty_output(
+    shape: tuple[int, ...], layout: str, encoding: str | None
+) -> npt.NDArray:
+    """Allocate the output of the input shape in the layout and encoding."""
+    if encoding is not None:
+        return np.empty(shape, dtype=COMPACT_DTYPE)
+    if layout == "point":
+        return np.empty((*shape, 11), dtype=np.float32)
+    return np.empty((11, *shape), dtype=np.float32)
+
+
+def _shard_indices(
+    shape: tuple[int, ...], shard_points: int
+) -> list[tuple[slice, ...]]:
+    """Split the points or the dates and longitudes of a grid into shards."""
+    if len(shape) == 1:
+        return [
+            (slice(start, start + shard_points),)
+            for start in range(0, shape[0], shard_points)
+        ]
+    ndates, nlons, nlats, nalts = shape
+    # Whole longitudes, and whole dates once a shard has every longitude
+    lon_points = max(nlats * nalts, 1)
+    lon_step = max(min(shard_points // lon_points, nlons), 1)
+    date_step = 1
+    if lon_step >= nlons:
+        date_step = max(shard_points // (lon_step * lon_points), 1)
+    return [
+        (slice(date, date + date_step), slice(lon, lon + lon_step))
+        for date in range(0, ndates, date_step)
+        for lon in range(0, nlons, lon_step)
+    ]
+
+
+def _calculate_shard(shard: _Shard) -> npt.NDArray:
+    """Evaluate one shard, in the worker of an executor."""
+    msis_lib = _get_msis_lib(shard.version)
+    msiscalc = _get_msiscalc(msis_lib, shard.layout, shard.encoding)
+    input_data = _fill_input(
+        shard.date_columns, shard.lons, shard.lats, shard.alts, grid=shard.grid
+    )
+    shape: tuple[int, ...] = (len(shard.date_columns[0]),)
+    if shard.grid:
+        shape = (*shape, len(shard.lons), len(shard.lats), len(shard.alts))
+    output = _run_msiscalc(msiscalc, msis_lib, shard.options, input_data)
+    if shard.encoding is not None:
+        return output.view(COMPACT_DTYPE)[..., 0].reshape(shape)
+    if shard.layout == "point":
+        return output.reshape(*shape, 11)
+    return output.reshape(11, *shape)
+
+
+def _get_msiscalc(msis_lib, layout: str, encoding: str | None):  # noqa: ANN001, ANN202
+    """Select the Fortran routine writing the requested output layout."""
+    # The Fortran output is (11, n) for point-major and (n, 11) for
+    # variable-major, the transpose of either reshapes without a copy
+    match (layout, encoding):
+        case ("point", None):
+            return _point_msiscalc(msis_lib)
+        case ("variable", None):
+            return msis_lib.pymsiscalc
+        case ("point", "log10_int16"):
+            return msis_lib.pymsiscalc_compact
+        case (_, None):
+            raise ValueError(
+                f"layout {layout!r} is not one of the valid layouts: "
+                "('point', 'variable')"
+            )
+        case ("point", _):
+            raise ValueError(
+                f"encoding {encoding!r} is not one of the valid encodings: "
+                "(None, 'log10_int16')"
+            )
+        case _:
+            raise ValueError("layout='variable' can't be used with an encoding")
+
+
+def _point_msiscalc(msis_lib):  # noqa: ANN001, ANN202
+    """Select the Fortran routine of the (n, 11) point-major output."""
+    if _POINT_ROUTINE == "pymsiscalc_points":
+        return msis_lib.pymsiscalc_points
+    # The transpose of the (n, 11) column-major output, which _run_msiscalc
+    # transposes back and the reshape to the point layout copies
+    return partial(_transposed, msis_lib.pymsiscalc)
+
+
+def _transposed(msiscalc, *args: npt.NDArray) -> npt.NDArray:  # noqa: ANN001
+    return msiscalc(*args).T
+
+
+def _is_arrow_table(data: object) -> bool:
+    """Whether the data is a pyarrow Table or RecordBatch, without importing it."""
+    return type(data).__module__.startswith("pyarrow") and hasattr(data, "schema")
+
+
+def _calculate_arrow(  # noqa: ANN202
+    table,  # noqa: ANN001
+    other_inputs: tuple,
+    *,
+    options: list[float],
+    version: float | str,
+    interpolate_indices: bool,
+    return_quality: bool,
+    time_format: str | None,
+):
+    """
+    Calculate the rows of an Arrow table into a table of the variables.
+
+    other_inputs are the other positional inputs of calculate(), which are
+    read from the table instead and must not be given.
+    """
+    import pyarrow as pa  # type: ignore # noqa: PLC0415
+
+    if any(x is not None for x in other_inputs):
+        raise ValueError(
+            "lons, lats, alts, f107s, f107as and aps can't be used with "
+            "Arrow tables, they are read from the columns of the table"
         )
+    names = table.schema.names
+    missing = [name for name in ("time", "lon", "lat", "alt") if name not in names]
+    if missing:
+        raise ValueError(f"The Arrow table is missing the columns {missing}")
+    columns = {
+        name: _arrow_to_numpy(table.column(name))
+        for name in ("time", "lon", "lat", "alt", "f107", "f107a", "ap")
+        if name in names
+    }
+    dates = _to_datetime64(columns["time"], time_format)
+    n = len(dates)
 
-    return output.reshape(*input_shape, 11)
+    quality = np.zeros(n, dtype=bool)
+    if all(name in columns for name in ("f107", "f107a", "ap")):
+        f107s = columns["f107"]
+        f107as = columns["f107a"]
+        if columns["ap"].dtype == object:
+            # A list column of the 7 ap values of each point
+            if any(np.size(ap) != 7 for ap in columns["ap"]):  # noqa: PLR2004
+                raise ValueError("Every list of the ap column must have 7 values")
+            aps = np.array(columns["ap"].tolist(), dtype=np.float64).reshape(n, 7)
+        else:
+            aps = _daily_ap_history(columns["ap"], options)
+    else:
+        f107s, f107as, aps, *estimated = get_f107_ap(
+            dates, interpolate=interpolate_indices, return_quality=return_quality
+        )
+        if return_quality:
+            quality = estimated[0]
+
+    inputs = (dates, columns["lon"], columns["lat"], columns["alt"], f107s, f107as)
+    if np.isnat(dates).any() or not all(
+        np.isfinite(x).all() for x in (*inputs[1:], aps)
+    ):
+        raise ValueError(
+            "Input data has non-finite values, all input data must be valid."
+        )
+
+    # The gufunc reads the columns in place and writes each variable
+    # contiguously, so every output column is a view of one row
+    output = np.empty((len(Variable), n), dtype=np.float32)
+    get_ufunc(version, options)(
+        *inputs, aps, out=output, axes=[(), (), (), (), (), (), (1,), (0,)]
+    )
+    result = pa.table(
+        {variable.name.lower(): output[variable] for variable in Variable}
+    )
+    if return_quality:
+        return result, quality
+    return result
+
+
+def _daily_ap_history(daily_aps: npt.NDArray, options: list[float]) -> npt.NDArray:
+    """
+    Use the daily Ap of each point for all 7 ap inputs of the model.
+
+    Only the first ap value is used in the daily Ap mode, storm-time mode
+    (``geomagnetic_activity=-1``) needs the 3-hour ap history instead.
+    """
+    if options[8] == -1:
+        raise ValueError(
+            "geomagnetic_activity=-1 (storm-time mode) needs the 7 ap values of "
+            "each point, only the daily Ap was given"
+        )
+    daily_aps = np.asarray(daily_aps, dtype=np.float64)
+    return np.broadcast_to(daily_aps[:, None], (len(daily_aps), 7))
+
+
+def _arrow_to_numpy(column):  # noqa: ANN001, ANN202
+    """Convert an Arrow column to NumPy, without a copy if it has one chunk."""
+    if hasattr(column, "chunks"):
+        # Chunked columns of tables have to be concatenated
+        if column.num_chunks == 1:
+            column = column.chunk(0)
+        else:
+            column = column.combine_chunks()
+    # Null values become NaN or NaT, which copies the data
+    return column.to_numpy(zero_copy_only=False)
+
+
+def decode_output(compact: npt.NDArray) -> npt.NDArray:
+    """
+    Decode the compact output of :func:`calculate` to the regular output.
+
+    Parameters
+    ----------
+    compact : ndarray
+        Output of ``calculate(..., encoding="log10_int16")``, with
+        :data:`COMPACT_DTYPE`.
+
+    Returns
+    -------
+    ndarray (..., 11)
+        The float32 output of :func:`calculate` with the shape of ``compact``
+        and the variables on the last axis. The densities have a relative
+        error of at most 0.12% from the encoding, missing densities are NaN.
+    """
+    output = np.empty((*compact.shape, 11), dtype=np.float32)
+    log10_density = compact["log10_density"]
+    np.power(np.float32(10), log10_density / np.float32(1000), out=output[..., :10])
+    output[..., :10][log10_density == _COMPACT_ZERO] = 0
+    output[..., :10][log10_density == _COMPACT_MISSING] = np.nan
+    output[..., 10] = compact["temperature"]
+    return output
 
 
 # For backwards compatibility export the old name here
 run = calculate
 
 
+def calculate_point(
+    date: datetime | np.datetime64 | str,
+    lon: float,
+    lat: float,
+    alt: float,
+    f107: float | None = None,
+    f107a: float | None = None,
+    ap: float | Sequence[float] | None = None,
+    *,
+    options: list[float] | None = None,
+    version: float | str = 2.1,
+    **kwargs: dict,
+) -> npt.NDArray:
+    r"""
+    Call MSIS to calculate the atmosphere at a single point.
+
+    This is a low-latency version of :func:`calculate` for callers that
+    evaluate one point at a time, such as orbit integrators. The scalar inputs
+    are written into preallocated buffers rather than building and broadcasting
+    the input arrays of :func:`create_input`.
+
+    Parameters
+    ----------
+    date : datetime-like
+        Date and time of interest
+    lon : float
+        Geodetic longitude (deg), referenced to the WGS84 ellipsoid
+    lat : float
+        Geodetic latitude (deg), referenced to the WGS84 ellipsoid
+    alt : float
+        Geodetic altitude (km), referenced to the WGS84 ellipsoid
+    f107 : float, optional
+        Daily F10.7 of the previous day for the given date
+    f107a : float, optional
+        F10.7 running 81-day average centered on the given date
+    ap : float or Sequence[7], optional
+        Ap for the given date, see :func:`calculate` for the details
+    options : ArrayLike[25, float], optional
+        A list of options (switches) to the model, if options is passed
+        all keyword arguments specifying individual options will be ignored.
+    version : Number or string, default: 2.1
+        MSIS version number, one of (0, 2.0, 2.1).
+    **kwargs : dict
+        Single options for the switches can be defined through keyword arguments.
+        See :func:`calculate` for the available options.
+
+    Returns
+    -------
+    ndarray (11,)
+        The data calculated at the point, which can be indexed with the
+        :class:`~.Variable` enum.
+    """
+    options = _get_options(options, **kwargs)
+    msis_lib = _get_msis_lib(version)
+
+    dt: datetime
+    if not isinstance(date, datetime):
+        dt = np.datetime64(date).astype("datetime64[us]").item()
+    elif date.tzinfo is not None:
+        dt = date.astimezone(timezone.utc).replace(tzinfo=None)
+    else:
+        dt = date
+    # Match calculate(), which uses whole seconds of the day
+    dseconds = dt.hour * 3600 + dt.minute * 60 + dt.second
+    dyear = dt.timetuple().tm_yday
+
+    if f107 is None or f107a is None or ap is None:
+        data = get_f107_ap(np.datetime64(dt, "us"))
+        f107 = data[0][0] if f107 is None else f107
+        f107a = data[1][0] if f107a is None else f107a
+        ap = data[2][0] if ap is None else ap
+
+    # A single daily Ap is broadcast to the 7 values, like in create_input()
+    aps = [ap] * 7 if np.ndim(ap) == 0 else ap
+    values = (dyear, dseconds, lon, lat, alt, f107, f107a, *aps)  # type: ignore[misc]
+    if len(values) != 14:  # noqa: PLR2004
+        raise ValueError("ap needs to have 7 values")
+    if not all(map(math.isfinite, values)):
+        raise ValueError(
+            "Input data has non-finite values, all input data must be valid."
+        )
+
+    with _lock:
+        _POINT_INPUT[0] = values
+        _initialize(msis_lib, options)
+        output = msis_lib.pymsiscalc(*_POINT_COLUMNS)
+
+    return output[0]
+
+
+def get_kernel(
+    version: float | str = 2.1,
+    options: list[float] | None = None,
+    **kwargs: dict,
+) -> Callable[..., None]:
+    """
+    Get the C-callable MSIS kernel for use from compiled code.
+
+    The kernel lets compiled propagators (Numba, Cython, C extensions) call
+    MSIS without going back through Python for every evaluation. It has the
+    C signature::
+
+        void pymsis_msiscalc(int n, const float *day, const float *utsec,
+                             const float *lon, const float *lat,
+                             const float *alt, const float *f107,
+                             const float *f107a, const float *ap,
+                             float *output);
+
+    where the first seven arrays have ``n`` values, ``ap`` is a column-major
+    ``(n, 7)`` array and ``output`` is a column-major ``(n, 11)`` array that
+    can be indexed with :class:`~.Variable`. ``day`` is the day of year and
+    ``utsec`` the seconds of the day. The argument order is the same for all
+    MSIS versions. The raw function address for compiled callers is
+    ``ctypes.cast(kernel, ctypes.c_void_p).value``.
+
+    The model is initialized with the requested options before returning.
+    The underlying Fortran code keeps global state, so the kernel always
+    evaluates with the most recently initialized options of that version and
+    must not be called concurrently with itself or with :func:`calculate`.
+    Hold :data:`kernel_lock` around calls when other threads use pymsis, and
+    call :func:`get_kernel` again after any :func:`calculate` call with
+    different options.
+
+    Parameters
+    ----------
+    version : Number or string, default: 2.1
+        MSIS version number, one of (0, 2.0, 2.1).
+    options : ArrayLike[25, float], optional
+        A list of options (switches) to the model, if options is passed
+        all keyword arguments specifying individual options will be ignored.
+    **kwargs : dict
+        Single options for the switches can be defined through keyword arguments.
+        See :func:`calculate` for the available options.
+
+    Returns
+    -------
+    Callable
+        The kernel as a ctypes function, with argument types that accept
+        contiguous float32 numpy arrays directly.
+    """
+    options = _get_options(options, **kwargs)
+    msis_lib = _get_msis_lib(version)
+    kernel = _get_kernel(msis_lib)
+
+    with _lock:
+        _initialize(msis_lib, options)
+
+    return kernel
+
+
+# The lock to hold around calls to the kernel from get_kernel()
+kernel_lock = _lock
+
+
+def get_ufunc(
+    version: float | str = 2.1,
+    options: list[float] | None = None,
+    **kwargs: dict,
+) -> np.ufunc:
+    r"""
+    Get MSIS as a NumPy generalized ufunc.
+
+    The gufunc has the signature ``(),(),(),(),(),(),(7)->(11)`` for the
+    inputs ``(dates, lons, lats, alts, f107s, f107as, aps)``, with the same
+    meaning as in :func:`calculate`, and returns the 11 output variables
+    along the last axis. The inputs are broadcast against each other with
+    the usual NumPy rules and are read in place, so there are no fixed
+    flythrough or grid rules and no staging copy of the inputs. ``out=``
+    and ``axes=`` work as for any other gufunc. Note that NumPy does not
+    support ``where=`` for generalized ufuncs.
+
+    The dates must be datetime64 values, and all of the space weather
+    inputs must be given. Points with NaT or non-finite inputs return NaN
+    rather than raising. The ``pymsis.msis_ufunc`` gufunc is the default
+    version with the default options.
+
+    Parameters
+    ----------
+    version : Number or string, default: 2.1
+        MSIS version number, one of (0, 2.0, 2.1).
+    options : ArrayLike[25, float], optional
+        A list of options (switches) to the model, if options is passed
+        all keyword arguments specifying individual options will be ignored.
+    **kwargs : dict
+        Single options for the switches can be defined through keyword arguments.
+        See :func:`calculate` for the available options.
+
+    Returns
+    -------
+    numpy.ufunc
+        The gufunc evaluating MSIS with the requested version and options.
+
+    Examples
+    --------
+    >>> dates = np.datetime64("2003-10-29T12:00")
+    >>> lons = np.arange(-180, 180, 5)
+    >>> lats = np.arange(-90, 91, 5)[:, None]
+    >>> aps = np.full(7, 4.0)
+    >>> get_ufunc()(dates, lons, lats, 400, 150, 150, aps).shape
+    (37, 72, 11)
+    """
+    options = _get_options(options, **kwargs)
+    msis_lib = _get_msis_lib(version)
+    key = (msis_lib.__name__, tuple(options))
+    if key not in _UFUNCS:
+        kernel = _get_kernel(msis_lib)
+        from pymsis import _ufunc  # type: ignore # noqa: PLC0415
+
+        _UFUNCS[key] = _ufunc.make_gufunc(
+            ctypes.cast(kernel, ctypes.c_void_p).value,
+            partial(_enter_ufunc, msis_lib, options),
+            _lock.release,
+            "msis_ufunc",
+            "Evaluate MSIS, see pymsis.msis.get_ufunc() for the details.",
+        )
+    return _UFUNCS[key]
+
+
+def _get_kernel(msis_lib):  # noqa: ANN001, ANN202
+    """Load the C kernel of the library as a ctypes function."""
+    try:
+        kernel = ctypes.CDLL(msis_lib.__file__).pymsis_msiscalc
+    except AttributeError:
+        raise RuntimeError(
+            f"{msis_lib.__name__} was built without the C kernel, "
+            "rebuild pymsis to use get_kernel()"
+        ) from None
+
+    array = np.ctypeslib.ndpointer(np.float32, flags="F_CONTIGUOUS")
+    output = np.ctypeslib.ndpointer(
+        np.float32, ndim=2, flags=("F_CONTIGUOUS", "WRITEABLE")
+    )
+    kernel.argtypes = [ctypes.c_int, *[array] * 8, output]
+    kernel.restype = None
+    return kernel
+
+
+def _enter_ufunc(msis_lib, options: list[float]) -> None:  # noqa: ANN001
+    """Take the lock and initialize the library before the gufunc loop runs."""
+    _lock.acquire()
+    try:
+        _initialize(msis_lib, options)
+    except BaseException:
+        _lock.release()
+        raise
+
+
+def _get_options(options: list[float] | None = None, **kwargs: dict) -> list[float]:
+    """Validate the options list or create it from the keyword arguments."""
+    num_options = 25
+    if options is None:
+        if not kwargs:
+            return _DEFAULT_OPTIONS
+        return create_options(**kwargs)  # type: ignore
+    if len(options) != num_options:
+        raise ValueError(f"options needs to be a list of length {num_options}")
+    return options
+
+
+def _get_msis_lib(version: float | str):  # noqa: ANN202
+    """Select the underlying MSIS library based on the version."""
+    # convert to string version
+    version = str(version)
+    match version:
+        case "0" | "00":
+            return _load_kernel("msis00f")
+        case "2.0":
+            return _load_kernel("msis20f")
+        case "2.1" | "2":
+            # generic 2 defaults to most recent available
+            return _load_kernel("msis21f")
+        case _:
+            raise ValueError(
+                f"The MSIS version selected: {version} is not "
+                "one of the valid version numbers: (0, 2.0, 2.1)"
+            )
+
+
+def _initialize(msis_lib, options: list[float]) -> None:  # noqa: ANN001
+    """Initialize the library with the options, the lock must be held."""
+    # Only reinitialize the model if the options have changed
+    if msis_lib._last_used_options != options:
+        msis_lib.pyinitswitch(options, parmpath=_MSIS_PARAMETER_PATH)
+        msis_lib._last_used_options = options
+
+
 def create_options(
     f107: float = 1,
     time_independent: float = 1,
@@ -427,6 +1245,10 @@ def create_options(
     return options
 
 
+# Created once as the default options are needed on most calls
+_DEFAULT_OPTIONS = create_options()
+
+
 def create_input(
     dates: npt.ArrayLike,
     lons: npt.ArrayLike,
@@ -436,7 +1258,9 @@ def create_input(
     f107as: npt.ArrayLike | None = None,
     aps: npt.ArrayLike | None = None,
     interpolate_indices: bool = False,
-) -> tuple[tuple, npt.NDArray]:
+    return_quality: bool = False,
+    time_format: str | None = None,
+) -> tuple[tuple, npt.NDArray] | tuple[tuple, npt.NDArray, npt.NDArray]:
     """
     Combine all input values into a single flattened array.
 
@@ -459,6 +1283,11 @@ def create_input(
     interpolate_indices : bool, default: False
         If True, use linear interpolation for F10.7, F10.7a, and ap indices.
         If False, use step-function (nearest-neighbor) sampling.
+    return_quality : bool, default: False
+        If True, also return whether the F10.7 used at each point was
+        interpolated or predicted instead of emitting a warning.
+    time_format : str, optional
+        The format of numeric dates, see :func:`calculate`.
 
     Returns
     -------
@@ -467,31 +1296,84 @@ def create_input(
         the flattened version of the input data
         (ndates*nlons*nlats*nalts, 14). If the input array was preflattened
         (ndates == nlons == nlats == nalts), then the shape is (ndates,).
+        If ``return_quality`` is True, a boolean array of the given shape
+        flagging the interpolated or predicted F10.7 is included as well.
+    """
+    date_columns, estimated = _date_columns(
+        dates,
+        f107s,
+        f107as,
+        aps,
+        interpolate_indices=interpolate_indices,
+        return_quality=return_quality,
+        time_format=time_format,
+    )
+    lons = np.atleast_1d(lons)
+    lats = np.atleast_1d(lats)
+    alts = np.atleast_1d(alts)
+
+    ndates = len(estimated)
+    nlons = len(lons)
+    nlats = len(lats)
+    nalts = len(alts)
+
+    if ndates == nlons == nlats == nalts:
+        # This means the data came in preflattened, from a satellite
+        # trajectory for example, where we don't want to make a grid
+        # out of the input data, we just want to stack it together.
+        arr = _fill_input(date_columns, lons, lats, alts, grid=False)
+        if return_quality:
+            return (ndates,), arr, estimated
+        return (ndates,), arr
+
+    arr = _fill_input(date_columns, lons, lats, alts, grid=True)
+    shape = (ndates, nlons, nlats, nalts)
+    if return_quality:
+        return shape, arr, np.broadcast_to(estimated[:, None, None, None], shape)
+    return shape, arr
+
+
+def _date_columns(
+    dates: npt.ArrayLike,
+    f107s: npt.ArrayLike | None,
+    f107as: npt.ArrayLike | None,
+    aps: npt.ArrayLike | None,
+    *,
+    interpolate_indices: bool,
+    return_quality: bool,
+    time_format: str | None,
+) -> tuple[tuple[npt.NDArray, ...], npt.NDArray]:
+    """
+    Find the input columns that only depend on the date.
+
+    Returns the (dyear, dseconds, f107s, f107as, aps) columns with one row
+    per date, and whether the F10.7 of each date was estimated.
     """
     # Turn everything into arrays
-    dates_arr: npt.NDArray[np.datetime64] = np.atleast_1d(dates).astype(np.datetime64)
-    dates_arr_y = dates_arr.astype("datetime64[Y]")
-    dates_arr_d = dates_arr.astype("datetime64[D]")
-    dates_arr_s = dates_arr.astype("datetime64[s]")
-
-    # dyear is DOY 1-366
-    dyear: npt.NDArray[np.float64] = (dates_arr_d - dates_arr_y).astype(float) + 1.0
-    dseconds: npt.NDArray[np.float64] = (dates_arr_s - dates_arr_d).astype(float)
+    dates_arr = _to_datetime64(dates, time_format)
+    # Whole seconds since the epoch, floored for dates before 1970
+    days, dseconds = np.divmod(dates_arr.astype("datetime64[s]").view(np.int64), 86400)
+
+    # dyear is DOY 1-366, NaT is NaN so that it is rejected as non-finite input
+    dyear: npt.NDArray[np.float64] = _day_of_year(days).astype(float)
+    dyear[np.isnat(dates_arr)] = np.nan
     # TODO: Make it a continuous day of year?
     #       The new code mentions it should be and accepts float, but the
     #       regression tests indicate it should still be integer DOY
     # dyear += dseconds/86400
-    lons = np.atleast_1d(lons)
-    lats = np.atleast_1d(lats)
-    alts = np.atleast_1d(alts)
 
     # If any of the geomagnetic data wasn't specified, we will default
     # to getting it with the utility functions.
+    estimated = np.zeros(len(dates_arr), dtype=bool)
     if f107s is None or f107as is None or aps is None:
-        data = get_f107_ap(dates_arr, interpolate=interpolate_indices)
+        data = get_f107_ap(
+            dates_arr, interpolate=interpolate_indices, return_quality=return_quality
+        )
         # Only update the values that were None
         if f107s is None:
             f107s = data[0]
+            if return_quality:
+                estimated = data[3]
         if f107as is None:
             f107as = data[1]
         if aps is None:
@@ -502,22 +1384,27 @@ def create_input(
     aps = np.atleast_1d(aps)
 
     ndates = len(dates_arr)
-    nlons = len(lons)
-    nlats = len(lats)
-    nalts = len(alts)
-
     if not (ndates == len(f107s) == len(f107as) == len(aps)):
         raise ValueError(
             f"The length of dates ({ndates}), f107s "
             f"({len(f107s)}), f107as ({len(f107as)}), "
             f"and aps ({len(aps)}) must all be equal"
         )
+    return (dyear, dseconds, f107s, f107as, aps), estimated
 
-    if ndates == nlons == nlats == nalts:
-        # This means the data came in preflattened, from a satellite
-        # trajectory for example, where we don't want to make a grid
-        # out of the input data, we just want to stack it together.
-        # Create an array to hold all of the data
+
+def _fill_input(
+    date_columns: tuple[npt.NDArray, ...],
+    lons: npt.NDArray,
+    lats: npt.NDArray,
+    alts: npt.NDArray,
+    *,
+    grid: bool,
+) -> npt.NDArray:
+    """Create the flattened (npoints, 14) input of the points or of the grid."""
+    dyear, dseconds, f107s, f107as, aps = date_columns
+    ndates = len(dyear)
+    if not grid:
         # F-ordering so we can pass by reference to the Fortran code
         arr = np.empty((ndates, 14), dtype=np.float32, order="F")
         arr[:, 0] = dyear
@@ -528,8 +1415,11 @@ def create_input(
         arr[:, 5] = f107s
         arr[:, 6] = f107as
         arr[:, 7:] = aps
-        return (ndates,), arr
+        return arr
 
+    nlons = len(lons)
+    nlats = len(lats)
+    nalts = len(alts)
     # Use broadcasting to fill each column directly
     # This is much faster than creating an indices array and then
     # using that to fill the columns
@@ -542,5 +1432,70 @@ def create_input(
     arr[:, 5] = np.repeat(f107s, nlons * nlats * nalts)  # f107s
     arr[:, 6] = np.repeat(f107as, nlons * nlats * nalts)  # f107as
     arr[:, 7:] = np.repeat(aps, nlons * nlats * nalts, axis=0)  # aps
+    return arr
+
+
+def _to_datetime64(
+    dates: npt.ArrayLike, time_format: str | None = None
+) -> npt.NDArray[np.datetime64]:
+    """Convert the dates to a datetime64 array, without a copy where possible."""
+    match time_format:
+        case None:
+            dtype = getattr(dates, "dtype", None)
+            if getattr(dtype, "kind", None) == "M" and not isinstance(dtype, np.dtype):
+                # Timezone aware pandas data converts to UTC with an explicit unit
+                return np.atleast_1d(np.asarray(dates, dtype="datetime64[ns]"))
+            # datetime64 arrays, pandas and Arrow timestamps are used as is
+            arr = np.atleast_1d(np.asarray(dates))
+            if arr.dtype.kind != "M":
+                arr = arr.astype(np.datetime64)
+            return arr
+        case "unix_ns":
+            return np.atleast_1d(np.asarray(dates, dtype=np.int64)).view(
+                "datetime64[ns]"
+            )
+        case "unix":
+            return _float_to_datetime64(dates, 0, 1e6)
+        case "mjd":
+            # MJD 40587 is 1970-01-01
+            return _float_to_datetime64(dates, 40587, 86400e6)
+        case _:
+            raise ValueError(
+                f"time_format {time_format!r} is not one of the valid formats: "
+                "(None, 'unix', 'unix_ns', 'mjd')"
+            )
+
+
+def _float_to_datetime64(
+    values: npt.ArrayLike, epoch: float, scale: float
+) -> npt.NDArray[np.datetime64]:
+    """Convert floating point times to datetime64 with microsecond resolution."""
+    values = np.atleast_1d(np.asarray(values, dtype=np.float64))
+    finite = np.isfinite(values)
+    micros = np.where(finite, np.round((values - epoch) * scale), 0).astype(np.int64)
+    # Non-finite values become NaT
+    micros[~finite] = np.iinfo(np.int64).min
+    return micros.view("datetime64[us]")
+
+
+def _day_of_year(days: npt.NDArray[np.int64]) -> npt.NDArray[np.int64]:
+    """Day of year (1-366) for the days since 1970-01-01, with integer math."""
+    if days.size > 0:
+        # The inputs usually cover far fewer days than points, so evaluate the
+        # calendar once per day of the range and look the points up in it
+        first = days.min()
+        ndays = days.max() - first + 1
+        if ndays < days.size:
+            return _day_of_year(np.arange(first, first + ndays))[days - first]
 
-    return (ndates, nlons, nlats, nalts), arr
+    # civil_from_days from http://howardhinnant.github.io/date_algorithms.html
+    # using years that start on March 1st
+    z = days + 719468
+    era = z // 146097
+    doe = z - era * 146097
+    yoe = (doe - doe // 1460 + doe // 36524 - doe // 146096) // 365
+    doy = doe - (365 * yoe + yoe // 4 - yoe // 100)
+    year = yoe + era * 400
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    # January and February belong to the next calendar year
+    return np.where(doy >= 306, doy - 305, doy + 60 + leap)  # noqa: PLR2004
@@ -0,0 +1,308 @@
+"""Choose how to run a calculation from its size and a calibration profile."""
+
+import json
+import math
+import os
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import numpy.typing as npt
+
+from pymsis import msis
+
+
+_PROFILE_FILE: Path = Path(
+    os.environ.get(
+        "PYMSIS_PROFILE_FILE", Path.home() / ".cache" / "pymsis" / "profile.json"
+    )
+)
+# Costs in seconds used until calibrate() has been run on this machine
+_DEFAULT_PROFILE: dict = {
+    # Model evaluation of one point, by version
+    "point_seconds": {"0": 1.5e-6, "2.0": 3e-6, "2.1": 3e-6},
+    # Creating the input rows of one point
+    "input_seconds": 5e-8,
+    # Fixed overhead of one calculate() call
+    "call_seconds": 2e-5,
+    # Starting the worker processes
+    "worker_seconds": 0.2,
+    # Submitting one shard and receiving its result
+    "shard_seconds": 5e-4,
+    # Sending the output of one point back from a worker
+    "transfer_seconds": 5e-8,
+}
+_PROFILE: dict | None = None
+# Bytes per point of the inputs, outputs and temporaries of a calculation
+_POINT_BYTES = 100
+# Shards smaller than this are not worth the round trip to a worker
+_MIN_SHARD_POINTS = 10_000
+# Shards per worker, so that the workers finish at about the same time
+_SHARDS_PER_WORKER = 4
+# The process pool used by calculate(parallel="auto")
+_EXECUTOR: ProcessPoolExecutor | None = None
+_EXECUTOR_WORKERS = 0
+
+
+@dataclass(frozen=True)
+class Plan:
+    """
+    How a calculation will run with ``calculate(..., parallel="auto")``.
+
+    Attributes
+    ----------
+    mode : str
+        ``"serial"`` to run in the calling process, or ``"process"`` to run
+        in shards on worker processes.
+    workers : int
+        Number of processes evaluating the model.
+    shard_points : int
+        Number of points of each shard.
+    npoints : int
+        Number of points of the calculation.
+    seconds : float
+        Predicted run time in seconds.
+    memory : int
+        Predicted peak memory in bytes.
+    """
+
+    mode: str
+    workers: int
+    shard_points: int
+    npoints: int
+    seconds: float
+    memory: int
+
+
+def plan(
+    dates: npt.ArrayLike,
+    lons: npt.ArrayLike,
+    lats: npt.ArrayLike,
+    alts: npt.ArrayLike,
+    *,
+    version: float | str = 2.1,
+    workers: int | None = None,
+) -> Plan:
+    """
+    Plan how ``calculate(..., parallel="auto")`` will run the inputs.
+
+    The cost of running in the calling process is compared to the cost of
+    running in shards on worker processes, using the costs in the
+    calibration profile of this machine (see :func:`calibrate`) or typical
+    costs if there is no profile. Small calculations always run in the
+    calling process. Threads are never used, because the model runs under
+    a process-wide lock.
+
+    Parameters
+    ----------
+    dates, lons, lats, alts : ArrayLike
+        The inputs as given to :func:`~pymsis.calculate`, only their sizes
+        are used.
+    version : Number or string, default: 2.1
+        MSIS version number, one of (0, 2.0, 2.1).
+    workers : int, optional
+        Maximum number of worker processes, the number of CPUs by default.
+
+    Returns
+    -------
+    Plan
+        The chosen mode, number of workers and shard size, with the
+        predicted time and memory.
+    """
+    msis_lib = msis._get_msis_lib(version)
+    sizes = [np.size(x) for x in (dates, lons, lats, alts)]
+    npoints = sizes[0] if len(set(sizes)) == 1 else math.prod(sizes)
+    workers = (os.cpu_count() or 1) if workers is None else workers
+    if workers < 1:
+        raise ValueError("workers must be a positive integer")
+    return _plan(npoints, msis_lib, workers)
+
+
+def _plan(npoints: int, msis_lib, max_workers: int) -> Plan:  # noqa: ANN001
+    """Choose the cheapest way of running npoints with the profile."""
+    profile = _get_profile()
+    name = msis_lib.__name__.rsplit(".", 1)[-1]
+    version = {"msis00f": "0", "msis20f": "2.0", "msis21f": "2.1"}[name]
+    point_seconds = profile["point_seconds"][version] + profile["input_seconds"]
+
+    best = Plan(
+        "serial",
+        1,
+        npoints,
+        npoints,
+        profile["call_seconds"] + npoints * point_seconds,
+        npoints * _POINT_BYTES,
+    )
+    for workers in range(2, max_workers + 1):
+        shard_points = max(
+            -(-npoints // (_SHARDS_PER_WORKER * workers)), _MIN_SHARD_POINTS
+        )
+        nshards = -(-npoints // shard_points)
+        if nshards < workers:
+            break
+        seconds = (
+            nshards * profile["shard_seconds"]
+            + npoints * profile["transfer_seconds"]
+            + npoints * point_seconds / workers
+        )
+        if workers > _EXECUTOR_WORKERS:
+            seconds += profile["worker_seconds"]
+        if seconds < best.seconds:
+            # The output and the results waiting to be copied into it,
+            # and the shards being evaluated
+            memory = (2 * npoints + workers * shard_points) * _POINT_BYTES
+            best = Plan("process", workers, shard_points, npoints, seconds, memory)
+    return best
+
+
+def _get_executor(workers: int) -> ProcessPoolExecutor:
+    """Get the process pool, started again if it needs more workers."""
+    global _EXECUTOR, _EXECUTOR_WORKERS  # noqa: PLW0603
+    if _EXECUTOR is None or _EXECUTOR_WORKERS < workers:
+        if _EXECUTOR is not None:
+            _EXECUTOR.shutdown(wait=False)
+        _EXECUTOR = ProcessPoolExecutor(max_workers=workers)
+        _EXECUTOR_WORKERS = workers
+    return _EXECUTOR
+
+
+def _choose_executor(
+    parallel: str,
+    inputs: tuple,
+    version: float | str,
+) -> tuple[ProcessPoolExecutor | None, int]:
+    """Find the executor and shard size of calculate(parallel=...)."""
+    if parallel != "auto":
+        raise ValueError(f"parallel {parallel!r} must be None or 'auto'")
+    chosen = plan(*inputs, version=version)
+    if chosen.mode == "serial":
+        return None, chosen.shard_points
+    return _get_executor(chosen.workers), chosen.shard_points
+
+
+def _get_profile() -> dict:
+    """Load the calibration profile, or use the typical costs."""
+    global _PROFILE  # noqa: PLW0603
+    if _PROFILE is None:
+        profile = _merge_profile({})
+        if _PROFILE_FILE.exists():
+            try:
+                profile = _merge_profile(json.loads(_PROFILE_FILE.read_text()))
+            except (OSError, ValueError) as e:
+                warnings.warn(
+                    f"The pymsis profile {_PROFILE_FILE} could not be read ({e}), "
+                    "using typical costs instead",
+                    stacklevel=3,
+                )
+        _PROFILE = profile
+    return _PROFILE
+
+
+def _merge_profile(loaded: dict) -> dict:
+    """
+    Fill in the costs missing from a loaded profile with the typical costs.
+
+    The versions of ``point_seconds`` are merged one by one, so a profile of
+    an older pymsis or a hand-edited one only replaces the costs it has.
+    """
+    if not isinstance(loaded, dict) or not isinstance(
+        loaded.get("point_seconds", {}), dict
+    ):
+        raise ValueError("the profile is not a mapping of costs")
+    profile = {**_DEFAULT_PROFILE, **loaded}
+    profile["point_seconds"] = {
+        **_DEFAULT_PROFILE["point_seconds"],
+        **loaded.get("point_seconds", {}),
+    }
+    costs = [profile[key] for key in _DEFAULT_PROFILE if key != "point_seconds"]
+    costs += [
+        profile["point_seconds"][key] for key in _DEFAULT_PROFILE["point_seconds"]
+    ]
+    if not all(
+        isinstance(cost, (int, float)) and not isinstance(cost, bool) and cost >= 0
+        for cost in costs
+    ):
+        raise ValueError("the costs must be non-negative numbers of seconds")
+    return profile
+
+
+def calibrate(file: str | Path | None = None) -> dict:
+    """
+    Measure the costs of running pymsis on this machine and save them.
+
+    The profile is used by :func:`plan` and ``calculate(...,
+    parallel="auto")``. It is saved to ``~/.cache/pymsis/profile.json``
+    by default, which can be changed with the environment variable
+    ``PYMSIS_PROFILE_FILE``. This takes a few seconds.
+
+    Parameters
+    ----------
+    file : str or Path, optional
+        Save the profile to this file instead, and use it from now on.
+
+    Returns
+    -------
+    dict
+        The measured costs in seconds.
+    """
+    global _PROFILE_FILE, _PROFILE  # noqa: PLW0603
+    npoints = 20_000
+    date = np.datetime64("2000-07-01T00:00")
+    lons = np.linspace(-180, 180, npoints)
+    points = (np.full(npoints, date), lons, lons / 2, np.full(npoints, 400.0))
+    indices = (
+        np.full(npoints, 150.0),
+        np.full(npoints, 150.0),
+        np.full((npoints, 7), 4.0),
+    )
+
+    profile: dict = {"point_seconds": {}}
+    call_seconds = _best_time(
+        lambda: msis.calculate(date, 0, 0, 400, 150, 150, [[4] * 7])
+    )
+    for version in ("0", "2.0", "2.1"):
+        seconds = _best_time(
+            lambda version=version: msis.calculate(*points, *indices, version=version)
+        )
+        profile["point_seconds"][version] = max(seconds - call_seconds, 0) / npoints
+    profile["input_seconds"] = (
+        _best_time(lambda: msis.create_input(*points, *indices)) / npoints
+    )
+    profile["call_seconds"] = call_seconds
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        executor.submit(os.getpid).result()
+        profile["worker_seconds"] = time.perf_counter() - start
+        profile["shard_seconds"] = _best_time(
+            lambda: executor.submit(os.getpid).result()
+        )
+        output = np.empty((npoints, 11), dtype=np.float32)
+        profile["transfer_seconds"] = (
+            max(
+                _best_time(lambda: executor.submit(np.copy, output).result())
+                - profile["shard_seconds"],
+                0,
+            )
+            / npoints
+        )
+
+    if file is not None:
+        _PROFILE_FILE = Path(file)
+    _PROFILE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    _PROFILE_FILE.write_text(json.dumps(profile, indent=2))
+    _PROFILE = _merge_profile(profile)
+    return profile
+
+
+def _best_time(func, repeat: int = 5) -> float:  # noqa: ANN001
+    """Shortest time in seconds of a few calls to func."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
@@ -0,0 +1,241 @@
+"""Pool of worker processes that keep the models initialized between calls."""
+
+import itertools
+import os
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor, wait
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+import numpy.typing as npt
+
+from pymsis import msis, utils
+
+
+# Input rows and output rows of every point in the shared memory block
+_NINPUTS = 14
+_NOUTPUTS = 11
+
+
+class WorkerPool:
+    """
+    Process pool whose workers stay initialized between calculations.
+
+    A new process pool pays the startup of every worker on each job, which
+    imports the model extensions and reads the parameter file of the model.
+    A WorkerPool starts its workers once, initializes each of the requested
+    versions with the options in every worker, and reuses the workers for
+    every :meth:`calculate` call. The points are split between the workers
+    and exchanged through shared memory, so the arrays are never pickled.
+
+    The space weather indices are looked up in the calling process, the
+    workers only evaluate the model. Worker processes are used rather than
+    subinterpreters because the model state lives in the Fortran libraries,
+    which are shared by every interpreter of a process, and NumPy and the
+    model extensions can't be loaded in more than one interpreter.
+
+    Parameters
+    ----------
+    workers : int, optional
+        Number of worker processes, the number of CPUs by default.
+    versions : sequence of Number or string, default: (2.1,)
+        MSIS versions to initialize in every worker. The first one is the
+        default version of :meth:`calculate`.
+    options : ArrayLike[25, float], optional
+        A list of options (switches) to the model used for all calculations
+        of the pool, if options is passed all keyword arguments specifying
+        individual options will be ignored.
+    **kwargs : dict
+        Single options for the switches can be defined through keyword
+        arguments. See :func:`~pymsis.calculate` for the available options.
+
+    Examples
+    --------
+    >>> with pymsis.WorkerPool(4, versions=[2.1, 0]) as pool:
+    ...     for date in dates:
+    ...         output = pool.calculate(date, lons, lats, alts)
+    """
+
+    def __init__(
+        self,
+        workers: int | None = None,
+        *,
+        versions: Sequence[float | str] = (2.1,),
+        options: list[float] | None = None,
+        **kwargs: dict,
+    ) -> None:
+        workers = (os.cpu_count() or 1) if workers is None else workers
+        if workers < 1:
+            raise ValueError("workers must be a positive integer")
+        if len(versions) == 0:
+            raise ValueError("At least one version is required")
+        for version in versions:
+            msis._get_msis_lib(version)
+        self.workers = workers
+        self.versions = tuple(str(version) for version in versions)
+        self.options = list(msis._get_options(options, **kwargs))
+        if os.name == "posix":
+            # The workers have to share the resource tracker of this process,
+            # or each of them would track the blocks it attaches to as its own
+            resource_tracker.ensure_running()
+        self._executor: ProcessPoolExecutor | None = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(self.versions, self.options),
+        )
+        # Start and initialize all of the workers now rather than on first use
+        wait([self._executor.submit(os.getpid) for _ in range(workers)])
+
+    def calculate(
+        self,
+        dates: npt.ArrayLike,
+        lons: npt.ArrayLike,
+        lats: npt.ArrayLike,
+        alts: npt.ArrayLike,
+        f107s: npt.ArrayLike | None = None,
+        f107as: npt.ArrayLike | None = None,
+        aps: npt.ArrayLike | None = None,
+        *,
+        version: float | str | None = None,
+        interpolate_indices: bool = False,
+        time_format: str | None = None,
+    ) -> npt.NDArray:
+        """
+        Calculate MSIS on the workers of the pool.
+
+        The arguments are the same as for :func:`~pymsis.calculate`, with the
+        options of the pool. Versions that are not in the ``versions`` of the
+        pool are initialized in the workers when they are first used.
+
+        Returns
+        -------
+        ndarray (ndates, nlons, nlats, nalts, 11) or (ndates, 11)
+            The data calculated at each grid point.
+        """
+        if self._executor is None:
+            raise RuntimeError("Cannot calculate with a closed WorkerPool")
+        version = self.versions[0] if version is None else str(version)
+        msis._get_msis_lib(version)
+        shape, input_data, *_ = msis.create_input(
+            dates,
+            lons,
+            lats,
+            alts,
+            f107s,
+            f107as,
+            aps,
+            interpolate_indices=interpolate_indices,
+            time_format=time_format,
+        )
+        if np.any(~np.isfinite(input_data)):
+            raise ValueError(
+                "Input data has non-finite values, all input data must be valid."
+            )
+
+        npoints = len(input_data)
+        itemsize = np.dtype(np.float32).itemsize
+        block = shared_memory.SharedMemory(
+            create=True, size=max(npoints * (_NINPUTS + _NOUTPUTS) * itemsize, 1)
+        )
+        try:
+            output = self._run(block, input_data, version)
+        finally:
+            block.close()
+            block.unlink()
+        return output.reshape(*shape, _NOUTPUTS)
+
+    def close(self) -> None:
+        """Stop the worker processes."""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self) -> "WorkerPool":
+        """Use the WorkerPool as a context manager that closes it on exit."""
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        """Close the WorkerPool."""
+        self.close()
+
+    def _run(
+        self,
+        block: shared_memory.SharedMemory,
+        input_data: npt.NDArray,
+        version: str,
+    ) -> npt.NDArray:
+        """Evaluate the points in the block on the workers and copy the output."""
+        inputs, outputs = _block_arrays(block, len(input_data))
+        try:
+            inputs[...] = input_data.T
+            bounds = np.linspace(
+                0, len(input_data), min(self.workers, len(input_data)) + 1
+            ).astype(int)
+            futures = [
+                self._executor.submit(  # type: ignore[union-attr]
+                    _calculate_chunk,
+                    block.name,
+                    len(input_data),
+                    chunk,
+                    version=version,
+                    options=self.options,
+                )
+                for chunk in itertools.pairwise(bounds)
+            ]
+            # Every worker has to be done with the block before it is released
+            wait(futures)
+            for future in futures:
+                future.result()
+            return outputs.copy()
+        finally:
+            # The block can only be closed once no views into it remain
+            del inputs, outputs
+
+
+def _block_arrays(
+    block: shared_memory.SharedMemory, npoints: int
+) -> tuple[npt.NDArray, npt.NDArray]:
+    """
+    Create the input and output views into a shared memory block.
+
+    The inputs are stored as (14, npoints) so that every input of a chunk of
+    points is contiguous, and the outputs as (npoints, 11).
+    """
+    inputs = np.ndarray((_NINPUTS, npoints), dtype=np.float32, buffer=block.buf)
+    outputs = np.ndarray(
+        (npoints, _NOUTPUTS),
+        dtype=np.float32,
+        buffer=block.buf,
+        offset=inputs.nbytes,
+    )
+    return inputs, outputs
+
+
+def _init_worker(versions: tuple[str, ...], options: list[float]) -> None:
+    """Initialize every version of the pool in a new worker."""
+    for version in versions:
+        msis_lib = msis._get_msis_lib(version)
+        with msis._lock:
+            msis._initialize(msis_lib, options)
+
+
+def _calculate_chunk(
+    name: str,
+    npoints: int,
+    chunk: tuple[int, int],
+    *,
+    version: str,
+    options: list[float],
+) -> None:
+    """Evaluate the (start, stop) chunk of the points in the block in a worker."""
+    block = utils._open_shared_memory(name)
+    inputs, outputs = _block_arrays(block, npoints)
+    try:
+        start, stop = chunk
+        msis_lib = msis._get_msis_lib(version)
+        outputs[start:stop] = msis._run_msiscalc(
+            msis._point_msiscalc(msis_lib), msis_lib, options, inputs[:, start:stop].T
+        )
+    finally:
+        del inputs, outputs
+        block.close()
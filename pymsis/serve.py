@@ -0,0 +1,361 @@
+"""
+Local MSIS server that keeps the model warm for short-lived processes.
+
+Start the server with ``python -m pymsis.serve`` and call it with
+:func:`calculate`. The points are posted as the same ``time``, ``lon``,
+``lat``, ``alt`` (and optional ``f107``, ``f107a`` with either the daily
+``ap`` or the storm-time ``ap1`` to ``ap7``) columns that ``pymsis run``
+reads, either as a NumPy structured array in ``.npy`` format or as an Arrow
+IPC stream. Only the standard library is needed, the Arrow
+format also needs pyarrow.
+"""
+
+import argparse
+import http.client
+import io
+import os
+import socket
+import socketserver
+import urllib.parse
+import warnings
+from collections.abc import Sequence
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import numpy.typing as npt
+
+from pymsis import msis, utils
+from pymsis.batch import Batcher
+from pymsis.cli import _OUTPUT_COLUMNS, _check_columns, _convert, _indices
+
+
+NPY_TYPE = "application/x-npy"
+ARROW_TYPE = "application/vnd.apache.arrow.stream"
+
+
+def calculate(
+    address: str,
+    points: npt.NDArray,
+    *,
+    version: float | str = 2.1,
+    timeout: float | None = None,
+    **kwargs: float,
+) -> npt.NDArray:
+    """
+    Calculate the points on a running pymsis server.
+
+    Parameters
+    ----------
+    address : str
+        ``http://host:port`` of the server, or the path of its Unix socket.
+    points : ndarray or pyarrow.Table
+        Structured array or Arrow table with the ``time``, ``lon``, ``lat``
+        and ``alt`` columns, and optionally ``f107``, ``f107a`` and either
+        ``ap`` (daily Ap) or ``ap1`` to ``ap7`` (the ap history of
+        ``geomagnetic_activity=-1``).
+    version : Number or string, default: 2.1
+        MSIS version number, one of (0, 2.0, 2.1).
+    timeout : float, optional
+        Timeout in seconds of the connection to the server.
+    **kwargs : float
+        Single options for the switches, see :func:`~pymsis.calculate`.
+
+    Returns
+    -------
+    ndarray (npoints, 11) or pyarrow.Table
+        The output of each point, or an Arrow table with one column per
+        :class:`~pymsis.Variable` if the points were an Arrow table.
+    """
+    if msis._is_arrow_table(points):
+        content_type = ARROW_TYPE
+        body = _write_arrow(points)
+    else:
+        content_type = NPY_TYPE
+        buffer = io.BytesIO()
+        np.save(buffer, np.asarray(points), allow_pickle=False)
+        body = buffer.getvalue()
+
+    query = urllib.parse.urlencode({"version": version, **kwargs})
+    connection = _connect(address, timeout)
+    try:
+        connection.request(
+            "POST",
+            f"/calculate?{query}",
+            body=body,
+            headers={"Content-Type": content_type},
+        )
+        response = connection.getresponse()
+        data = response.read()
+    finally:
+        connection.close()
+    if response.status != http.HTTPStatus.OK:
+        raise RuntimeError(f"pymsis server error {response.status}: {data.decode()}")
+    if content_type == ARROW_TYPE:
+        return _read_arrow(data)
+    return np.load(io.BytesIO(data), allow_pickle=False)
+
+
+def serve(
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    *,
+    unix_socket: str | None = None,
+    workers: int = 1,
+    window: float = 0.001,
+) -> None:
+    """
+    Run the pymsis server until it is interrupted.
+
+    The space weather data and the model are loaded before the server
+    starts. Requests arriving together are evaluated in batches, see
+    :class:`~pymsis.Batcher`. With more than one worker, the server forks
+    worker processes after loading everything, which share the loaded data
+    and accept connections from the same socket.
+
+    Parameters
+    ----------
+    host : str, default: "127.0.0.1"
+        Address to listen on.
+    port : int, default: 8765
+        TCP port to listen on.
+    unix_socket : str, optional
+        Listen on this Unix socket path instead of a TCP port.
+    workers : int, default: 1
+        Number of server processes, more than one requires ``os.fork``.
+    window : float, default: 0.001
+        Time in seconds to gather concurrent requests into one batch.
+    """
+    if workers < 1:
+        raise ValueError("workers must be a positive integer")
+    if workers > 1 and not hasattr(os, "fork"):
+        raise ValueError("Multiple workers are not supported on this platform")
+    _warm_up()
+    server = _make_server(host, port, unix_socket, window)
+
+    # The workers inherit the listening socket and the loaded data
+    children: list[int] = []
+    for _ in range(workers - 1):
+        pid = os.fork()
+        if pid == 0:
+            children = []
+            break
+        children.append(pid)
+    is_parent = len(children) == workers - 1
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if is_parent:
+            for pid in children:
+                os.waitpid(pid, 0)
+            if unix_socket is not None:
+                os.unlink(unix_socket)
+
+
+def _make_server(
+    host: str, port: int, unix_socket: str | None, window: float
+) -> socketserver.BaseServer:
+    """Bind the server socket, the requests are served by serve_forever()."""
+    if unix_socket is not None:
+        if os.path.exists(unix_socket):
+            os.unlink(unix_socket)
+        server: socketserver.BaseServer = _UnixHTTPServer(unix_socket, _Handler)
+    else:
+        server = ThreadingHTTPServer((host, port), _Handler)
+    server.batcher = Batcher(window=window)  # type: ignore[attr-defined]
+    return server
+
+
+def _warm_up() -> None:
+    """Load the space weather data and initialize each model version."""
+    try:
+        utils.get_f107_ap(np.datetime64("2000-01-01T00:00"))
+    except (OSError, ValueError) as e:
+        warnings.warn(
+            f"The space weather data could not be loaded ({e}), requests have "
+            "to include the f107, f107a and ap columns",
+            stacklevel=2,
+        )
+    for version in (0, 2.0, 2.1):
+        msis.calculate(
+            np.datetime64("2000-01-01T00:00"),
+            0,
+            0,
+            100,
+            150,
+            150,
+            [[4] * 7],
+            version=version,
+        )
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "pymsis"
+    protocol_version = "HTTP/1.1"
+
+    def address_string(self) -> str:
+        # Unix socket clients have no host address
+        return str(self.client_address or "unix")
+
+    def do_GET(self) -> None:
+        if self.path == "/health":
+            self._respond(http.HTTPStatus.OK, "text/plain", b"ok")
+        else:
+            self._respond(http.HTTPStatus.NOT_FOUND, "text/plain", b"Not found")
+
+    def do_POST(self) -> None:
+        url = urllib.parse.urlsplit(self.path)
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if url.path != "/calculate":
+            self._respond(http.HTTPStatus.NOT_FOUND, "text/plain", b"Not found")
+            return
+        content_type = self.headers.get("Content-Type", NPY_TYPE)
+        if content_type not in {NPY_TYPE, ARROW_TYPE}:
+            message = f"Content-Type must be {NPY_TYPE} or {ARROW_TYPE}"
+            self._respond(
+                http.HTTPStatus.UNSUPPORTED_MEDIA_TYPE, "text/plain", message.encode()
+            )
+            return
+
+        try:
+            query = dict(urllib.parse.parse_qsl(url.query))
+            version = query.pop("version", "2.1")
+            options = {name: float(value) for name, value in query.items()}
+            output = self._calculate(body, content_type, version, options)
+        except (ValueError, TypeError, ImportError) as e:
+            self._respond(http.HTTPStatus.BAD_REQUEST, "text/plain", str(e).encode())
+            return
+        except Exception as e:
+            # Answer instead of dropping the connection, e.g. when the batch failed
+            self._respond(
+                http.HTTPStatus.INTERNAL_SERVER_ERROR, "text/plain", str(e).encode()
+            )
+            return
+
+        if content_type == ARROW_TYPE:
+            import pyarrow as pa  # type: ignore # noqa: PLC0415
+
+            table = pa.table(dict(zip(_OUTPUT_COLUMNS, output.T, strict=True)))
+            data = _write_arrow(table)
+        else:
+            buffer = io.BytesIO()
+            np.save(buffer, output, allow_pickle=False)
+            data = buffer.getvalue()
+        self._respond(http.HTTPStatus.OK, content_type, data)
+
+    def _calculate(
+        self, body: bytes, content_type: str, version: str, options: dict[str, float]
+    ) -> npt.NDArray:
+        """Evaluate the posted points in the next batch."""
+        if content_type == ARROW_TYPE:
+            table = _read_arrow(body)
+            names = table.schema.names
+            columns = {name: msis._arrow_to_numpy(table[name]) for name in names}
+        else:
+            points = np.load(io.BytesIO(body), allow_pickle=False).reshape(-1)
+            names = points.dtype.names or ()
+            columns = {name: points[name] for name in names}
+        _check_columns("The request", names)
+        columns = _convert(columns)
+        f107s, f107as, aps = _indices(columns, msis.create_options(**options))
+        output = self.server.batcher.calculate(  # type: ignore[attr-defined]
+            columns["time"],
+            columns["lon"],
+            columns["lat"],
+            columns["alt"],
+            f107s,
+            f107as,
+            aps,
+            version=version,
+            **options,
+        )
+        return output.reshape(-1, len(_OUTPUT_COLUMNS))
+
+    def _respond(self, status: int, content_type: str, data: bytes) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args: object) -> None:
+        # Requests are not logged, there can be thousands of them per second
+        pass
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: float | None = None) -> None:
+        super().__init__("localhost", timeout=timeout)
+        self._path = path
+
+    def connect(self) -> None:
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self._path)
+
+
+def _connect(address: str, timeout: float | None) -> http.client.HTTPConnection:
+    if address.startswith("http://"):
+        url = urllib.parse.urlsplit(address)
+        return http.client.HTTPConnection(
+            url.hostname or "localhost", url.port, timeout=timeout
+        )
+    return _UnixHTTPConnection(address, timeout)
+
+
+def _write_arrow(table) -> bytes:  # noqa: ANN001
+    import pyarrow as pa  # noqa: PLC0415
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _read_arrow(data: bytes):  # noqa: ANN202
+    try:
+        import pyarrow as pa  # noqa: PLC0415
+    except ImportError:
+        raise ImportError("The Arrow format requires pyarrow") from None
+    return pa.ipc.open_stream(data).read_all()
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    """Run the server from the command line, ``python -m pymsis.serve``."""
+    parser = argparse.ArgumentParser(
+        prog="python -m pymsis.serve",
+        description="Serve pymsis calculations over HTTP on this machine.",
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="default: %(default)s")
+    parser.add_argument("--port", type=int, default=8765, help="default: %(default)s")
+    parser.add_argument("--socket", help="listen on a Unix socket path instead")
+    parser.add_argument(
+        "--workers", type=int, default=1, help="server processes (default: 1)"
+    )
+    parser.add_argument(
+        "--window",
+        type=float,
+        default=0.001,
+        help="seconds to gather requests into a batch (default: %(default)s)",
+    )
+    args = parser.parse_args(argv)
+    try:
+        serve(
+            args.host,
+            args.port,
+            unix_socket=args.socket,
+            workers=args.workers,
+            window=args.window,
+        )
+    except (ValueError, OSError) as e:
+        parser.exit(1, f"pymsis.serve: error: {e}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+"""Calculate grids that don't fit in memory directly into on-disk array stores."""
+
+import hashlib
+import itertools
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Protocol, TextIO
+
+import numpy as np
+import numpy.typing as npt
+
+from pymsis.msis import _get_msis_lib, _get_options, _to_datetime64, get_ufunc
+from pymsis.utils import get_f107_ap
+
+
+class _ArrayStore(Protocol):
+    """The array of a store, a NumPy memmap, a Zarr array or an h5py dataset."""
+
+    shape: tuple[int, ...]
+
+    @property
+    def dtype(self) -> np.dtype: ...
+
+    def __setitem__(self, key: tuple, value: npt.NDArray) -> None: ...
+
+
+def calculate_to_store(
+    dates: npt.ArrayLike,
+    lons: npt.ArrayLike,
+    lats: npt.ArrayLike,
+    alts: npt.ArrayLike,
+    f107s: npt.ArrayLike | None = None,
+    f107as: npt.ArrayLike | None = None,
+    aps: npt.ArrayLike | None = None,
+    *,
+    store: str | Path,
+    chunks: tuple[int, int, int, int] | None = None,
+    options: list[float] | None = None,
+    version: float | str = 2.1,
+    **kwargs: dict,
+) -> _ArrayStore:
+    """
+    Calculate MSIS on a grid and write it to an on-disk array store.
+
+    The grid is the same as the grid mode of :func:`~pymsis.calculate`, with
+    a (ndates, nlons, nlats, nalts, 11) float32 output, but it is computed one
+    chunk at a time so it never has to fit in memory. Each chunk is written
+    from a background thread while the next chunk is computed.
+
+    The completed chunks are recorded in a ``<store>.progress`` file next to
+    the store. If a run is interrupted, calling this function again with the
+    same arguments only computes the chunks that are missing, or starts over
+    if the store was removed or replaced in the meantime. A run with
+    different inputs, options or version raises instead of resuming. The
+    progress file is removed once the whole grid has been written.
+
+    Parameters
+    ----------
+    dates : ArrayLike
+        Dates and times of interest
+    lons : ArrayLike
+        Geodetic longitudes (deg), referenced to the WGS84 ellipsoid
+    lats : ArrayLike
+        Geodetic latitudes (deg), referenced to the WGS84 ellipsoid
+    alts : ArrayLike
+        Geodetic altitudes (km), referenced to the WGS84 ellipsoid
+    f107s : ArrayLike, optional
+        Daily F10.7 of the previous day for the given date(s)
+    f107as : ArrayLike, optional
+        F10.7 running 81-day average centered on the given date(s)
+    aps : ArrayLike, optional
+        Ap for the given date(s), see :func:`~pymsis.calculate`
+    store : str or Path
+        Path of the store, the format is selected by the suffix: ``.npy`` for
+        a NumPy file that is written through a memory map, ``.zarr`` for a
+        Zarr array (requires ``zarr``) and ``.h5`` or ``.hdf5`` for the
+        ``msis`` dataset of an HDF5 file (requires ``h5py``).
+    chunks : tuple of 4 ints, optional
+        The number of (dates, lons, lats, alts) computed and written at a
+        time. Defaults to all of the lons, lats and alts of one date. Zarr
+        and HDF5 stores use the same chunks on disk.
+    options : ArrayLike[25, float], optional
+        A list of options (switches) to the model, if options is passed
+        all keyword arguments specifying individual options will be ignored.
+    version : Number or string, default: 2.1
+        MSIS version number, one of (0, 2.0, 2.1).
+    **kwargs : dict
+        Single options for the switches can be defined through keyword arguments.
+        See :func:`~pymsis.calculate` for the available options.
+
+    Returns
+    -------
+    array-like (ndates, nlons, nlats, nalts, 11)
+        The store's array, a NumPy memmap, a Zarr array or an h5py dataset.
+        The HDF5 file stays open until ``array.file.close()`` is called.
+    """
+    options = _get_options(options, **kwargs)
+    ufunc = get_ufunc(version, options)
+    inputs = _grid_inputs(dates, lons, lats, alts, f107s, f107as, aps)
+    dates_arr, lons, lats, alts, f107s, f107as, aps = inputs
+
+    shape = (len(dates_arr), len(lons), len(lats), len(alts))
+    chunk_shape = _chunk_shape(chunks, shape)
+
+    path = Path(store)
+    progress_path = path.with_name(path.name + ".progress")
+    # The header guards against resuming a store of a different calculation
+    digest = _digest(inputs, options, version)
+    header = f"shape={shape} chunks={chunk_shape} digest={digest}\n"
+    done = _read_progress(progress_path, header)
+    array = None
+    if done:
+        array = _reopen_store(path, (*shape, 11), (*chunk_shape, 11))
+    if array is None:
+        # The chunks marked as done are gone with a missing or replaced store
+        done = set()
+        array = _open_store(path, (*shape, 11), (*chunk_shape, 11), resume=False)
+        progress_path.write_text(header)
+
+    starts = itertools.product(
+        *(range(0, n, c) for n, c in zip(shape, chunk_shape, strict=True))
+    )
+    with (
+        ThreadPoolExecutor(max_workers=1) as writer,
+        progress_path.open("a") as progress,
+    ):
+        pending: Future | None = None
+        for index, start in enumerate(starts):
+            if index in done:
+                continue
+            d, i, j, k = (
+                slice(s, s + c) for s, c in zip(start, chunk_shape, strict=True)
+            )
+            output = ufunc(
+                dates_arr[d, None, None, None],
+                lons[i, None, None],
+                lats[j, None],
+                alts[k],
+                f107s[d, None, None, None],
+                f107as[d, None, None, None],
+                aps[d, None, None, None, :],
+            )
+            # Only one chunk is in flight so at most two are held in memory
+            if pending is not None:
+                pending.result()
+            pending = writer.submit(
+                _write_chunk, array, (d, i, j, k), output, progress, index
+            )
+        if pending is not None:
+            pending.result()
+
+    _flush(array)
+    progress_path.unlink()
+    return array
+
+
+def _grid_inputs(
+    dates: npt.ArrayLike,
+    lons: npt.ArrayLike,
+    lats: npt.ArrayLike,
+    alts: npt.ArrayLike,
+    f107s: npt.ArrayLike | None,
+    f107as: npt.ArrayLike | None,
+    aps: npt.ArrayLike | None,
+) -> tuple[npt.NDArray, ...]:
+    """Validate the grid inputs and fill in the space weather data."""
+    dates_arr = _to_datetime64(dates)
+    if f107s is None or f107as is None or aps is None:
+        data = get_f107_ap(dates_arr)
+        f107s = data[0] if f107s is None else f107s
+        f107as = data[1] if f107as is None else f107as
+        aps = data[2] if aps is None else aps
+    values = [
+        np.atleast_1d(x).astype(np.float64) for x in (lons, lats, alts, f107s, f107as)
+    ]
+    values.append(np.atleast_2d(aps).astype(np.float64))
+
+    ndates = len(dates_arr)
+    if not (ndates == len(values[3]) == len(values[4]) == len(values[5])):
+        raise ValueError(
+            f"The length of dates ({ndates}), f107s "
+            f"({len(values[3])}), f107as ({len(values[4])}), "
+            f"and aps ({len(values[5])}) must all be equal"
+        )
+    # The gufunc returns NaN for invalid points, raise like calculate() instead
+    if np.isnat(dates_arr).any() or not all(np.isfinite(x).all() for x in values):
+        raise ValueError(
+            "Input data has non-finite values, all input data must be valid."
+        )
+    return (dates_arr, *values)
+
+
+def _digest(
+    inputs: tuple[npt.NDArray, ...], options: list[float], version: float | str
+) -> str:
+    """Hash of everything that determines the values of the grid."""
+    sha = hashlib.sha256()
+    # The module name, so that aliases like 2 and 2.1 are the same version
+    sha.update(_get_msis_lib(version).__name__.rsplit(".", 1)[-1].encode())
+    sha.update(np.asarray(options, dtype=np.float64).tobytes())
+    for x in inputs:
+        sha.update(str((x.dtype.str, x.shape)).encode())
+        sha.update(np.ascontiguousarray(x).tobytes())
+    return sha.hexdigest()
+
+
+def _chunk_shape(
+    chunks: tuple[int, ...] | None, shape: tuple[int, ...]
+) -> tuple[int, ...]:
+    """Validate the chunks of the grid, defaulting to one date at a time."""
+    if chunks is None:
+        chunks = (1, *shape[1:])
+    if len(chunks) != len(shape) or any(c < 1 for c in chunks):
+        raise ValueError("chunks must be 4 positive integers")
+    return tuple(min(c, max(n, 1)) for c, n in zip(chunks, shape, strict=True))
+
+
+def _read_progress(path: Path, header: str) -> set[int]:
+    """Read the indices of the completed chunks from the progress file."""
+    if not path.exists():
+        return set()
+    lines = path.read_text().splitlines(keepends=True)
+    if not lines or lines[0] != header:
+        raise ValueError(
+            f"{path} belongs to a different calculation, remove it and the "
+            "store to start over"
+        )
+    return {int(line) for line in lines[1:] if line.strip()}
+
+
+def _open_store(
+    path: Path, shape: tuple[int, ...], chunks: tuple[int, ...], resume: bool
+) -> _ArrayStore:
+    """Open the array of the store, creating it unless resuming a run."""
+    openers = {
+        ".npy": _open_npy,
+        ".zarr": _open_zarr,
+        ".h5": _open_hdf5,
+        ".hdf5": _open_hdf5,
+    }
+    suffix = path.suffix.lower()
+    if suffix not in openers:
+        raise ValueError(
+            f"Unknown store format {path.suffix!r}, "
+            "use one of ('.npy', '.zarr', '.h5', '.hdf5')"
+        )
+    array = openers[suffix](path, shape, chunks, resume)
+    if tuple(array.shape) != shape:
+        _close(array)
+        raise ValueError(
+            f"The store has the shape {tuple(array.shape)} instead of {shape}"
+        )
+    return array
+
+
+def _reopen_store(
+    path: Path, shape: tuple[int, ...], chunks: tuple[int, ...]
+) -> _ArrayStore | None:
+    """Open the store of an interrupted run, None if it is missing or different."""
+    if not path.exists():
+        return None
+    try:
+        array = _open_store(path, shape, chunks, resume=True)
+    except (OSError, KeyError, ValueError):
+        return None
+    if array.dtype != np.float32:
+        _close(array)
+        return None
+    return array
+
+
+def _open_npy(
+    path: Path, shape: tuple[int, ...], chunks: tuple[int, ...], resume: bool
+) -> _ArrayStore:
+    """Open a NumPy file through a memory map."""
+    if resume:
+        return np.load(path, mmap_mode="r+")
+    return np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=shape)
+
+
+def _open_zarr(
+    path: Path, shape: tuple[int, ...], chunks: tuple[int, ...], resume: bool
+) -> _ArrayStore:
+    """Open a Zarr array."""
+    try:
+        import zarr  # type: ignore # noqa: PLC0415
+    except ImportError:
+        raise ImportError("Writing Zarr stores requires zarr") from None
+    if resume:
+        return zarr.open_array(path, mode="r+")
+    return zarr.open_array(
+        path, mode="w", shape=shape, chunks=chunks, dtype=np.float32, fill_value=np.nan
+    )
+
+
+def _open_hdf5(
+    path: Path, shape: tuple[int, ...], chunks: tuple[int, ...], resume: bool
+) -> _ArrayStore:
+    """Open the msis dataset of an HDF5 file."""
+    try:
+        import h5py  # type: ignore # noqa: PLC0415
+    except ImportError:
+        raise ImportError("Writing HDF5 stores requires h5py") from None
+    if resume:
+        return h5py.File(path, "r+")["msis"]
+    return h5py.File(path, "w").create_dataset(
+        "msis", shape=shape, chunks=chunks, dtype=np.float32, fillvalue=np.nan
+    )
+
+
+def _write_chunk(
+    array: _ArrayStore, key: tuple, output: npt.NDArray, progress: TextIO, index: int
+) -> None:
+    """Write one chunk and record it as done once it is stored."""
+    array[key] = output
+    _flush(array)
+    progress.write(f"{index}\n")
+    progress.flush()
+
+
+def _close(array: _ArrayStore) -> None:
+    """Close the file of an h5py dataset, the other stores need no closing."""
+    if hasattr(array, "file"):
+        array.file.close()
+
+
+def _flush(array: _ArrayStore) -> None:
+    """Flush any buffered writes of the store to disk."""
+    if isinstance(array, np.memmap):
+        array.flush()
+    elif hasattr(array, "file"):
+        # h5py datasets
+        array.file.flush()
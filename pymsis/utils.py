@@ -1,10 +1,12 @@
 """Utilities for obtaining input datasets."""
 
 import os
-import urllib.request
+import sys
 import warnings
+from dataclasses import dataclass
 from io import BytesIO
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 import numpy as np
 import numpy.typing as npt
@@ -12,6 +14,9 @@ import numpy.typing as npt
 import pymsis
 
 
+if TYPE_CHECKING:
+    from multiprocessing import shared_memory
+
 _DATA_FNAME: str = "SW-All.csv"
 _F107_AP_URL: str = f"https://celestrak.org/SpaceData/{_DATA_FNAME}"
 _F107_AP_DEFAULT_FILE: Path = Path(pymsis.__file__).parent / _DATA_FNAME
@@ -20,6 +25,9 @@ _DATA: dict[str, npt.NDArray] | None = None
 _F107_AP_FILE: Path = Path(
     os.environ.get("PYMSIS_SPACE_WEATHER_FILE", _F107_AP_DEFAULT_FILE)
 )
+# Shared memory blocks created or attached by this process, by block name.
+# References are held here so the mapped buffers stay valid while in use.
+_SHARED_MEMORY: dict[str, "shared_memory.SharedMemory"] = {}
 
 
 def use_space_weather_file(file: str | Path | None = None) -> None:
@@ -60,6 +68,213 @@ def use_space_weather_file(file: str | Path | None = None) -> None:
     _DATA = None
 
 
+def use_space_weather_data(
+    dates: npt.ArrayLike,
+    f107s: npt.ArrayLike,
+    f107as: npt.ArrayLike,
+    aps: npt.ArrayLike,
+    *,
+    daily_aps: npt.ArrayLike | None = None,
+    predicted: npt.ArrayLike = False,
+) -> None:
+    """
+    Direct pymsis to use F10.7 and ap data held in memory.
+
+    This is useful for forecast or synthetic scenarios where the space weather
+    values are generated programmatically, avoiding writing the data out in the
+    CelesTrak file format and parsing it again. The derived values (previous day
+    F10.7 and the ap history) are computed in the same way as for data loaded
+    from a file and the data is used until this function or
+    :func:`use_space_weather_file` is called again.
+
+    Parameters
+    ----------
+    dates : ArrayLike
+        Days of the records in increasing order, any missing days
+        are treated as missing values
+    f107s : ArrayLike
+        Daily F10.7 observed on each day. The value from the previous day
+        is used by the model, the same as for data loaded from a file.
+    f107as : ArrayLike
+        F10.7 running 81-day average centered on each day
+    aps : ArrayLike
+        The eight 3-hourly ap values of each day, of shape (ndays, 8) or
+        flattened to (ndays * 8,)
+    daily_aps : ArrayLike, optional
+        Daily Ap of each day, defaults to the average of the 3-hourly values
+    predicted : ArrayLike or bool, default: False
+        Whether the F10.7 of each day was interpolated or predicted,
+        a warning will be emitted when those values are used.
+    """
+    dates_arr = np.atleast_1d(dates).astype("datetime64[D]")
+    ndays = len(dates_arr)
+    if ndays == 0:
+        raise ValueError("At least one date of space weather data is required")
+    f107_arr = np.atleast_1d(f107s).astype(float)
+    f107a_arr = np.atleast_1d(f107as).astype(float)
+    ap_arr = np.asarray(aps, dtype=float)
+    if ap_arr.size % 8 != 0 or (ap_arr.ndim > 1 and ap_arr.shape[-1] != 8):  # noqa: PLR2004
+        raise ValueError(
+            f"aps of shape {ap_arr.shape} must hold the eight 3-hourly ap "
+            "values of each day, of shape (ndays, 8) or (ndays * 8,)"
+        )
+    ap_arr = ap_arr.reshape(-1, 8)
+    if daily_aps is None:
+        daily_ap_arr = ap_arr.mean(axis=1)
+    else:
+        daily_ap_arr = np.atleast_1d(daily_aps).astype(float)
+    warn_data = np.broadcast_to(np.asarray(predicted, dtype=bool), (ndays,))
+
+    if (
+        not (ndays == len(f107_arr) == len(f107a_arr) == len(ap_arr))
+        or len(daily_ap_arr) != ndays
+    ):
+        raise ValueError(
+            f"The length of dates ({ndays}), f107s ({len(f107_arr)}), "
+            f"f107as ({len(f107a_arr)}), aps ({len(ap_arr)}), and daily_aps "
+            f"({len(daily_ap_arr)}) must all be equal"
+        )
+    if np.any(np.diff(dates_arr) <= np.timedelta64(0, "D")):
+        raise ValueError("The dates must be increasing")
+
+    global _DATA  # noqa: PLW0603
+    _DATA = _derive_f107_ap_data(
+        dates_arr, f107_arr, f107a_arr, ap_arr, daily_ap_arr, warn_data
+    )
+
+
+@dataclass(frozen=True)
+class SharedSpaceWeatherData:
+    """
+    Handle to space weather data published in shared memory.
+
+    This is returned by :func:`share_space_weather_data` and is small and
+    picklable, so it can be sent to worker processes which then call
+    :func:`attach_space_weather_data` with it.
+
+    Attributes
+    ----------
+    name : str
+        Name of the shared memory block
+    layout : tuple
+        (key, dtype, shape, offset) of each array within the block
+    """
+
+    name: str
+    layout: tuple[tuple[str, str, tuple[int, ...], int], ...]
+
+    def unlink(self) -> None:
+        """
+        Release the shared memory block.
+
+        This should be called by the process that created the block once all
+        workers are done with it. Workers that are still attached keep their
+        mapping until they exit.
+        """
+        shm = _SHARED_MEMORY.pop(self.name, None)
+        if shm is None:
+            from multiprocessing import shared_memory  # noqa: PLC0415
+
+            shm = shared_memory.SharedMemory(name=self.name)
+        shm.close()
+        shm.unlink()
+
+
+def share_space_weather_data() -> SharedSpaceWeatherData:
+    """
+    Publish the current F10.7 and ap data into shared memory.
+
+    Loading and deriving the space weather data in every worker of a process
+    pool multiplies both the startup time and the memory used. Instead, the
+    data can be published once and attached without copying by each worker.
+
+    The data currently in use is published, loading it first if needed, so
+    :func:`use_space_weather_file` or :func:`use_space_weather_data` should be
+    called before this function if custom data is wanted.
+
+    Returns
+    -------
+    SharedSpaceWeatherData
+        Handle to pass to :func:`attach_space_weather_data` in each worker. Call
+        ``unlink()`` on it when the workers are done.
+
+    Examples
+    --------
+    >>> shared = pymsis.utils.share_space_weather_data()
+    >>> with ProcessPoolExecutor(
+    ...     initializer=pymsis.utils.attach_space_weather_data, initargs=(shared,)
+    ... ) as executor:
+    ...     results = executor.map(...)
+    >>> shared.unlink()
+    """
+    data = _DATA or _load_f107_ap_data()
+
+    # Keep every array aligned to a cache line within the block
+    alignment = 64
+    layout = []
+    size = 0
+    for key, arr in data.items():
+        layout.append((key, arr.dtype.str, arr.shape, size))
+        size += -(-arr.nbytes // alignment) * alignment
+
+    from multiprocessing import shared_memory  # noqa: PLC0415
+
+    shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    _SHARED_MEMORY[shm.name] = shm
+    shared = SharedSpaceWeatherData(shm.name, tuple(layout))
+    for key, arr in _shared_arrays(shm, shared.layout).items():
+        arr[...] = data[key]
+    return shared
+
+
+def attach_space_weather_data(shared: SharedSpaceWeatherData) -> None:
+    """
+    Use space weather data published by :func:`share_space_weather_data`.
+
+    The arrays are views into the shared memory block, so no data is read from
+    disk or copied. This is intended to be used as the initializer of worker
+    processes started by the process that shared the data.
+
+    Parameters
+    ----------
+    shared : SharedSpaceWeatherData
+        Handle returned by :func:`share_space_weather_data`
+    """
+    shm = _SHARED_MEMORY.get(shared.name)
+    if shm is None:
+        shm = _open_shared_memory(shared.name)
+        _SHARED_MEMORY[shared.name] = shm
+    data = _shared_arrays(shm, shared.layout)
+    for arr in data.values():
+        arr.flags.writeable = False
+
+    global _DATA  # noqa: PLW0603
+    _DATA = data
+
+
+def _open_shared_memory(name: str) -> "shared_memory.SharedMemory":
+    """Attach to a shared memory block created by another process."""
+    from multiprocessing import shared_memory  # noqa: PLC0415
+
+    if sys.version_info >= (3, 13):
+        # Only the creating process should be responsible for the block
+        return shared_memory.SharedMemory(name=name, track=False)
+    # Child processes share the resource tracker of their parent,
+    # so registering the block again is a no-op there
+    return shared_memory.SharedMemory(name=name)
+
+
+def _shared_arrays(
+    shm: "shared_memory.SharedMemory",
+    layout: tuple[tuple[str, str, tuple[int, ...], int], ...],
+) -> dict[str, npt.NDArray]:
+    """Create the array views into a shared memory block."""
+    return {
+        key: np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+        for key, dtype, shape, offset in layout
+    }
+
+
 def download_f107_ap() -> None:
     """
     Download the latest ap and F10.7 values.
@@ -96,6 +311,9 @@ def download_f107_ap() -> None:
             "custom file path using `use_space_weather_file(None)` to use the "
             "downloaded file."
         )
+    # The network stack is only imported when a download is needed
+    import urllib.request  # noqa: PLC0415
+
     req = urllib.request.urlopen(_F107_AP_URL)
     with _F107_AP_DEFAULT_FILE.open("wb") as f:
         f.write(req.read())
@@ -167,16 +385,10 @@ def _load_f107_ap_data() -> dict[str, npt.NDArray]:
                 fout, delimiter=",", dtype=dtype, usecols=usecols, skiprows=1
             )  # type: ignore
 
-    # transform each day's 8 3-hourly ap values into a single column
-    ap = np.empty(len(arr) * 8, dtype=float)
-    daily_ap = arr["Ap"].astype(float)
-    dates = np.repeat(arr["date"], 8).astype("datetime64[m]")
-    for i in range(8):
-        ap[i::8] = arr[f"ap{i + 1}"]
-        dates[i::8] += i * np.timedelta64(3, "h")
-
     # data file has missing values as negatives
+    ap = np.column_stack([arr[f"ap{i + 1}"] for i in range(8)]).astype(float)
     ap[ap < 0] = np.nan
+    daily_ap = arr["Ap"].astype(float)
     daily_ap[daily_ap < 0] = np.nan
     # There are also some non-physical f10.7 values
     # F10.7 > 400 is unrealistic indicating a solar radio burst
@@ -186,11 +398,80 @@ def _load_f107_ap_data() -> dict[str, npt.NDArray]:
     arr["f107"][bad_f107] = arr["f107a"][bad_f107]
     # flag it as interpolated or predicted values so we warn the user
     arr["f107-type"][bad_f107] = b"INT"
+    # So that we can warn the user that this F107 data was interpolated or predicted
+    interpolated = b"INT"
+    predicted = b"PRD"
+    warn_data = (arr["f107-type"] == interpolated) | (arr["f107-type"] == predicted)
+
+    data = _derive_f107_ap_data(
+        arr["date"], arr["f107"], arr["f107a"], ap, daily_ap, warn_data
+    )
+    # Set the global module-level data variable
+    global _DATA  # noqa: PLW0603
+    _DATA = data
+    return data
+
+
+def _derive_f107_ap_data(
+    dates: npt.NDArray,
+    f107: npt.NDArray,
+    f107a: npt.NDArray,
+    ap: npt.NDArray,
+    daily_ap: npt.NDArray,
+    warn_data: npt.NDArray,
+) -> dict[str, npt.NDArray]:
+    """
+    Derive the lookup tables used by :func:`get_f107_ap` from daily records.
+
+    The records are placed on a contiguous daily timeline, so any missing days
+    become missing (NaN) values instead of shifting the values derived from the
+    neighboring records and the offsets used to look them up.
+
+    Parameters
+    ----------
+    dates : ndarray of datetime64[D] (ndays,)
+        Increasing days of the records
+    f107 : ndarray (ndays,)
+        Observed F10.7 on each day
+    f107a : ndarray (ndays,)
+        F10.7 81-day average centered on each day
+    ap : ndarray (ndays, 8)
+        The eight 3-hourly ap values of each day
+    daily_ap : ndarray (ndays,)
+        Daily Ap of each day
+    warn_data : ndarray of bool (ndays,)
+        Whether the F10.7 of each day was interpolated or predicted
+
+    Returns
+    -------
+    dict
+        The dates (3-hourly), ap, f107, f107a, and warn_data lookup tables
+    """
+    day_offsets = (dates - dates[0]).astype(int)
+    ndays = day_offsets[-1] + 1
+    if ndays != len(dates):
+        # There are gaps in the records, fill them with missing values
+        def fill(values: npt.NDArray, missing: float | bool = np.nan) -> npt.NDArray:
+            out = np.full((ndays, *np.shape(values)[1:]), missing, dtype=values.dtype)
+            out[day_offsets] = values
+            return out
+
+        dates = dates[0] + np.arange(ndays)
+        f107 = fill(f107)
+        f107a = fill(f107a)
+        ap = fill(ap)
+        daily_ap = fill(daily_ap)
+        warn_data = fill(warn_data, missing=False)
+
+    # transform each day's 8 3-hourly ap values into a single column
+    ap = np.ravel(ap)
+    dates = np.repeat(dates, 8).astype("datetime64[m]")
+    dates += np.tile(np.arange(8) * np.timedelta64(3, "h"), len(dates) // 8)
 
     ap_data = np.ones((len(ap), 7)) * np.nan
     # daily Ap
     # repeat each value for each 3-hourly interval
-    ap_data[:, 0] = np.repeat(arr["Ap"], 8)
+    ap_data[:, 0] = np.repeat(daily_ap, 8)
     # current 3-hour ap index value
     ap_data[:, 1] = ap
     # 3-hours before current time
@@ -210,35 +491,29 @@ def _load_f107_ap_data() -> dict[str, npt.NDArray]:
     ap_data[4 + 16 - 1 :, 6] = rolling_mean[: -(4 + 8)]
 
     # F107 Data is needed from the previous day, F107a centered on the current day
-    f107_data = np.ones(len(arr), dtype=float) * np.nan
-    f107a_data = np.ones(len(arr), dtype=float) * np.nan
-    f107_data[1:] = arr["f107"][:-1]
-    f107a_data = arr["f107a"]
-    # So that we can warn the user that this F107 data was interpolated or predicted
-    interpolated = b"INT"
-    predicted = b"PRD"
-    warn_data = (arr["f107-type"] == interpolated) | (arr["f107-type"] == predicted)
+    f107_data = np.ones(len(f107), dtype=float) * np.nan
+    f107_data[1:] = f107[:-1]
+    f107a_data = np.asarray(f107a, dtype=float)
     # Because we use the F107 from the day before, we need to shift the warning
     # to the following day when we would actually use the value
+    warn_data = np.array(warn_data, dtype=bool)
     warn_data[1:] = warn_data[:-1]
 
-    # Set the global module-level data variable
-    data = {
+    return {
         "dates": dates,
         "ap": ap_data,
         "f107": f107_data,
         "f107a": f107a_data,
         "warn_data": warn_data,
     }
-    global _DATA  # noqa: PLW0603
-    _DATA = data
-    return data
 
 
 def get_f107_ap(
     dates: npt.ArrayLike,
     interpolate: bool = False,
-) -> tuple[npt.NDArray, npt.NDArray, npt.NDArray]:
+    *,
+    return_quality: bool = False,
+) -> tuple[npt.NDArray, ...]:
     """
     Retrieve the F10.7 and ap data needed to run msis for the given times.
 
@@ -255,12 +530,19 @@ def get_f107_ap(
         If False (default), use step-function sampling where values change
         discretely at boundaries. Daily values ramp forward across the day,
         reaching that day's value at the following midnight.
+    return_quality : bool, default: False
+        If True, also return a boolean array that is True where the F10.7
+        used was interpolated or predicted (not observed). No warning is
+        emitted in that case, it is up to the caller to check the flags.
 
     Returns
     -------
     tuple (f107 [n], f107a [n], ap [n x 7])
         Three arrays containing the f107, f107a, and ap values
-        corresponding to the input times of length n.
+        corresponding to the input times of length n. Values that are
+        missing from the data, including days missing from the data file,
+        are NaN. A fourth array ``estimated [n]`` is included if
+        ``return_quality`` is True.
 
         f107 : np.ndarray
             Daily F10.7 of the previous day for the given date(s)
@@ -285,10 +567,17 @@ def get_f107_ap(
     data_end = data["dates"][-1]
     # atleast_1d keeps output shapes consistent for scalar and array inputs
     date_offsets = np.atleast_1d(dates - data_start)
-    # daily index values
-    daily_indices = date_offsets.astype("timedelta64[D]").astype(int)
-    # 3-hourly index values
-    ap_indices = date_offsets.astype("timedelta64[h]").astype(int) // 3
+    # 3-hourly index values, using integer arithmetic in the native time unit
+    ap_step = np.timedelta64(3, "h").astype(date_offsets.dtype).astype(int)
+    ap_indices = date_offsets.view(np.int64) // ap_step
+    # High-cadence sorted times often only cover a few distinct 3-hourly bins,
+    # in that case look up each bin once and broadcast the values back out
+    runs = None if interpolate else _sorted_runs(ap_indices)
+    if runs is not None:
+        starts, counts = runs
+        ap_indices = ap_indices[starts]
+    # daily index values, the data starts at midnight with 8 values per day
+    daily_indices = ap_indices // 8
 
     if np.any((ap_indices < 0) | (ap_indices >= len(data["ap"]))):
         # We are requesting data outside of the valid range
@@ -298,11 +587,16 @@ def get_f107_ap(
             f"{data_end}."
         )
 
+    warn_or_not = data["warn_data"][daily_indices]
     if not interpolate:
         # Normal sampling (step function behavior)
         f107 = data["f107"][daily_indices]
         f107a = data["f107a"][daily_indices]
         ap = data["ap"][ap_indices]
+        if runs is not None:
+            f107 = np.repeat(f107, counts)
+            f107a = np.repeat(f107a, counts)
+            ap = np.repeat(ap, counts, axis=0)
     else:
         # Linear interpolation between time boundaries
         fractional_hours = date_offsets / np.timedelta64(1, "h")
@@ -331,7 +625,11 @@ def get_f107_ap(
         # using every 8th value, since the 3-hourly interp above is wrong for it
         ap[:, 0] = interp(data["ap"][::8, 0], daily_indices, daily_frac)
 
-    warn_or_not = data["warn_data"][daily_indices]
+    if return_quality:
+        if runs is not None:
+            warn_or_not = np.repeat(warn_or_not, counts)
+        return f107, f107a, ap, warn_or_not
+
     # TODO: Do we want to warn if any values within 81 days of a point are used?
     #      i.e. if any of the f107a values were interpolated or predicted
     if np.any(warn_or_not):
@@ -340,3 +638,33 @@ def get_f107_ap(
             "(not observed), use at your own risk."
         )
     return f107, f107a, ap
+
+
+def _sorted_runs(indices: npt.NDArray) -> tuple[npt.NDArray, npt.NDArray] | None:
+    """
+    Find the runs of repeated values within sorted indices.
+
+    Parameters
+    ----------
+    indices : ndarray of int
+        Index values to group
+
+    Returns
+    -------
+    tuple (starts, counts) or None
+        The position and length of each run of equal values, or None if the
+        indices are not sorted or the runs are too short to be worth grouping.
+    """
+    # Grouping only pays off when there are several values per run
+    min_run_length = 4
+    if len(indices) < min_run_length:
+        return None
+    steps = np.diff(indices)
+    if np.any(steps < 0):
+        return None
+    starts = np.flatnonzero(steps) + 1
+    if len(starts) + 1 > len(indices) // min_run_length:
+        return None
+    starts = np.concatenate(([0], starts))
+    counts = np.diff(starts, append=len(indices))
+    return starts, counts
@@ -0,0 +1,319 @@
+/*
+ * Generalized ufunc around the C-callable MSIS kernel.
+ *
+ * The kernel is the bind(C) pymsis_msiscalc routine from the Fortran
+ * wrappers, and its address is passed in from Python (see
+ * pymsis.msis.get_ufunc). The inner loop gathers the strided inputs into
+ * small contiguous blocks, calls the kernel and scatters the outputs, so
+ * no full-size staging copy of the broadcast inputs is ever made.
+ *
+ * The Fortran code keeps global state, so the loop calls the Python enter
+ * and exit callbacks around the kernel calls. These hold the pymsis lock
+ * and initialize the model with the options of this ufunc. An exception
+ * raised by a callback is left set, and NumPy raises it from the ufunc call.
+ */
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+
+#define NPY_NO_DEPRECATED_API NPY_1_7_API_VERSION
+#include <numpy/arrayobject.h>
+#include <numpy/ufuncobject.h>
+
+#include <math.h>
+#include <stdint.h>
+#include <string.h>
+
+#define BLOCK 256
+#define NAP 7
+#define NOUT 11
+#define US_PER_SECOND 1000000LL
+#define SECONDS_PER_DAY 86400LL
+
+typedef void (*msis_kernel)(int n, const float *day, const float *utsec,
+                            const float *lon, const float *lat,
+                            const float *alt, const float *f107,
+                            const float *f107a, const float *ap, float *output);
+
+typedef struct {
+    msis_kernel kernel;
+    PyObject *enter;
+    PyObject *exit;
+    void *data[1];
+    char *name;
+    char *doc;
+} msis_ufunc_data;
+
+static PyUFuncGenericFunction msis_functions[] = {NULL};
+static const char msis_types[] = {
+    NPY_DATETIME, NPY_DOUBLE, NPY_DOUBLE, NPY_DOUBLE,
+    NPY_DOUBLE,   NPY_DOUBLE, NPY_DOUBLE, NPY_FLOAT,
+};
+
+/* Day of year (1-366) for the days since 1970-01-01 */
+static int
+day_of_year(int64_t days)
+{
+    /* civil_from_days from http://howardhinnant.github.io/date_algorithms.html
+     * with the year starting on March 1st */
+    int64_t z = days + 719468;
+    int64_t era = (z >= 0 ? z : z - 146096) / 146097;
+    int64_t doe = z - era * 146097;
+    int64_t yoe = (doe - doe / 1460 + doe / 36524 - doe / 146096) / 365;
+    int64_t doy = doe - (365 * yoe + yoe / 4 - yoe / 100);
+    int64_t year = yoe + era * 400;
+    int leap;
+
+    if (doy >= 306) {
+        /* January and February */
+        return (int)(doy - 306 + 1);
+    }
+    leap = (year % 4 == 0 && year % 100 != 0) || year % 400 == 0;
+    return (int)(doy + 59 + leap + 1);
+}
+
+/*
+ * Call a Python callback from inside the loop, which may run without the GIL.
+ * The loop can run several times in one ufunc call, so the callback is not
+ * called again once an earlier one has failed.
+ */
+static int
+call_callback(PyObject *callback)
+{
+    PyGILState_STATE state = PyGILState_Ensure();
+    PyObject *result = NULL;
+    int status = -1;
+
+    if (!PyErr_Occurred()) {
+        result = PyObject_CallNoArgs(callback);
+        status = result == NULL ? -1 : 0;
+    }
+    Py_XDECREF(result);
+    PyGILState_Release(state);
+    return status;
+}
+
+static void
+msis_loop(char **args, npy_intp const *dimensions, npy_intp const *steps,
+          void *data)
+{
+    msis_ufunc_data *self = (msis_ufunc_data *)data;
+    npy_intp n = dimensions[0];
+    npy_intp ap_step = steps[8], out_step = steps[9];
+    float inputs[7][BLOCK], ap[NAP][BLOCK], output[NOUT][BLOCK];
+    char valid[BLOCK];
+    int entered = call_callback(self->enter) == 0;
+
+    for (npy_intp start = 0; start < n; start += BLOCK) {
+        int m = (int)(n - start < BLOCK ? n - start : BLOCK);
+        int nvalid = 0;
+
+        for (int i = 0; i < m; i++) {
+            npy_intp k = start + i;
+            int64_t us = *(int64_t *)(args[0] + k * steps[0]);
+            int64_t seconds, days;
+            double values[5];
+            int ok = us != NPY_DATETIME_NAT;
+
+            /* Floor division so that dates before 1970 work too */
+            seconds = us / US_PER_SECOND - (us % US_PER_SECOND < 0);
+            days = seconds / SECONDS_PER_DAY - (seconds % SECONDS_PER_DAY < 0);
+            for (int j = 0; j < 5; j++) {
+                values[j] = *(double *)(args[j + 1] + k * steps[j + 1]);
+                ok = ok && isfinite(values[j]);
+            }
+            for (int j = 0; j < NAP; j++) {
+                ap[j][i] = (float)*(double *)(args[6] + k * steps[6] + j * ap_step);
+                ok = ok && isfinite(ap[j][i]);
+            }
+            valid[i] = (char)ok;
+            if (!ok) {
+                /* Evaluate a harmless point and replace it with NaN afterwards */
+                days = seconds = 0;
+                values[0] = values[1] = values[2] = 0;
+                values[3] = values[4] = 150;
+                for (int j = 0; j < NAP; j++) {
+                    ap[j][i] = 4;
+                }
+            }
+            nvalid += ok;
+            inputs[0][i] = (float)day_of_year(days);
+            inputs[1][i] = (float)(seconds - days * SECONDS_PER_DAY);
+            for (int j = 0; j < 5; j++) {
+                inputs[j + 2][i] = (float)values[j];
+            }
+        }
+
+        if (entered && nvalid > 0) {
+            /* The ap and output blocks are column-major (BLOCK, 7) and
+             * (BLOCK, 11) arrays, so only the first m rows are passed when
+             * the block is not full. */
+            if (m < BLOCK) {
+                for (int j = 1; j < NAP; j++) {
+                    memmove(&ap[0][0] + j * m, ap[j], m * sizeof(float));
+                }
+            }
+            self->kernel(m, inputs[0], inputs[1], inputs[2], inputs[3],
+                         inputs[4], inputs[5], inputs[6], &ap[0][0],
+                         &output[0][0]);
+        }
+
+        for (int i = 0; i < m; i++) {
+            char *out = args[7] + (start + i) * steps[7];
+            for (int j = 0; j < NOUT; j++) {
+                float value = (entered && valid[i]) ? (&output[0][0])[j * m + i] : NAN;
+                *(float *)(out + j * out_step) = value;
+            }
+        }
+    }
+
+    if (entered) {
+        call_callback(self->exit);
+    }
+}
+
+/*
+ * The dates are always cast to datetime64[us], which holds any date within
+ * about 290,000 years of 1970 unlike [ns], and the other inputs to float64
+ */
+static int
+msis_type_resolver(PyUFuncObject *ufunc, NPY_CASTING casting,
+                   PyArrayObject **operands, PyObject *type_tup,
+                   PyArray_Descr **out_dtypes)
+{
+    PyObject *unit;
+    int i;
+
+    if (type_tup != NULL) {
+        PyErr_Format(PyExc_TypeError,
+                     "%s does not support the dtype or signature arguments",
+                     ufunc->name);
+        return -1;
+    }
+    if (PyArray_DESCR(operands[0])->type_num != NPY_DATETIME) {
+        PyErr_Format(PyExc_TypeError,
+                     "%s requires the dates to be datetime64 values",
+                     ufunc->name);
+        return -1;
+    }
+
+    unit = PyUnicode_FromString("M8[us]");
+    if (unit == NULL) {
+        return -1;
+    }
+    if (!PyArray_DescrConverter(unit, &out_dtypes[0])) {
+        Py_DECREF(unit);
+        return -1;
+    }
+    Py_DECREF(unit);
+    for (i = 1; i < 7; i++) {
+        out_dtypes[i] = PyArray_DescrFromType(NPY_DOUBLE);
+    }
+    out_dtypes[7] = PyArray_DescrFromType(NPY_FLOAT);
+
+    if (PyUFunc_ValidateCasting(ufunc, casting, operands, out_dtypes) < 0) {
+        for (i = 0; i < 8; i++) {
+            Py_DECREF(out_dtypes[i]);
+            out_dtypes[i] = NULL;
+        }
+        return -1;
+    }
+    return 0;
+}
+
+static void
+msis_ufunc_data_free(PyObject *capsule)
+{
+    msis_ufunc_data *self = PyCapsule_GetPointer(capsule, NULL);
+
+    Py_XDECREF(self->enter);
+    Py_XDECREF(self->exit);
+    PyMem_Free(self->name);
+    PyMem_Free(self->doc);
+    PyMem_Free(self);
+}
+
+static char *
+copy_string(const char *string)
+{
+    size_t size = strlen(string) + 1;
+    char *copy = PyMem_Malloc(size);
+
+    if (copy != NULL) {
+        memcpy(copy, string, size);
+    }
+    return copy;
+}
+
+static PyObject *
+make_gufunc(PyObject *NPY_UNUSED(module), PyObject *args)
+{
+    unsigned long long address;
+    PyObject *enter, *exit, *capsule;
+    const char *name, *doc;
+    msis_ufunc_data *self;
+    PyUFuncObject *ufunc;
+
+    if (!PyArg_ParseTuple(args, "KOOss", &address, &enter, &exit, &name, &doc)) {
+        return NULL;
+    }
+    if (!PyCallable_Check(enter) || !PyCallable_Check(exit)) {
+        PyErr_SetString(PyExc_TypeError, "enter and exit must be callable");
+        return NULL;
+    }
+
+    self = PyMem_Calloc(1, sizeof(msis_ufunc_data));
+    if (self == NULL) {
+        return PyErr_NoMemory();
+    }
+    capsule = PyCapsule_New(self, NULL, msis_ufunc_data_free);
+    if (capsule == NULL) {
+        PyMem_Free(self);
+        return NULL;
+    }
+    self->kernel = (msis_kernel)(uintptr_t)address;
+    self->enter = Py_NewRef(enter);
+    self->exit = Py_NewRef(exit);
+    self->data[0] = self;
+    self->name = copy_string(name);
+    self->doc = copy_string(doc);
+    if (self->name == NULL || self->doc == NULL) {
+        Py_DECREF(capsule);
+        return PyErr_NoMemory();
+    }
+
+    ufunc = (PyUFuncObject *)PyUFunc_FromFuncAndDataAndSignature(
+        msis_functions, self->data, (char *)msis_types, 1, 7, 1,
+        PyUFunc_None, self->name, self->doc, 0,
+        "(),(),(),(),(),(),(7)->(11)");
+    if (ufunc == NULL) {
+        Py_DECREF(capsule);
+        return NULL;
+    }
+    ufunc->type_resolver = &msis_type_resolver;
+    /* The ufunc owns the loop data through its obj reference */
+    ufunc->obj = capsule;
+    return (PyObject *)ufunc;
+}
+
+static PyMethodDef methods[] = {
+    {"make_gufunc", make_gufunc, METH_VARARGS,
+     "make_gufunc(address, enter, exit, name, doc)\n\n"
+     "Create an MSIS gufunc calling the kernel at the given address."},
+    {NULL, NULL, 0, NULL},
+};
+
+static struct PyModuleDef module = {
+    PyModuleDef_HEAD_INIT,
+    .m_name = "_ufunc",
+    .m_size = -1,
+    .m_methods = methods,
+};
+
+PyMODINIT_FUNC
+PyInit__ufunc(void)
+{
+    import_array();
+    import_umath();
+    msis_functions[0] = &msis_loop;
+    return PyModule_Create(&module);
+}
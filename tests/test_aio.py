@@ -0,0 +1,107 @@
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+from numpy.testing import assert_array_equal
+
+import pymsis
+from pymsis import aio
+
+
+@pytest.fixture
+def input_data():
+    dates = np.datetime64("2000-07-01T12:00") + np.arange(3) * np.timedelta64(1, "h")
+    lons = np.arange(-180, 180, 60)
+    lats = np.array([-45, 0, 45])
+    alts = np.array([200, 400])
+    return dates, lons, lats, alts
+
+
+@pytest.fixture
+def blocking_kernel(monkeypatch):
+    # Record the calls and hold the first one until the test releases it
+    calls = []
+    started = threading.Event()
+    release = threading.Event()
+    run_msiscalc = aio._run_msiscalc
+
+    def wrapper(*args):
+        calls.append((threading.current_thread().name, len(args[-1])))
+        started.set()
+        release.wait(timeout=10)
+        return run_msiscalc(*args)
+
+    monkeypatch.setattr(aio, "_run_msiscalc", wrapper)
+    return calls, started, release
+
+
+async def wait_for(event):
+    while not event.is_set():
+        await asyncio.sleep(0.001)
+
+
+def test_acalculate(input_data):
+    expected = pymsis.calculate(*input_data, version=0, diurnal=0)
+    output = asyncio.run(
+        pymsis.acalculate(*input_data, version=0, diurnal=0, chunk_size=5)
+    )
+    assert_array_equal(output, expected)
+
+    # Satellite fly-through
+    dates = input_data[0]
+    points = (dates, [0, 10, 20], [0, 5, 10], [200, 300, 400])
+    output = asyncio.run(pymsis.acalculate(*points))
+    assert_array_equal(output, pymsis.calculate(*points))
+
+
+def test_acalculate_chunks(input_data, blocking_kernel):
+    calls, _, release = blocking_kernel
+    release.set()
+    asyncio.run(pymsis.acalculate(*input_data, chunk_size=10))
+    # 108 points run as 10 chunks in the pymsis thread
+    assert [n for _, n in calls] == [10] * 10 + [8]
+    assert all(name.startswith("pymsis") for name, _ in calls)
+
+
+def test_acalculate_cancel(input_data, blocking_kernel):
+    calls, started, release = blocking_kernel
+
+    async def main():
+        task = asyncio.create_task(pymsis.acalculate(*input_data, chunk_size=10))
+        # The event loop keeps running while the model runs
+        await wait_for(started)
+        task.cancel()
+        release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    # The running chunk finishes, but no further chunks are started
+    assert len(calls) == 1
+
+
+def test_acalculate_backpressure(input_data, blocking_kernel, monkeypatch):
+    calls, started, release = blocking_kernel
+    monkeypatch.setattr(aio, "_MAX_PENDING", 1)
+
+    async def main():
+        first = asyncio.create_task(pymsis.acalculate(*input_data))
+        second = asyncio.create_task(pymsis.acalculate(*input_data))
+        await wait_for(started)
+        # The second request waits for a slot while the first one runs
+        assert aio._get_slots(asyncio.get_running_loop()).locked()
+        assert len(calls) == 1
+        release.set()
+        return await asyncio.gather(first, second)
+
+    first, second = asyncio.run(main())
+    assert_array_equal(first, second)
+    assert len(calls) == 2  # noqa: PLR2004
+
+
+def test_acalculate_bad_inputs(input_data):
+    with pytest.raises(ValueError, match="Input data has non-finite values"):
+        asyncio.run(pymsis.acalculate(input_data[0], np.nan, 0, 100))
+    with pytest.raises(ValueError, match="chunk_size must be a positive integer"):
+        asyncio.run(pymsis.acalculate(*input_data, chunk_size=0))
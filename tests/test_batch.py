@@ -0,0 +1,88 @@
+import concurrent.futures
+
+import numpy as np
+import pytest
+from numpy.testing import assert_array_equal
+
+import pymsis
+from pymsis import batch
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    # Record the number of points of every model call
+    calls = []
+    run_msiscalc = batch._run_msiscalc
+
+    def wrapper(msiscalc, msis_lib, options, input_data):
+        calls.append(len(input_data))
+        return run_msiscalc(msiscalc, msis_lib, options, input_data)
+
+    monkeypatch.setattr(batch, "_run_msiscalc", wrapper)
+    return calls
+
+
+def test_batcher(calls):
+    date = np.datetime64("2000-07-01T12:00")
+    requests = [(date, lon, lon / 4, [200, 400]) for lon in range(-180, 180, 10)]
+
+    with pymsis.Batcher(window=0.05) as batcher:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+            outputs = list(
+                executor.map(lambda args: batcher.calculate(*args), requests)
+            )
+
+    for args, output in zip(requests, outputs, strict=True):
+        assert_array_equal(output, pymsis.calculate(*args))
+    # The requests were evaluated together in far fewer calls
+    assert sum(calls) == 2 * len(requests)
+    assert len(calls) < len(requests)
+
+
+def test_batcher_groups(calls):
+    args = (np.datetime64("2000-07-01T12:00"), 0, 0, [100, 200, 300])
+    with pymsis.Batcher(window=0.1) as batcher:
+        futures = [
+            batcher.submit(*args),
+            batcher.submit(*args, version=0),
+            batcher.submit(*args, diurnal=0),
+            batcher.submit(*args),
+        ]
+        outputs = [future.result() for future in futures]
+
+    # Requests of different versions and options are evaluated separately
+    assert sorted(calls) == [3, 3, 6]
+    assert_array_equal(outputs[0], pymsis.calculate(*args))
+    assert_array_equal(outputs[1], pymsis.calculate(*args, version=0))
+    assert_array_equal(outputs[2], pymsis.calculate(*args, diurnal=0))
+    assert_array_equal(outputs[3], outputs[0])
+
+
+def test_batcher_max_points(calls):
+    args = (np.datetime64("2000-07-01T12:00"), 0, 0, np.arange(100, 500, 100))
+    with pymsis.Batcher(window=0.5, max_points=8) as batcher:
+        futures = [batcher.submit(*args) for _ in range(4)]
+        concurrent.futures.wait(futures)
+    assert calls == [8, 8]
+
+
+def test_batcher_errors(monkeypatch):
+    args = (np.datetime64("2000-07-01T12:00"), 0, 0, 200)
+    with pytest.raises(ValueError, match="window must be >= 0"):
+        pymsis.Batcher(window=-1)
+
+    batcher = pymsis.Batcher()
+    with pytest.raises(ValueError, match="Input data has non-finite values"):
+        batcher.submit(args[0], np.nan, 0, 200)
+
+    def fail(*args):
+        raise RuntimeError("model failed")
+
+    monkeypatch.setattr(batch, "_run_msiscalc", fail)
+    future = batcher.submit(*args)
+    with pytest.raises(RuntimeError, match="model failed"):
+        future.result()
+
+    batcher.close()
+    with pytest.raises(RuntimeError, match="closed Batcher"):
+        batcher.submit(*args)
@@ -0,0 +1,228 @@
+import numpy as np
+import pytest
+from numpy.testing import assert_allclose, assert_array_equal
+
+import pymsis
+from pymsis import cli
+
+
+@pytest.fixture
+def trajectory():
+    n = 25
+    times = np.datetime64("2000-07-01T00:00") + np.arange(n) * np.timedelta64(7, "m")
+    lons = np.linspace(-180, 180, n)
+    lats = np.linspace(-80, 80, n)
+    alts = np.linspace(200, 600, n)
+    return times, lons, lats, alts
+
+
+@pytest.fixture
+def expected(trajectory):
+    return pymsis.calculate(*trajectory).astype(np.float32)
+
+
+def write_csv(path, trajectory, extra=""):
+    lines = ["time,lon,lat,alt" + ("," if extra else "") + extra]
+    for t, lon, lat, alt in zip(*trajectory, strict=True):
+        line = f"{t}Z,{lon},{lat},{alt}"
+        lines.append(line + ("," + ",".join(["150"] * 3) if extra else ""))
+    path.write_text("\n".join(lines) + "\n")
+
+
+def write_npy(path, trajectory):
+    data = np.empty(
+        len(trajectory[0]),
+        dtype=[("time", "M8[s]"), ("lon", "f8"), ("lat", "f8"), ("alt", "f8")],
+    )
+    for name, values in zip(data.dtype.names, trajectory, strict=True):
+        data[name] = values
+    np.save(path, data)
+
+
+def test_run_csv(tmp_path, trajectory, expected):
+    write_csv(tmp_path / "in.csv", trajectory)
+    args = ["run", "--chunk-size", "10", str(tmp_path / "in.csv")]
+    assert cli.main([*args, str(tmp_path / "out.csv")]) == 0
+
+    lines = (tmp_path / "out.csv").read_text().splitlines()
+    header = lines[0].split(",")
+    assert header[:4] == ["time", "lon", "lat", "alt"]
+    assert header[4:] == [v.name.lower() for v in pymsis.Variable]
+    assert len(lines) == len(expected) + 1
+    output = np.array([line.split(",")[4:] for line in lines[1:]], dtype=np.float64)
+    assert_allclose(output, expected, rtol=1e-6)
+    assert lines[2].split(",")[0] == "2000-07-01T00:07:00"
+
+
+def test_run_npy(tmp_path, trajectory, expected):
+    write_npy(tmp_path / "in.npy", trajectory)
+    cli.main(
+        [
+            "run",
+            "--chunk-size",
+            "7",
+            str(tmp_path / "in.npy"),
+            str(tmp_path / "out.npy"),
+        ]
+    )
+    output = np.load(tmp_path / "out.npy")
+    assert_array_equal(output["time"], trajectory[0])
+    assert_array_equal(output["alt"], trajectory[3])
+    for variable in pymsis.Variable:
+        assert_array_equal(output[variable.name.lower()], expected[:, variable])
+
+
+def test_run_options(tmp_path, trajectory):
+    # Indices given in the file are used instead of looking them up
+    write_csv(tmp_path / "in.csv", trajectory, extra="f107,f107a,ap")
+    cli.main(
+        [
+            "run",
+            "--version",
+            "0",
+            "--option",
+            "diurnal=0",
+            str(tmp_path / "in.csv"),
+            str(tmp_path / "out.npy"),
+        ]
+    )
+    n = len(trajectory[0])
+    expected = pymsis.calculate(
+        *trajectory, [150] * n, [150] * n, [[150] * 7] * n, version=0, diurnal=0
+    )
+    output = np.load(tmp_path / "out.npy")
+    assert_array_equal(output["temperature"], expected[:, -1].astype(np.float32))
+
+
+def test_run_storm_time(tmp_path, trajectory, capsys):
+    # Storm-time mode uses the ap history columns
+    n = len(trajectory[0])
+    aps = np.arange(n * 7).reshape(n, 7) % 40 + 3
+    header = "time,lon,lat,alt,f107,f107a," + ",".join(cli._AP_COLUMNS)
+    lines = [header] + [
+        f"{t},{lon},{lat},{alt},150,140," + ",".join(map(str, ap))
+        for t, lon, lat, alt, ap in zip(*trajectory, aps, strict=True)
+    ]
+    (tmp_path / "in.csv").write_text("\n".join(lines) + "\n")
+    args = ["run", "--option", "geomagnetic_activity=-1", str(tmp_path / "in.csv")]
+    assert cli.main([*args, str(tmp_path / "out.npy")]) == 0
+    expected = pymsis.calculate(
+        *trajectory, [150] * n, [140] * n, aps, geomagnetic_activity=-1
+    )
+    output = np.load(tmp_path / "out.npy")
+    assert_array_equal(output["temperature"], expected[:, -1].astype(np.float32))
+
+    # A daily ap alone can't be used for storm-time mode
+    write_csv(tmp_path / "daily.csv", trajectory, extra="f107,f107a,ap")
+    args = ["run", "--option", "geomagnetic_activity=-1", str(tmp_path / "daily.csv")]
+    with pytest.raises(SystemExit, match="1"):
+        cli.main([*args, str(tmp_path / "daily.npy")])
+    assert "storm-time mode" in capsys.readouterr().err
+    assert not (tmp_path / "daily.npy").exists()
+
+
+def test_run_directory(tmp_path, trajectory, expected):
+    inputs = tmp_path / "inputs"
+    inputs.mkdir()
+    write_csv(inputs / "a.csv", trajectory)
+    write_npy(inputs / "b.npy", trajectory)
+    (inputs / "notes.txt").write_text("not a trajectory")
+    outputs = tmp_path / "outputs"
+    cli.main(
+        [
+            "run",
+            "--workers",
+            "2",
+            "--chunk-size",
+            "4",
+            "--format",
+            "npy",
+            str(inputs),
+            str(outputs),
+        ]
+    )
+
+    assert sorted(path.name for path in outputs.iterdir()) == ["a.npy", "b.npy"]
+    for name in ("a.npy", "b.npy"):
+        output = np.load(outputs / name)
+        assert_array_equal(output["mass_density"], expected[:, 0])
+
+
+def test_run_parquet(tmp_path, trajectory, expected):
+    pa = pytest.importorskip("pyarrow")
+    pq = pytest.importorskip("pyarrow.parquet")
+    names = ("time", "lon", "lat", "alt")
+    times, *positions = trajectory
+    # Arrow has no minute resolution timestamps
+    columns = [times.astype("datetime64[s]"), *positions]
+    table = pa.table(dict(zip(names, columns, strict=True)))
+    pq.write_table(table, tmp_path / "in.parquet")
+    cli.main(["run", str(tmp_path / "in.parquet"), str(tmp_path / "out.parquet")])
+    output = pq.read_table(tmp_path / "out.parquet")
+    assert output.column_names[:4] == list(names)
+    assert_array_equal(output["n2"].to_numpy(), expected[:, pymsis.Variable.N2])
+
+
+@pytest.mark.parametrize("suffix", ["csv", "npy", "parquet"])
+def test_run_failure_keeps_output(tmp_path, trajectory, monkeypatch, suffix):
+    if suffix == "parquet":
+        pytest.importorskip("pyarrow")
+    write_csv(tmp_path / "in.csv", trajectory)
+    output = tmp_path / f"out.{suffix}"
+    output.write_bytes(b"previous output")
+    calculate_chunk = cli._calculate_chunk
+    calls = []
+
+    def fail_second_chunk(*args):
+        calls.append(args)
+        if len(calls) == 2:  # noqa: PLR2004
+            raise OSError("The disk is full")
+        return calculate_chunk(*args)
+
+    monkeypatch.setattr(cli, "_calculate_chunk", fail_second_chunk)
+    args = ["run", "--chunk-size", "10", str(tmp_path / "in.csv"), str(output)]
+    with pytest.raises(SystemExit, match="1"):
+        cli.main(args)
+    # Neither a truncated output nor the partial file are left behind
+    assert output.read_bytes() == b"previous output"
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["in.csv", output.name]
+
+
+def test_run_errors(tmp_path, trajectory, capsys):
+    write_csv(tmp_path / "in.csv", trajectory)
+    with pytest.raises(SystemExit, match="1"):
+        cli.main(["run", str(tmp_path / "in.csv"), str(tmp_path / "out.txt")])
+    assert "Unknown file format '.txt'" in capsys.readouterr().err
+
+    (tmp_path / "bad.csv").write_text("time,lon,lat\n2000-07-01,0,0\n")
+    with pytest.raises(SystemExit, match="1"):
+        cli.main(["run", str(tmp_path / "bad.csv"), str(tmp_path / "out.csv")])
+    assert "missing the columns ['alt']" in capsys.readouterr().err
+
+    with pytest.raises(SystemExit, match="1"):
+        cli.main(
+            [
+                "run",
+                "--version",
+                "3",
+                str(tmp_path / "in.csv"),
+                str(tmp_path / "out.csv"),
+            ]
+        )
+    assert "not one of the valid version numbers" in capsys.readouterr().err
+
+    # The input would be emptied before it is read
+    (tmp_path / "link.csv").symlink_to(tmp_path / "in.csv")
+    for args in [
+        [tmp_path / "in.csv", tmp_path / "in.csv"],
+        [tmp_path / "in.csv", tmp_path / "." / "in.csv"],
+        [tmp_path / "in.csv", tmp_path / "link.csv"],
+        [tmp_path, tmp_path],
+    ]:
+        with pytest.raises(SystemExit, match="1"):
+            cli.main(["run", *map(str, args)])
+        assert "would overwrite the input" in capsys.readouterr().err
+    assert len((tmp_path / "in.csv").read_text().splitlines()) == len(trajectory[0]) + 1
+
+    with pytest.raises(SystemExit, match="2"):
+        cli.main(["run", "--option", "diurnal", "in.csv", "out.csv"])
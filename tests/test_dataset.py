@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+from numpy.testing import assert_array_equal
+
+import pymsis
+from pymsis import dataset
+
+
+xr = pytest.importorskip("xarray")
+pytest.importorskip("dask")
+
+
+@pytest.fixture
+def grid():
+    dates = np.arange(
+        np.datetime64("2000-07-01T00:00"),
+        np.datetime64("2000-07-02T00:00"),
+        np.timedelta64(6, "h"),
+    )
+    lons = np.arange(-180, 180, 45)
+    lats = np.arange(-90, 91, 30)
+    alts = np.array([100, 300, 600])
+    return dates, lons, lats, alts
+
+
+def test_calculate_dataset(grid):
+    expected = pymsis.calculate(*grid, version=0)
+    ds = pymsis.calculate_dataset(*grid, version=0, chunks=(2, 3, 7, 3))
+    assert isinstance(ds, xr.Dataset)
+    assert ds.sizes == {"time": 4, "lon": 8, "lat": 7, "alt": 3}
+    assert_array_equal(ds.time, grid[0])
+    assert_array_equal(ds.alt, grid[3])
+    assert list(ds.data_vars) == [v.name.lower() for v in pymsis.Variable]
+    assert ds.mass_density.attrs["units"] == "kg/m3"
+    assert ds.temperature.attrs["units"] == "K"
+    assert ds.n2.attrs["units"] == "m-3"
+
+    ds = ds.compute()
+    for variable in pymsis.Variable:
+        assert_array_equal(ds[variable.name.lower()], expected[..., variable])
+
+
+def test_calculate_dataset_lazy(grid, monkeypatch):
+    ds = pymsis.calculate_dataset(*grid)
+    calls = []
+
+    def get_ufunc(*args):
+        calls.append(args)
+        return pymsis.msis.get_ufunc(*args)
+
+    monkeypatch.setattr(dataset, "get_ufunc", get_ufunc)
+    # Nothing is evaluated until a slice is computed and only its chunk is used
+    assert not calls
+    temperature = ds.temperature.sel(time=grid[0][1], alt=300).values
+    assert len(calls) == 1
+    expected = pymsis.calculate(grid[0][1], grid[1], grid[2], 300)
+    assert_array_equal(temperature, expected[0, ..., 0, pymsis.Variable.TEMPERATURE])
+
+
+def test_calculate_dataset_bad_inputs(grid):
+    with pytest.raises(ValueError, match="chunks must be 4 positive integers"):
+        pymsis.calculate_dataset(*grid, chunks=(1, 0, 1, 1))
+    with pytest.raises(ValueError, match="Input data has non-finite values"):
+        pymsis.calculate_dataset(grid[0], [np.nan], grid[2], grid[3])
@@ -1,4 +1,8 @@
 import concurrent.futures
+import datetime
+import subprocess
+import sys
+from types import SimpleNamespace
 from unittest.mock import patch
 
 import numpy as np
@@ -6,7 +10,7 @@ import pytest
 from numpy.testing import assert_allclose, assert_array_equal
 
 import pymsis
-from pymsis import msis, msis00f, msis20f, msis21f
+from pymsis import msis
 
 
 @pytest.fixture
@@ -148,6 +152,46 @@ def test_create_input_datetime(input_data, expected_input):
     assert_array_equal(data[0, :], expected_input)
 
 
+def test_create_input_time_formats():
+    dates = np.array(
+        ["1899-12-31T23:59:59", "1970-01-01T00:00", "2000-02-29T12:34:56"],
+        dtype="datetime64[s]",
+    )
+    ones = np.ones(len(dates))
+    aps = np.ones((len(dates), 7))
+    _, expected = msis.create_input(dates, ones, ones, ones, ones, ones, aps)
+    assert_array_equal(expected[:, 0], [365, 1, 60])
+    assert_array_equal(expected[:, 1], [86399, 0, 45296])
+
+    unix = dates.astype(np.int64)
+    for values, time_format in [
+        (unix, "unix"),
+        (unix * 10**9, "unix_ns"),
+        (unix / 86400 + 40587, "mjd"),
+    ]:
+        _, data = msis.create_input(
+            values, ones, ones, ones, ones, ones, aps, time_format=time_format
+        )
+        assert_array_equal(data, expected)
+
+    with pytest.raises(ValueError, match="time_format 'jd' is not one of"):
+        msis.create_input(unix, ones, ones, ones, ones, ones, aps, time_format="jd")
+
+
+@pytest.mark.parametrize("library", ["pandas", "pyarrow"])
+def test_create_input_dataframe_times(input_data, expected_input, library):
+    date = input_data[0]
+    if library == "pandas":
+        pd = pytest.importorskip("pandas")
+        dates = pd.DatetimeIndex([date]).tz_localize("UTC").tz_convert("US/Mountain")
+    else:
+        pa = pytest.importorskip("pyarrow")
+        dates = pa.array([date.astype("datetime64[ns]")])
+    shape, data = msis.create_input(dates, *input_data[1:])
+    assert shape == (1,)
+    assert_array_equal(data[0, :], expected_input)
+
+
 def test_create_input_f107_date_mismatch(input_data):
     # Make sure we raise when f107 and dates are different shapes
     # Repeat 5 dates, but not f107
@@ -397,6 +441,350 @@ def test_calculate_auto_f107(input_auto_f107_ap):
     assert_allclose(pymsis.calculate(date, lon, lat, alt, aps=ap), expected)
 
 
+def test_calculate_return_quality(recwarn, input_auto_f107_ap):
+    date, lon, lat, alt, f107, _, _ = input_auto_f107_ap
+    # Observed F10.7 and the interpolated F10.7 at the end of the file
+    dates = [date, np.datetime64("2000-12-31T00:00")]
+
+    output, quality = pymsis.calculate(
+        dates, [lon] * 2, [lat] * 2, [alt] * 2, return_quality=True
+    )
+    assert output.shape == (2, 11)
+    assert_array_equal(quality, [False, True])
+    assert len(recwarn) == 0
+
+    # Grid mode flags every point at the given date
+    output, quality = pymsis.calculate(
+        dates, [lon, 90], lat, [alt, 300], return_quality=True
+    )
+    assert output.shape == (2, 2, 1, 2, 11)
+    assert quality.shape == (2, 2, 1, 2)
+    assert not quality[0].any()
+    assert quality[1].all()
+
+    # User specified F10.7 is never flagged
+    _, quality = pymsis.calculate(
+        dates, [lon] * 2, [lat] * 2, [alt] * 2, f107s=[f107] * 2, return_quality=True
+    )
+    assert not quality.any()
+
+    # The values don't change by returning the quality
+    with pytest.warns(UserWarning, match="interpolated or predicted"):
+        expected = pymsis.calculate(dates, [lon] * 2, [lat] * 2, [alt] * 2)
+    output, _ = pymsis.calculate(
+        dates, [lon] * 2, [lat] * 2, [alt] * 2, return_quality=True
+    )
+    assert_array_equal(output, expected)
+
+
+@pytest.mark.parametrize("version", ["0", "2.0", "2.1"])
+def test_calculate_point(input_data, version):
+    date, lon, lat, alt, f107, f107a, ap = input_data
+    expected = pymsis.calculate(*input_data, version=version)
+    output = pymsis.calculate_point(
+        date, lon, lat, alt, f107, f107a, ap[0], version=version
+    )
+    assert output.shape == (11,)
+    assert_array_equal(output, expected[0])
+
+    # Python datetimes, including timezone aware ones
+    pydate = date.astype(datetime.datetime)
+    output = pymsis.calculate_point(
+        pydate, lon, lat, alt, f107, f107a, ap[0], version=version
+    )
+    assert_array_equal(output, expected[0])
+    pydate = pydate.replace(tzinfo=datetime.timezone.utc).astimezone(
+        datetime.timezone(datetime.timedelta(hours=-6))
+    )
+    output = pymsis.calculate_point(
+        pydate, lon, lat, alt, f107, f107a, ap[0], version=version
+    )
+    assert_array_equal(output, expected[0])
+
+    # A single daily Ap is broadcast like in calculate()
+    expected_ap = pymsis.calculate(date, lon, lat, alt, f107, f107a, 3, version=version)
+    for daily_ap in (3, 3.0, np.float32(3)):
+        output = pymsis.calculate_point(
+            date, lon, lat, alt, f107, f107a, daily_ap, version=version
+        )
+        assert_array_equal(output, expected_ap[0])
+
+    # Options are passed through the same way
+    expected = pymsis.calculate(*input_data, version=version, diurnal=0)
+    output = pymsis.calculate_point(
+        date, lon, lat, alt, f107, f107a, ap[0], version=version, diurnal=0
+    )
+    assert_array_equal(output, expected[0])
+
+
+def test_calculate_point_auto_f107(input_auto_f107_ap):
+    date, lon, lat, alt, _, _, _ = input_auto_f107_ap
+    expected = pymsis.calculate(*input_auto_f107_ap)
+    assert_array_equal(pymsis.calculate_point(date, lon, lat, alt), expected[0])
+
+
+def test_calculate_point_bad_inputs(input_data):
+    date, lon, lat, alt, f107, f107a, ap = input_data
+    with pytest.raises(ValueError, match="Input data has non-finite values"):
+        pymsis.calculate_point(date, np.nan, lat, alt, f107, f107a, ap[0])
+    with pytest.raises(ValueError, match="ap needs to have 7 values"):
+        pymsis.calculate_point(date, lon, lat, alt, f107, f107a, ap)
+    with pytest.raises(ValueError, match="The MSIS version selected"):
+        pymsis.calculate_point(date, lon, lat, alt, f107, f107a, ap[0], version=3)
+
+
+@pytest.mark.parametrize("version", ["0", "2.0", "2.1"])
+def test_get_kernel(input_data, version):
+    # The C kernel gives the same results as calculate() with the same options
+    expected = pymsis.calculate(*input_data, version=version, diurnal=0)
+    _, arr = pymsis.msis.create_input(*input_data)
+    n = len(arr)
+    columns = [np.ascontiguousarray(arr[:, i]) for i in range(7)]
+    ap = np.asfortranarray(arr[:, 7:])
+    output = np.empty((n, 11), dtype=np.float32, order="F")
+
+    kernel = pymsis.msis.get_kernel(version, diurnal=0)
+    with pymsis.msis.kernel_lock:
+        kernel(n, *columns, ap, output)
+    assert_array_equal(output, expected)
+
+
+@pytest.mark.parametrize("version", ["0", "2.0", "2.1"])
+def test_get_ufunc(version):
+    date = np.datetime64("2003-10-29T12:34:56")
+    lons = np.arange(-180, 180, 30)
+    lats = np.arange(-90, 91, 30)
+    alts = np.array([100, 400, 1000])
+    aps = [[20, 10, 15, 25, 30, 35, 40]]
+    expected = pymsis.calculate(
+        date, lons, lats, alts, [150], [140], aps, version=version, diurnal=0
+    )[0]
+
+    ufunc = pymsis.msis.get_ufunc(version, diurnal=0)
+    assert ufunc.signature == "(),(),(),(),(),(),(7)->(11)"
+    assert ufunc is pymsis.msis.get_ufunc(version, diurnal=0)
+    # Standard broadcasting, with the same results as the grid mode
+    output = ufunc(date, lons[:, None, None], lats[:, None], alts, 150, 140, aps[0])
+    assert output.shape == expected.shape
+    assert_array_equal(output, expected)
+
+    # out= with the output variables along the first axis
+    out = np.empty((11, len(alts)), dtype=np.float64)
+    ufunc(
+        date,
+        lons[0],
+        lats[0],
+        alts,
+        150,
+        140,
+        aps[0],
+        out=out,
+        axes=[(), (), (), (), (), (), (0,), (0,)],
+    )
+    assert_allclose(out.T, expected[0, 0])
+
+    # Invalid points are NaN instead of raising
+    output = ufunc(
+        np.array([date, "NaT"], dtype="datetime64[s]"),
+        [0, np.nan],
+        0,
+        400,
+        150,
+        140,
+        aps[0],
+    )
+    assert np.isnan(output[1]).all()
+    assert_array_equal(output[0], expected[6, 3, 1])
+
+
+def test_msis_ufunc(input_data):
+    date, lon, lat, alt, f107, f107a, ap = input_data
+    expected = pymsis.calculate(*input_data)
+    output = pymsis.msis_ufunc(date, lon, lat, alt, f107, f107a, ap)
+    assert_array_equal(output, expected)
+    with pytest.raises(TypeError, match="datetime64"):
+        pymsis.msis_ufunc(0.0, lon, lat, alt, f107, f107a, ap)
+
+
+def test_msis_ufunc_dates_and_errors(input_data, monkeypatch):
+    _, lon, lat, alt, f107, f107a, ap = input_data
+    # Dates outside of the datetime64[ns] range of 1678-2262
+    dates = np.array(["1600-03-01T06:00", "2400-07-01T18:00"], dtype="datetime64[s]")
+    expected = pymsis.calculate(dates, lon, lat, alt, [f107] * 2, [f107a] * 2, ap * 2)
+    output = pymsis.msis_ufunc(dates, lon, lat, alt, f107, f107a, ap[0])
+    assert_array_equal(output, expected.reshape(2, 11))
+
+    # A failed initialization raises from the ufunc call and releases the lock
+    def fail(msis_lib, options):
+        raise RuntimeError("initialization failed")
+
+    monkeypatch.setattr(msis, "_initialize", fail)
+    with pytest.raises(RuntimeError, match="initialization failed"):
+        pymsis.msis_ufunc(dates, lon, lat, alt, f107, f107a, ap[0])
+    assert not msis._lock.locked()
+
+
+@pytest.mark.parametrize("version", ["0", "2.0", "2.1"])
+def test_calculate_layout(input_data, version):
+    date, _, _, _, f107, f107a, ap = input_data
+    lons = np.arange(-180, 180, 60)
+    lats = np.arange(-90, 91, 45)
+    alts = [100, 500]
+    args = (date, lons, lats, alts, f107, f107a, ap)
+    expected = pymsis.calculate(*args, version=version)
+    assert expected.shape == (1, 6, 5, 2, 11)
+
+    output = pymsis.calculate(*args, version=version, layout="variable")
+    assert output.shape == (11, 1, 6, 5, 2)
+    assert output.flags.c_contiguous
+    assert_array_equal(np.moveaxis(output, 0, -1), expected)
+
+    with pytest.raises(ValueError, match="layout 'grid' is not one of"):
+        pymsis.calculate(*args, version=version, layout="grid")
+
+
+@pytest.mark.parametrize("version", ["0", "2.0", "2.1"])
+def test_calculate_encoding(input_data, version):
+    date, _, _, _, f107, f107a, ap = input_data
+    args = (date, np.arange(-180, 180, 60), [-45, 0, 45], [50, 200, 1000])
+    args = (*args, f107, f107a, ap)
+    expected = pymsis.calculate(*args, version=version)
+
+    compact = pymsis.calculate(*args, version=version, encoding="log10_int16")
+    assert compact.dtype == msis.COMPACT_DTYPE
+    assert compact.dtype.itemsize == 24  # noqa: PLR2004
+    assert compact.shape == expected.shape[:-1]
+    output = msis.decode_output(compact)
+    assert output.dtype == np.float32
+    assert_array_equal(output[..., 10], expected[..., 10])
+    assert_array_equal(np.isnan(output), np.isnan(expected))
+    assert_allclose(output, expected, rtol=1.2e-3)
+
+    with pytest.raises(ValueError, match="encoding 'float8' is not one of"):
+        pymsis.calculate(*args, encoding="float8")
+    with pytest.raises(ValueError, match="can't be used with an encoding"):
+        pymsis.calculate(*args, layout="variable", encoding="log10_int16")
+
+
+@pytest.mark.parametrize("version", ["0", "2.0", "2.1"])
+def test_calculate_arrow(version):
+    pa = pytest.importorskip("pyarrow")
+    n = 20
+    dates = np.datetime64("2000-07-01T00:00:00") + np.arange(n) * np.timedelta64(9, "m")
+    lons = np.linspace(-180, 180, n)
+    lats = np.linspace(-80, 80, n, dtype=np.float32)
+    alts = np.linspace(100, 1000, n)
+    table = pa.table({"time": dates, "lon": lons, "lat": lats, "alt": alts})
+    expected = pymsis.calculate(dates, lons, lats, alts, version=version)
+
+    result = pymsis.calculate(table, version=version)
+    assert isinstance(result, pa.Table)
+    assert result.column_names == [v.name.lower() for v in pymsis.Variable]
+    assert result.schema.field("n2").type == pa.float32()
+    for variable in pymsis.Variable:
+        column = result.column(variable.name.lower()).to_numpy()
+        assert_array_equal(column, expected[:, variable])
+
+    # Record batches with the indices and chunked tables work too
+    columns = {"f107": np.full(n, 150.0), "f107a": np.full(n, 150.0)}
+    batch = pa.record_batch({**table.to_pydict(), **columns, "ap": np.full(n, 4.0)})
+    expected = pymsis.calculate(
+        dates, lons, lats, alts, [150] * n, [150] * n, [[4] * 7] * n, version=version
+    )
+    table = pa.Table.from_batches([batch[:7], batch[7:]])
+    result = pymsis.calculate(table, version=version)
+    assert_array_equal(result.column("temperature").to_numpy(), expected[:, -1])
+    result, quality = pymsis.calculate(batch, version=version, return_quality=True)
+    assert_array_equal(result.column("mass_density").to_numpy(), expected[:, 0])
+    assert not quality.any()
+
+    # Storm-time mode with a list column of the 7 ap values of each point
+    aps = np.arange(n * 7, dtype=float).reshape(n, 7) % 50
+    storm = table.drop_columns("ap").append_column(
+        "ap", pa.array(list(aps), type=pa.list_(pa.float64(), 7))
+    )
+    expected = pymsis.calculate(
+        dates,
+        lons,
+        lats,
+        alts,
+        [150] * n,
+        [150] * n,
+        aps,
+        version=version,
+        geomagnetic_activity=-1,
+    )
+    result = pymsis.calculate(storm, version=version, geomagnetic_activity=-1)
+    assert_array_equal(result.column("temperature").to_numpy(), expected[:, -1])
+
+
+def test_calculate_arrow_bad_inputs():
+    pa = pytest.importorskip("pyarrow")
+    table = pa.table({"time": [np.datetime64("2000-07-01T00:00:00")], "lon": [0.0]})
+    with pytest.raises(ValueError, match=r"missing the columns \['lat', 'alt'\]"):
+        pymsis.calculate(table)
+    alts = pa.array([None], type=pa.float64())
+    table = table.append_column("lat", [[0.0]]).append_column("alt", [alts])
+    with pytest.raises(ValueError, match="Input data has non-finite values"):
+        pymsis.calculate(table)
+    with pytest.raises(ValueError, match="can't be used with Arrow tables"):
+        pymsis.calculate(table, layout="variable")
+    with pytest.raises(ValueError, match="lons, lats and alts are required"):
+        pymsis.calculate(np.datetime64("2000-07-01T00:00"))
+    with pytest.raises(
+        ValueError, match="executor and parallel can't be used with Arrow"
+    ):
+        pymsis.calculate(table, executor=concurrent.futures.ThreadPoolExecutor())
+    with pytest.raises(ValueError, match="read from the columns of the table"):
+        pymsis.calculate(table, lons=[0.0])
+
+    indices = {"f107": [150.0], "f107a": [150.0]}
+    daily = table.append_column("ap", [[4.0]])
+    for name, values in indices.items():
+        daily = daily.append_column(name, [values])
+    daily = daily.set_column(3, "alt", [[400.0]])
+    with pytest.raises(ValueError, match="storm-time mode"):
+        pymsis.calculate(daily, geomagnetic_activity=-1)
+    short = daily.set_column(
+        daily.schema.get_field_index("ap"), "ap", pa.array([[4.0] * 6])
+    )
+    with pytest.raises(ValueError, match="ap column must have 7 values"):
+        pymsis.calculate(short)
+
+
+@pytest.mark.parametrize(
+    "executor_type",
+    [concurrent.futures.ThreadPoolExecutor, concurrent.futures.ProcessPoolExecutor],
+)
+def test_calculate_executor(executor_type, monkeypatch):
+    # Small shards so that the grid is split along the dates and longitudes
+    monkeypatch.setattr(msis, "_SHARD_POINTS", 12)
+    dates = np.datetime64("2000-07-01T00:00") + np.arange(3) * np.timedelta64(1, "h")
+    grid = (dates, np.arange(-180, 180, 30), [-45, 0, 45], [200, 400])
+    points = (dates, [0, 10, 20], [0, 5, 10], [200, 300, 400])
+    assert len(msis._shard_indices((3, 12, 3, 2), 12)) == 18  # noqa: PLR2004
+
+    with executor_type(max_workers=2) as executor:
+        for inputs in (grid, points, (*grid[:3], 200)):
+            for kwargs in (
+                {},
+                {"version": 0, "diurnal": 0},
+                {"layout": "variable"},
+                {"encoding": "log10_int16"},
+            ):
+                assert_array_equal(
+                    pymsis.calculate(*inputs, executor=executor, **kwargs),
+                    pymsis.calculate(*inputs, **kwargs),
+                )
+        output, quality = pymsis.calculate(
+            *grid, executor=executor, return_quality=True
+        )
+        assert_array_equal(output, pymsis.calculate(*grid))
+        assert quality.shape == (3, 12, 3, 2)
+        with pytest.raises(ValueError, match="Input data has non-finite values"):
+            pymsis.calculate(dates, [0, np.nan], 0, 200, executor=executor)
+
+
 @pytest.mark.parametrize(
     "inputs",
     [
@@ -413,7 +801,7 @@ def test_bad_run_inputs(inputs):
 
 @pytest.mark.parametrize(
     ("version", "msis_lib"),
-    [("0", msis00f), ("2.0", msis20f), ("2.1", msis21f)],
+    [("0", msis.msis00f), ("2.0", msis.msis20f), ("2.1", msis.msis21f)],
 )
 def test_keyword_argument_call(input_data, version, msis_lib):
     # Make sure that the wrapper definition is correct for whether we
@@ -469,7 +857,8 @@ def test_changing_options(input_data, expected_output, expected_output_with_opti
 
 
 @pytest.mark.parametrize(
-    ("version", "msis_lib"), [("00", msis00f), ("2.0", msis20f), ("2.1", msis21f)]
+    ("version", "msis_lib"),
+    [("00", msis.msis00f), ("2.0", msis.msis20f), ("2.1", msis.msis21f)],
 )
 def test_options_calls(input_data, version, msis_lib):
     # Check that we don't call the initialization function unless
@@ -559,6 +948,72 @@ def test_output_enum(input_data):
     assert data[..., pymsis.Variable.MASS_DENSITY] == data[..., 0]
 
 
+def test_kernel_variant(monkeypatch):
+    assert msis.KERNEL_VARIANT in msis._usable_variants()
+    assert msis.msis21f.__name__.endswith("msis21f")
+
+    # A machine with AVX2 and every variant installed
+    monkeypatch.setattr(msis, "_variant_built", lambda variant: True)
+    features = {"AVX": True, "AVX2": True, "FMA3": True, "F16C": True}
+    monkeypatch.setattr(msis, "_cpu_features", lambda: features)
+    assert msis._usable_variants() == ["x86_64_v3", "baseline"]
+    assert msis._select_variant() == "x86_64_v3"
+    monkeypatch.setenv("PYMSIS_KERNEL_VARIANT", "baseline")
+    assert msis._select_variant() == "baseline"
+    monkeypatch.setenv("PYMSIS_KERNEL_VARIANT", "x86_64_v4")
+    with pytest.warns(UserWarning, match="'x86_64_v4' from PYMSIS_KERNEL_VARIANT"):
+        assert msis._select_variant() == "baseline"
+    monkeypatch.setenv("PYMSIS_KERNEL_VARIANT", "fastest")
+    with pytest.warns(UserWarning, match="using the baseline kernels instead"):
+        assert msis._select_variant() == "baseline"
+
+
+def test_kernel_variant_modules(monkeypatch):
+    # The kernel attributes of pymsis.msis are the modules of the selected
+    # variant, not the baseline submodules of the package
+    assert msis.msis00f is msis._import_kernel("msis00f", msis.KERNEL_VARIANT)
+
+    imported = []
+
+    def import_kernel(name, variant):
+        imported.append((name, variant))
+        return SimpleNamespace(__name__=f"pymsis._{variant}.{name}")
+
+    monkeypatch.setattr(msis, "KERNEL_VARIANT", "x86_64_v3")
+    monkeypatch.setattr(msis, "_KERNELS", {})
+    monkeypatch.setattr(msis, "_import_kernel", import_kernel)
+    from pymsis.msis import msis00f  # noqa: PLC0415
+
+    assert msis00f.__name__ == "pymsis._x86_64_v3.msis00f"
+    assert msis.msis00f is msis00f
+    assert imported == [("msis00f", "x86_64_v3")]
+
+
+def test_lazy_imports():
+    # Importing pymsis loads neither the kernels nor the optional stacks,
+    # and a calculation only loads the kernel of its version
+    code = """
+import sys
+import numpy as np
+import pymsis
+
+optional = ["asyncio", "importlib.metadata", "multiprocessing", "urllib.request"]
+kernels = ("msis00f", "msis20f", "msis21f")
+def loaded():
+    return [
+        name for name in sys.modules if name in optional or name.endswith(kernels)
+    ]
+
+print(loaded())
+pymsis.calculate(np.datetime64("2000-07-01T00:00"), 0, 0, 200, 150, 150, [[4] * 7])
+print(loaded())
+"""
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    assert result.stdout.splitlines() == ["[]", f"[{msis.msis21f.__name__!r}]"]
+
+
 def test_deprecated_legacy_imports():
     # Make sure that msis.run() is still available and
     # we are getting our expected variables
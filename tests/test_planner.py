@@ -0,0 +1,108 @@
+import json
+
+import numpy as np
+import pytest
+from numpy.testing import assert_array_equal
+
+import pymsis
+from pymsis import planner
+
+
+@pytest.fixture(autouse=True)
+def profile(monkeypatch, tmp_path):
+    # Never read or write the profile of the user
+    monkeypatch.setattr(planner, "_PROFILE_FILE", tmp_path / "profile.json")
+    monkeypatch.setattr(planner, "_PROFILE", None)
+    monkeypatch.setattr(planner, "_EXECUTOR", None)
+    monkeypatch.setattr(planner, "_EXECUTOR_WORKERS", 0)
+    yield
+    if planner._EXECUTOR is not None:
+        planner._EXECUTOR.shutdown()
+
+
+def test_plan():
+    date = np.datetime64("2000-07-01T00:00")
+    small = planner.plan(date, [0, 10], [0, 10], [200, 300, 400], workers=8)
+    assert small.mode == "serial"
+    assert small.workers == 1
+    assert small.npoints == 12  # noqa: PLR2004
+    assert small.memory > 0
+
+    # 10**8 points are split into shards on every worker
+    dates = np.arange(1000) * np.timedelta64(1, "h") + date
+    large = planner.plan(
+        dates, np.arange(500), np.arange(100), [200, 400], version=0, workers=8
+    )
+    assert large.mode == "process"
+    assert large.workers == 8  # noqa: PLR2004
+    assert large.npoints == 10**8
+    assert large.shard_points * 4 * 8 >= large.npoints
+
+    # Fly-throughs are not grids
+    flythrough = planner.plan(dates, dates.astype(float), dates.astype(float), dates)
+    assert flythrough.npoints == len(dates)
+
+    with pytest.raises(ValueError, match="workers must be a positive integer"):
+        planner.plan(date, 0, 0, 200, workers=0)
+    with pytest.raises(ValueError, match="The MSIS version selected"):
+        planner.plan(date, 0, 0, 200, version=3)
+
+
+def test_calculate_parallel(monkeypatch):
+    dates = np.datetime64("2000-07-01T00:00") + np.arange(3) * np.timedelta64(1, "h")
+    inputs = (dates, np.arange(-180, 180, 30), [-45, 0, 45], [200, 400])
+    expected = pymsis.calculate(*inputs)
+    assert_array_equal(pymsis.calculate(*inputs, parallel="auto"), expected)
+
+    # A machine where the model is slow enough to use the workers
+    monkeypatch.setattr(planner, "_MIN_SHARD_POINTS", 10)
+    monkeypatch.setattr(
+        planner, "_PROFILE", {**planner._DEFAULT_PROFILE, "point_seconds": {"2.1": 1}}
+    )
+    monkeypatch.setattr(planner.os, "cpu_count", lambda: 2)
+    assert planner.plan(*inputs).mode == "process"
+    assert_array_equal(pymsis.calculate(*inputs, parallel="auto"), expected)
+    assert planner._EXECUTOR is not None
+
+    with pytest.raises(ValueError, match="parallel 'always' must be None or 'auto'"):
+        pymsis.calculate(*inputs, parallel="always")
+    with pytest.raises(ValueError, match="parallel and executor can't be used"):
+        pymsis.calculate(*inputs, parallel="auto", executor=planner._EXECUTOR)
+
+
+def test_calibrate(tmp_path):
+    file = tmp_path / "calibrated.json"
+    profile = planner.calibrate(file)
+    assert json.loads(file.read_text()) == profile
+    assert set(profile) == set(planner._DEFAULT_PROFILE)
+    assert all(value >= 0 for value in profile["point_seconds"].values())
+    # The new profile is used from now on
+    assert planner._get_profile()["call_seconds"] == profile["call_seconds"]
+
+
+def test_bad_profile(monkeypatch):
+    planner._PROFILE_FILE.write_text("not json")
+    with pytest.warns(UserWarning, match="could not be read"):
+        profile = planner._get_profile()
+    assert profile == planner._DEFAULT_PROFILE
+
+    # Costs missing from an older profile are the typical costs
+    monkeypatch.setattr(planner, "_PROFILE", None)
+    planner._PROFILE_FILE.write_text(
+        json.dumps({"point_seconds": {"2.1": 1e-5}, "call_seconds": 1e-4})
+    )
+    profile = planner._get_profile()
+    assert profile["point_seconds"] == {
+        **planner._DEFAULT_PROFILE["point_seconds"],
+        "2.1": 1e-5,
+    }
+    assert profile["call_seconds"] == 1e-4  # noqa: PLR2004
+    assert profile["worker_seconds"] == planner._DEFAULT_PROFILE["worker_seconds"]
+    assert planner.plan(np.datetime64("2000-07-01T00:00"), 0, 0, 200, version=0)
+
+    for bad in [[1, 2], {"point_seconds": 1}, {"shard_seconds": "slow"}]:
+        monkeypatch.setattr(planner, "_PROFILE", None)
+        planner._PROFILE_FILE.write_text(json.dumps(bad))
+        with pytest.warns(UserWarning, match="could not be read"):
+            profile = planner._get_profile()
+        assert profile == planner._DEFAULT_PROFILE
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+from numpy.testing import assert_array_equal
+
+import pymsis
+
+
+@pytest.fixture(scope="module")
+def pool():
+    with pymsis.WorkerPool(2, versions=[2.1, 0], diurnal=0) as pool:
+        yield pool
+
+
+def test_worker_pool(pool):
+    dates = np.datetime64("2000-07-01T12:00") + np.arange(3) * np.timedelta64(1, "h")
+    lons = np.arange(-180, 180, 60)
+    lats = np.array([-45, 0, 45])
+    alts = np.array([200, 400])
+    processes = set(pool._executor._processes)
+    assert len(processes) == 2  # noqa: PLR2004
+
+    output = pool.calculate(dates, lons, lats, alts)
+    assert_array_equal(output, pymsis.calculate(dates, lons, lats, alts, diurnal=0))
+    output = pool.calculate(dates, lons, lats, alts, version=0)
+    expected = pymsis.calculate(dates, lons, lats, alts, version=0, diurnal=0)
+    assert_array_equal(output, expected)
+    # Versions that were not initialized up front work too
+    output = pool.calculate(dates[0], 0, 0, 200, version=2.0)
+    expected = pymsis.calculate(dates[0], 0, 0, 200, version=2.0, diurnal=0)
+    assert_array_equal(output, expected)
+
+    # Satellite fly-through, and fewer points than workers
+    points = (dates, [0, 10, 20], [0, 5, 10], [200, 300, 400])
+    assert_array_equal(pool.calculate(*points), pymsis.calculate(*points, diurnal=0))
+    assert_array_equal(
+        pool.calculate(dates[0], 0, 0, 200),
+        pymsis.calculate(dates[0], 0, 0, 200, diurnal=0),
+    )
+    # The same workers are used for every call
+    assert set(pool._executor._processes) == processes
+
+
+def test_worker_pool_errors(pool):
+    with pytest.raises(ValueError, match="workers must be a positive integer"):
+        pymsis.WorkerPool(0)
+    with pytest.raises(ValueError, match="The MSIS version selected"):
+        pymsis.WorkerPool(1, versions=[3])
+    with pytest.raises(ValueError, match="The MSIS version selected"):
+        pool.calculate(np.datetime64("2000-07-01T12:00"), 0, 0, 200, version=3)
+    with pytest.raises(ValueError, match="Input data has non-finite values"):
+        pool.calculate(np.datetime64("2000-07-01T12:00"), np.nan, 0, 200)
+
+    closed = pymsis.WorkerPool(1)
+    closed.close()
+    with pytest.raises(RuntimeError, match="closed WorkerPool"):
+        closed.calculate(np.datetime64("2000-07-01T12:00"), 0, 0, 200)
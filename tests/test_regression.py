@@ -1,9 +1,28 @@
 from pathlib import Path
 
 import numpy as np
-from numpy.testing import assert_allclose
+import pytest
+from numpy.testing import assert_allclose, assert_array_equal
 
 import pymsis
+from pymsis import msis
+
+
+@pytest.fixture(params=msis._usable_variants())
+def kernel_variant(request, monkeypatch):
+    # Every kernel variant this machine can run has to match the references
+    if request.param != msis.KERNEL_VARIANT:
+        for name in ("msis00f", "msis20f", "msis21f"):
+            kernel = msis._import_kernel(name, request.param)
+            monkeypatch.setitem(msis._KERNELS, name, kernel)
+    return request.param
+
+
+@pytest.fixture(params=["pymsiscalc", "pymsiscalc_points"])
+def point_routine(request, monkeypatch):
+    # Both Fortran routines of the point layout have to match the references
+    monkeypatch.setattr(msis, "_POINT_ROUTINE", request.param)
+    return request.param
 
 
 def run_input_line(line, version):
@@ -79,7 +98,7 @@ def run_input_line(line, version):
     assert_allclose(x, expected, rtol=2e-3)
 
 
-def test_included_msis20_f90_file():
+def test_included_msis20_f90_file(kernel_variant, point_routine):
     # Regressing to the included file
     test_dir = Path(__file__).parent
     with open(test_dir / "msis2.0_test_ref_dp.txt") as f:
@@ -88,10 +107,63 @@ def test_included_msis20_f90_file():
             run_input_line(line, version="2.0")
 
 
-def test_included_msis_21_f90_file():
+def test_included_msis_21_f90_file(kernel_variant, point_routine):
     # Regressing to the included file
     test_dir = Path(__file__).parent
     with open(test_dir / "msis2.1_test_ref_dp.txt") as f:
         f.readline()  # Header
         for line in f:
             run_input_line(line, version="2.1")
+
+
+def test_msis00_reference(kernel_variant, point_routine):
+    # There is no reference file of MSIS-00, check against a known point
+    expected = np.array(
+        [
+            2.790941e-10,
+            3.354463e15,
+            1.242698e14,
+            4.331106e15,
+            8.082919e12,
+            1.126601e11,
+            2.710179e12,
+            5.634838e13,
+            1.665595e-03,
+            np.nan,
+            9.838066e02,
+        ],
+        dtype=np.float32,
+    )
+    date = np.datetime64("2010-01-01T12:00")
+    output = pymsis.calculate(date, 0, 0, 200, 150, 150, [[3] * 7], version=0)
+    assert_allclose(np.squeeze(output), expected, rtol=1e-5)
+
+
+@pytest.mark.parametrize("version", ["0", "2.0", "2.1"])
+def test_compact_round_trip(kernel_variant, version):
+    # The records that pymsiscalc_compact packs in the kernel have to hold the
+    # regular output, including the missing densities at low altitudes
+    dates = np.datetime64("2000-07-15T00:00") + np.arange(4) * np.timedelta64(7, "h")
+    args = (dates, np.arange(-180, 180, 45), np.arange(-90, 91, 30))
+    args = (*args, [0, 50, 100, 300, 1000], [70, 150, 250, 300], [150] * 4)
+    args = (*args, [[4] * 7, [15] * 7, [80] * 7, [300] * 7])
+    expected = pymsis.calculate(*args, version=version)
+    compact = pymsis.calculate(*args, version=version, encoding="log10_int16")
+    assert compact.shape == expected.shape[:-1]
+
+    assert_array_equal(compact["temperature"], expected[..., 10])
+    densities = expected[..., :10].astype(np.float64)
+    log10_density = compact["log10_density"]
+    missing = np.isnan(densities)
+    assert missing.any()
+    assert_array_equal(log10_density == msis._COMPACT_MISSING, missing)
+    assert_array_equal(log10_density == msis._COMPACT_ZERO, densities == 0)
+    positive = densities > 0
+    # float32 rounding in the kernel can move a value to the next code
+    codes = np.rint(1000 * np.log10(densities[positive]))
+    assert np.abs(log10_density[positive] - codes).max() <= 1
+
+    # Within the relative error that decode_output() documents
+    output = msis.decode_output(compact)
+    assert_array_equal(np.isnan(output), np.isnan(expected))
+    assert_allclose(output, expected, rtol=1.2e-3)
@@ -0,0 +1,147 @@
+import sys
+import threading
+import urllib.request
+
+import numpy as np
+import pytest
+from numpy.testing import assert_array_equal
+
+import pymsis
+from pymsis import serve
+
+
+@pytest.fixture
+def points():
+    n = 10
+    points = np.empty(
+        n, dtype=[("time", "M8[s]"), ("lon", "f8"), ("lat", "f8"), ("alt", "f8")]
+    )
+    points["time"] = np.datetime64("2000-07-01T00:00") + np.arange(n) * 600
+    points["lon"] = np.linspace(-180, 180, n)
+    points["lat"] = np.linspace(-60, 60, n)
+    points["alt"] = np.linspace(200, 600, n)
+    return points
+
+
+def run_server(unix_socket=None):
+    server = serve._make_server("127.0.0.1", 0, unix_socket, 0.001)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+@pytest.fixture
+def address():
+    server = run_server()
+    host, port = server.server_address
+    yield f"http://{host}:{port}"
+    server.shutdown()
+    server.server_close()
+
+
+def expected(points, **kwargs):
+    columns = (points[name] for name in ("time", "lon", "lat", "alt"))
+    return pymsis.calculate(*columns, **kwargs)
+
+
+def test_serve_npy(address, points):
+    with urllib.request.urlopen(f"{address}/health") as response:
+        assert response.read() == b"ok"
+
+    output = serve.calculate(address, points)
+    assert output.dtype == np.float32
+    assert_array_equal(output, expected(points))
+    output = serve.calculate(address, points, version=0, diurnal=0)
+    assert_array_equal(output, expected(points, version=0, diurnal=0))
+
+
+def test_serve_concurrent(address, points):
+    outputs = [None] * 8
+
+    def request(i):
+        outputs[i] = serve.calculate(address, points[i:])
+
+    threads = [threading.Thread(target=request, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for i, output in enumerate(outputs):
+        assert_array_equal(output, expected(points[i:]))
+
+
+def test_serve_arrow(address, points):
+    pa = pytest.importorskip("pyarrow")
+    table = pa.table({name: points[name] for name in points.dtype.names})
+    output = serve.calculate(address, table)
+    assert output.column_names == [v.name.lower() for v in pymsis.Variable]
+    assert_array_equal(output["temperature"].to_numpy(), expected(points)[:, -1])
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Unix sockets only")
+def test_serve_unix_socket(tmp_path, points):
+    path = str(tmp_path / "pymsis.sock")
+    server = run_server(unix_socket=path)
+    try:
+        assert_array_equal(serve.calculate(path, points), expected(points))
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_serve_errors(address, points):
+    with pytest.raises(RuntimeError, match="400: The request is missing the columns"):
+        serve.calculate(address, points[["time", "lon", "lat"]])
+    with pytest.raises(RuntimeError, match="400: The MSIS version selected"):
+        serve.calculate(address, points, version=3)
+    with pytest.raises(RuntimeError, match=r"400: .*unexpected keyword"):
+        serve.calculate(address, points, not_an_option=0)
+    with pytest.raises(RuntimeError, match="400: geomagnetic_activity=-1"):
+        serve.calculate(address, with_indices(points), geomagnetic_activity=-1)
+
+
+def with_indices(points, aps=None):
+    names = [*points.dtype.names, "f107", "f107a"]
+    names += ["ap"] if aps is None else [f"ap{i}" for i in range(1, 8)]
+    dtype = [(name, points.dtype.fields.get(name, ("f8",))[0]) for name in names]
+    result = np.empty(len(points), dtype=dtype)
+    for name in points.dtype.names:
+        result[name] = points[name]
+    result["f107"] = 150
+    result["f107a"] = 140
+    if aps is None:
+        result["ap"] = 12
+    else:
+        for i in range(7):
+            result[f"ap{i + 1}"] = aps[:, i]
+    return result
+
+
+def test_serve_storm_time(address, points):
+    aps = np.linspace(5, 200, len(points) * 7).reshape(-1, 7)
+    output = serve.calculate(
+        address, with_indices(points, aps), geomagnetic_activity=-1
+    )
+    columns = (points[name] for name in ("time", "lon", "lat", "alt"))
+    f107s = np.full(len(points), 150)
+    f107as = np.full(len(points), 140)
+    assert_array_equal(
+        output,
+        pymsis.calculate(*columns, f107s, f107as, aps, geomagnetic_activity=-1),
+    )
+
+
+def test_serve_internal_error(points):
+    server = run_server()
+    host, port = server.server_address
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("The batch failed")
+
+    server.batcher.calculate = fail
+    try:
+        with pytest.raises(RuntimeError, match="500: The batch failed"):
+            serve.calculate(f"http://{host}:{port}", points)
+    finally:
+        server.shutdown()
+        server.server_close()
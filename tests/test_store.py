@@ -0,0 +1,115 @@
+import numpy as np
+import pytest
+from numpy.testing import assert_array_equal
+
+import pymsis
+from pymsis import store
+
+
+@pytest.fixture
+def grid():
+    dates = np.arange(
+        np.datetime64("2000-07-01T00:00"),
+        np.datetime64("2000-07-02T00:00"),
+        np.timedelta64(6, "h"),
+    )
+    lons = np.arange(-180, 180, 45)
+    lats = np.arange(-90, 91, 30)
+    alts = np.array([100, 300, 600])
+    return dates, lons, lats, alts
+
+
+def test_calculate_to_store(tmp_path, grid):
+    expected = pymsis.calculate(*grid)
+    path = tmp_path / "grid.npy"
+    array = pymsis.calculate_to_store(*grid, store=path, chunks=(1, 3, 4, 2))
+    assert array.shape == expected.shape
+    assert array.dtype == np.float32
+    assert_array_equal(array, expected)
+    assert_array_equal(np.load(path), expected)
+    assert not (tmp_path / "grid.npy.progress").exists()
+
+    # Options are passed through
+    expected = pymsis.calculate(*grid, version=0, diurnal=0)
+    array = pymsis.calculate_to_store(*grid, store=path, version=0, diurnal=0)
+    assert_array_equal(array, expected)
+
+
+def test_calculate_to_store_resume(tmp_path, grid, monkeypatch):
+    expected = pymsis.calculate(*grid)
+    path = tmp_path / "grid.npy"
+    progress = tmp_path / "grid.npy.progress"
+    chunks = (2, 8, 7, 3)
+
+    # Stop the run after the first of the two chunks has been written
+    write_chunk = store._write_chunk
+
+    def interrupted(array, key, output, progress, index):
+        if index == 1:
+            raise KeyboardInterrupt
+        write_chunk(array, key, output, progress, index)
+
+    monkeypatch.setattr(store, "_write_chunk", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        pymsis.calculate_to_store(*grid, store=path, chunks=chunks)
+    assert progress.read_text().splitlines()[1:] == ["0"]
+    monkeypatch.setattr(store, "_write_chunk", write_chunk)
+
+    # Runs with other options, inputs or versions can't resume it
+    with pytest.raises(ValueError, match="belongs to a different calculation"):
+        pymsis.calculate_to_store(*grid, store=path, chunks=chunks, diurnal=0)
+    with pytest.raises(ValueError, match="belongs to a different calculation"):
+        pymsis.calculate_to_store(*grid, store=path, chunks=chunks, version=2.0)
+    with pytest.raises(ValueError, match="belongs to a different calculation"):
+        pymsis.calculate_to_store(
+            grid[0], grid[1] + 1, *grid[2:], store=path, chunks=chunks
+        )
+
+    # Only the second chunk is computed again
+    interrupted_progress = progress.read_text()
+    array = np.load(path, mmap_mode="r+")
+    array[:2] = -1
+    array.flush()
+    array = pymsis.calculate_to_store(*grid, store=path, chunks=chunks)
+    assert (array[:2] == -1).all()
+    assert_array_equal(array[2:], expected[2:])
+    assert not progress.exists()
+
+    # A removed or replaced store is written from scratch
+    del array
+    for replace in [
+        path.unlink,
+        lambda: np.save(path, np.zeros((4, 8, 7, 2, 11), dtype=np.float32)),
+        lambda: np.save(path, np.zeros(expected.shape)),
+    ]:
+        replace()
+        # The progress file of a run interrupted after the first chunk
+        progress.write_text(interrupted_progress)
+        array = pymsis.calculate_to_store(*grid, store=path, chunks=chunks)
+        assert array.dtype == np.float32
+        assert_array_equal(array, expected)
+        assert_array_equal(np.load(path), expected)
+        assert not progress.exists()
+        del array
+
+
+@pytest.mark.parametrize(("suffix", "library"), [(".zarr", "zarr"), (".h5", "h5py")])
+def test_calculate_to_store_formats(tmp_path, grid, suffix, library):
+    pytest.importorskip(library)
+    expected = pymsis.calculate(*grid)
+    array = pymsis.calculate_to_store(
+        *grid, store=tmp_path / f"grid{suffix}", chunks=(2, 4, 7, 3)
+    )
+    assert_array_equal(array[...], expected)
+
+
+def test_calculate_to_store_bad_inputs(tmp_path, grid):
+    dates, _, lats, alts = grid
+    with pytest.raises(ValueError, match="Unknown store format"):
+        pymsis.calculate_to_store(*grid, store=tmp_path / "grid.txt")
+    with pytest.raises(ValueError, match="chunks must be 4 positive integers"):
+        pymsis.calculate_to_store(*grid, store=tmp_path / "grid.npy", chunks=(1, 2))
+    with pytest.raises(ValueError, match="Input data has non-finite values"):
+        store.calculate_to_store(
+            dates, [np.nan], lats, alts, store=tmp_path / "grid.npy"
+        )
@@ -1,4 +1,6 @@
+import concurrent.futures
 import importlib
+import multiprocessing
 
 import numpy as np
 import pytest
@@ -104,6 +106,28 @@ def test_get_f107_ap(dates, expected_f107, expected_f107a, expected_ap):
     assert_array_equal(ap, expected_ap)
 
 
+@pytest.mark.filterwarnings("ignore:There is data that was either interpolated")
+def test_get_f107_ap_high_cadence():
+    # Sorted high-cadence times are grouped into 3-hourly bins, which must
+    # give the same values as looking up each time individually
+    dates = np.datetime64("2000-07-01T00:00") + np.arange(0, 2 * 86400, 10).astype(
+        "timedelta64[s]"
+    )
+    expected = [utils.get_f107_ap(date) for date in dates[::360]]
+    f107, f107a, ap = utils.get_f107_ap(dates)
+    assert f107.shape == f107a.shape == (len(dates),)
+    assert ap.shape == (len(dates), 7)
+    assert_array_equal(f107[::360], np.concatenate([x[0] for x in expected]))
+    assert_array_equal(f107a[::360], np.concatenate([x[1] for x in expected]))
+    assert_array_equal(ap[::360], np.concatenate([x[2] for x in expected]))
+
+    # Reversed order takes the non-grouped path
+    f107_rev, f107a_rev, ap_rev = utils.get_f107_ap(dates[::-1])
+    assert_array_equal(f107_rev, f107[::-1])
+    assert_array_equal(f107a_rev, f107a[::-1])
+    assert_array_equal(ap_rev, ap[::-1])
+
+
 @pytest.mark.parametrize(
     "dates",
     [
@@ -139,6 +163,29 @@ def test_get_f107_ap_interpolated_warns(dates):
         utils.get_f107_ap(dates)
 
 
+@pytest.mark.parametrize("interpolate", [False, True])
+def test_get_f107_ap_return_quality(recwarn, interpolate):
+    # One observed day, the bad data inserted, and the interpolated day,
+    # repeated at high cadence so that the 3-hourly bins are grouped
+    dates = np.repeat(
+        np.array(
+            ["2000-12-01T00:00", "2000-12-30T00:00", "2000-12-31T00:00"],
+            dtype="datetime64[m]",
+        ),
+        10,
+    )
+    *values, estimated = utils.get_f107_ap(
+        dates, interpolate=interpolate, return_quality=True
+    )
+    assert_array_equal(estimated, np.repeat([False, True, True], 10))
+    # The quality flags replace the warning
+    assert len(recwarn) == 0
+    for value, expected in zip(
+        values, utils.get_f107_ap(dates, interpolate=interpolate), strict=True
+    ):
+        assert_array_equal(value, expected)
+
+
 @pytest.mark.parametrize(
     ("date", "expected_f107", "expected_ap_col1"),
     [
@@ -215,3 +262,110 @@ def test_space_weather_env_variable(monkeypatch, tmp_path):
     importlib.reload(utils)
     with pytest.raises(FileNotFoundError, match="Custom space weather file"):
         utils._load_f107_ap_data()
+
+
+def test_use_space_weather_data(monkeypatch):
+    # Injecting the same records that are in the file should give the same values
+    file_data = utils._load_f107_ap_data()
+    ndays = len(file_data["f107a"])
+    days = file_data["dates"][::8].astype("datetime64[D]")
+    f107 = np.append(file_data["f107"][1:], 150.0)
+    ap = file_data["ap"][:, 1].reshape(ndays, 8)
+    daily_ap = file_data["ap"][::8, 0]
+
+    monkeypatch.setattr(utils, "_DATA", None)
+    utils.use_space_weather_data(days, f107, file_data["f107a"], ap, daily_aps=daily_ap)
+    assert_array_equal(utils._DATA["dates"], file_data["dates"])
+    assert_array_equal(utils._DATA["ap"], file_data["ap"])
+    assert_array_equal(utils._DATA["f107"], file_data["f107"])
+    assert_array_equal(utils._DATA["f107a"], file_data["f107a"])
+
+    date = np.datetime64("2000-07-01T12:00")
+    f107_out, f107a_out, ap_out = utils.get_f107_ap(date)
+    assert_array_equal(f107_out, [159.6])
+    assert_allclose(f107a_out, [186.3])
+    assert_array_equal(ap_out, [[7, 4, 5, 9, 4, 5.25, 5.75]])
+
+    # The daily Ap defaults to the average of the 3-hourly values
+    utils.use_space_weather_data(days[:3], f107[:3], f107[:3], ap[:3].ravel())
+    assert_allclose(utils._DATA["ap"][::8, 0], ap[:3].mean(axis=1))
+
+    # Predicted values should warn when used
+    utils.use_space_weather_data(days[:3], f107[:3], f107[:3], ap[:3], predicted=True)
+    with pytest.warns(UserWarning, match="interpolated or predicted"):
+        utils.get_f107_ap(days[2])
+
+
+def test_use_space_weather_data_bad_inputs():
+    days = np.array(["2000-01-01", "2000-01-02"], dtype="datetime64[D]")
+    with pytest.raises(ValueError, match="must all be equal"):
+        utils.use_space_weather_data(days, [150], [150, 150], np.ones((2, 8)))
+    with pytest.raises(ValueError, match="must be increasing"):
+        utils.use_space_weather_data(
+            days[::-1], [150, 150], [150, 150], np.ones((2, 8))
+        )
+    with pytest.raises(ValueError, match="At least one date"):
+        utils.use_space_weather_data([], [], [], [])
+    with pytest.raises(ValueError, match="eight 3-hourly ap values"):
+        utils.use_space_weather_data(days, [150, 150], [150, 150], np.ones(15))
+    with pytest.raises(ValueError, match="eight 3-hourly ap values"):
+        utils.use_space_weather_data(days, [150, 150], [150, 150], np.ones((4, 4)))
+
+
+def test_shared_space_weather_data():
+    date = np.datetime64("2000-07-01T12:00")
+    expected = utils.get_f107_ap(date)
+    shared = utils.share_space_weather_data()
+    try:
+        # Spawned workers start without any data loaded and can only get
+        # it from the shared memory block
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=utils.attach_space_weather_data,
+            initargs=(shared,),
+        ) as executor:
+            result = executor.submit(utils.get_f107_ap, date).result()
+    finally:
+        shared.unlink()
+    for res, exp in zip(result, expected, strict=True):
+        assert_array_equal(res, exp)
+
+
+@pytest.mark.filterwarnings("ignore:There is data that was either interpolated")
+def test_space_weather_file_with_gaps(local_path, tmp_path):
+    # Remove two days from the file, they should become missing values rather
+    # than shifting the data that comes after them
+    lines = local_path.read_text().splitlines(keepends=True)
+    gap_file = tmp_path / "gaps.csv"
+    gap_days = ("2000-07-04", "2000-07-05")
+    gap_file.write_text(
+        "".join(line for line in lines if not line.startswith(gap_days))
+    )
+    dates = np.array(
+        ["2000-07-06T12:00", "2000-07-07T12:00", "2000-07-08T12:00"],
+        dtype="datetime64[m]",
+    )
+    expected_f107, expected_f107a, expected_ap = utils.get_f107_ap(dates)
+
+    utils.use_space_weather_file(gap_file)
+    try:
+        data = utils._load_f107_ap_data()
+        assert len(data["dates"]) == len(data["ap"]) == 366 * 8
+
+        f107, f107a, ap = utils.get_f107_ap(np.datetime64("2000-07-05T12:00"))
+        assert np.isnan(f107).all()
+        assert np.isnan(f107a).all()
+        assert np.isnan(ap).all()
+
+        # The first day after the gap is missing the previous day's F10.7 and
+        # the ap history, the next day is complete again
+        f107, f107a, ap = utils.get_f107_ap(dates)
+        assert np.isnan(f107[0])
+        assert_array_equal(f107[1:], expected_f107[1:])
+        assert_array_equal(f107a, expected_f107a)
+        assert_array_equal(ap[:, :2], expected_ap[:, :2])
+        assert np.isnan(ap[0, 5:]).all()
+        assert_array_equal(ap[2], expected_ap[2])
+    finally:
+        utils.use_space_weather_file(local_path)
@@ -0,0 +1,42 @@
+"""
+Benchmark the time of importing pymsis and of its first calculation.
+
+Every statement is timed in a new interpreter, so nothing is cached
+between the runs. Run with ``python tools/benchmark_import.py``.
+"""
+
+import statistics
+import subprocess
+import sys
+
+
+STATEMENTS = {
+    "import numpy": "import numpy",
+    "import pymsis": "import pymsis",
+    "first calculate": (
+        "import numpy as np, pymsis; pymsis.calculate("
+        "np.datetime64('2000-07-01T00:00'), 0, 0, 200, 150, 150, [[4] * 7])"
+    ),
+}
+
+
+def measure(statement: str, repeat: int = 10) -> float:
+    """Median time in seconds of running statement in a new interpreter."""
+    code = (
+        "import time; start = time.perf_counter(); "
+        f"{statement}; print(time.perf_counter() - start)"
+    )
+    times = [
+        float(
+            subprocess.run(
+                [sys.executable, "-c", code], capture_output=True, text=True, check=True
+            ).stdout
+        )
+        for _ in range(repeat)
+    ]
+    return statistics.median(times)
+
+
+if __name__ == "__main__":
+    for name, statement in STATEMENTS.items():
+        print(f"{name:>16}: {1000 * measure(statement):6.1f} ms")